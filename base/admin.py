@@ -16,6 +16,7 @@ from .models import (
     Rating,
     UserProfile,
     UserDirectory,
+    AudioJob,
 )
 
 admin.site.register(Language)
@@ -27,3 +28,4 @@ admin.site.register(AccessType)
 admin.site.register(Rating)
 admin.site.register(UserProfile)
 admin.site.register(UserDirectory)
+admin.site.register(AudioJob)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BaseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'base'
+
+    def ready(self):
+        # Registers the signal handlers that invalidate cached directory trees
+        from . import utils_directory_tree  # noqa: F401
@@ -1,6 +1,7 @@
 from django.forms import ModelForm
 from .models import Word, UserLesson, Language, AccessType, UserWord, UserProfile, UserDirectory
 from django import forms
+from django.conf import settings
 from django.contrib.auth.models import User
 
 
@@ -92,7 +93,17 @@ class WordForm(ModelForm):
     class Meta:
         model = Word
         fields = "__all__"
-        exclude = ["lesson", "created", "updated"]
+        exclude = [
+            "lesson",
+            "created",
+            "updated",
+            "prompt_answers",
+            "translation_answers",
+            "prompt_audio_codec",
+            "prompt_audio_duration",
+            "usage_audio_codec",
+            "usage_audio_duration",
+        ]
         widgets = {
             "prompt": forms.TextInput(attrs={"autofocus": "autofocus"}),
         }
@@ -177,17 +188,35 @@ class MoveDirectoryForm(forms.Form):
         super().__init__(*args, **kwargs)
         if user:
             # Exclude the current directory and its subdirectories to prevent circular references
-            excluded_ids = [current_directory.id] if current_directory else []
+            directories = UserDirectory.objects.filter(user=user)
             if current_directory:
-                # Get all descendant directory IDs
-                def get_descendant_ids(directory):
-                    ids = []
-                    for subdir in directory.subdirectories.all():
-                        ids.append(subdir.id)
-                        ids.extend(get_descendant_ids(subdir))
-                    return ids
-                excluded_ids.extend(get_descendant_ids(current_directory))
-            
-            self.fields["parent_directory"].queryset = UserDirectory.objects.filter(
-                user=user
-            ).exclude(id__in=excluded_ids).order_by("name")
+                directories = directories.exclude(id__in=current_directory.get_descendants())
+            self.fields["parent_directory"].queryset = directories.order_by("name")
+
+
+class DeckImportForm(forms.Form):
+    """Form for importing an Anki .apkg or a CSV/TSV deck as a new lesson."""
+    deck_file = forms.FileField(
+        label="Deck file",
+        widget=forms.ClearableFileInput(attrs={"accept": ".apkg,.csv,.tsv,.txt"}),
+    )
+    title = forms.CharField(
+        required=False, help_text="Defaults to the name of the file."
+    )
+    prompt_language = forms.ModelChoiceField(
+        queryset=Language.objects.all(), required=True
+    )
+    translation_language = forms.ModelChoiceField(
+        queryset=Language.objects.all(), required=True
+    )
+    access_type = forms.ModelChoiceField(
+        queryset=AccessType.objects.all(), required=True
+    )
+
+    def clean_deck_file(self):
+        deck_file = self.cleaned_data["deck_file"]
+        if not deck_file.name.lower().endswith((".apkg", ".csv", ".tsv", ".txt")):
+            raise forms.ValidationError("Upload an Anki .apkg, .csv, .tsv or .txt file.")
+        if deck_file.size > settings.LESSON_ARCHIVE_MAX_SIZE:
+            raise forms.ValidationError("File too large.")
+        return deck_file
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from base.utils_audio_jobs import convert_existing_audio
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert existing word audio to the configured AUDIO_FORMAT / "
+        "AUDIO_TRIM_SILENCE and record codec and duration on every word."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="Number of distinct files handled per query batch.",
+        )
+
+    def handle(self, *args, **options):
+        converted, failed = convert_existing_audio(options["batch_size"])
+        for name in failed:
+            self.stderr.write(f"Could not convert {name}.")
+        self.stdout.write(self.style.SUCCESS(f"Converted {converted} audio file(s)."))
@@ -0,0 +1,41 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from base.utils_audio_jobs import requeue_stale_jobs, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Generate queued word audio (AudioJob rows) in the background."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process the jobs queued right now and exit.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10,
+            help="Number of jobs claimed at a time.",
+        )
+        parser.add_argument(
+            "--requeue-stale",
+            action="store_true",
+            help="Put jobs left running by a crashed worker back into the queue first.",
+        )
+
+    def handle(self, *args, **options):
+        if options["requeue_stale"]:
+            count = requeue_stale_jobs()
+            self.stdout.write(f"Requeued {count} stale job(s).")
+        processed = 0
+        while True:
+            claimed = run_pending_jobs(options["batch_size"])
+            processed += claimed
+            if claimed:
+                continue
+            if options["once"]:
+                break
+            time.sleep(settings.AUDIO_WORKER_POLL_INTERVAL)
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} audio job(s)."))
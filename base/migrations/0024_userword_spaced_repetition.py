@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-18 06:27
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0023_userprofile_auto_generate_hints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userword',
+            name='due',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='userword',
+            name='ease_factor',
+            field=models.FloatField(default=2.5),
+        ),
+        migrations.AddField(
+            model_name='userword',
+            name='interval',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userword',
+            name='repetitions',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='userword',
+            index=models.Index(fields=['user_lesson', 'due'], name='base_userwo_user_le_b6faea_idx'),
+        ),
+    ]
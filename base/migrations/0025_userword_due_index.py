@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-18 06:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0024_userword_spaced_repetition'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userword',
+            index=models.Index(fields=['due'], name='base_userwo_due_d2f0ed_idx'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.1.7 on 2026-10-18 06:36
+
+import re
+import unicodedata
+from django.db import migrations, models
+
+# Frozen copy of base.utils_answers.parse_accepted_answers as of this
+# migration, with the default normalisation steps (nfkc, casefold,
+# strip_accents, strip_punctuation, strip_articles, collapse_whitespace);
+# words get re-parsed with the configured steps whenever they are saved.
+ANSWER_SEPARATORS = re.compile(r"[;|]|\s+/\s+")
+
+LANGUAGE_ARTICLES = {
+    "English": {"the", "a", "an"},
+    "German": {"der", "die", "das", "den", "dem", "des", "ein", "eine", "einen", "einem", "einer", "eines"},
+    "French": {"le", "la", "les", "l", "un", "une", "des"},
+    "Spanish": {"el", "la", "los", "las", "un", "una", "unos", "unas"},
+    "Danish": {"en", "et"},
+}
+
+FOLDED_LETTERS = {"ł": "l", "ø": "o", "æ": "ae", "œ": "oe", "ß": "ss", "đ": "d"}
+
+
+def normalise(text, language_name):
+    text = unicodedata.normalize("NFKC", text.strip()).casefold()
+    text = "".join(
+        n
+        for c in text
+        for n in unicodedata.normalize("NFKD", FOLDED_LETTERS.get(c, c))
+        if not unicodedata.combining(n)
+    )
+    text = "".join(
+        " " if c in "'’" else c
+        for c in text
+        if c in "'’" or not unicodedata.category(c).startswith("P")
+    )
+    words = text.split()
+    articles = LANGUAGE_ARTICLES.get(language_name, set())
+    return " ".join([w for w in words if w not in articles] or words)
+
+
+def parse_accepted_answers(text, language_name):
+    alternatives = [a.strip() for a in ANSWER_SEPARATORS.split(text)]
+    alternatives = [a for a in alternatives if a] or [text.strip()]
+    return [[a, normalise(a, language_name)] for a in alternatives]
+
+
+def parse_existing_answers(apps, schema_editor):
+    """Precompute the accepted answers of existing words in batches."""
+    Word = apps.get_model('base', 'Word')
+
+    words = Word.objects.select_related(
+        'lesson__prompt_language', 'lesson__translation_language'
+    )
+    batch = []
+    for word in words.iterator(chunk_size=1000):
+        word.prompt_answers = parse_accepted_answers(
+            word.prompt, word.lesson.prompt_language.name
+        )
+        word.translation_answers = parse_accepted_answers(
+            word.translation, word.lesson.translation_language.name
+        )
+        batch.append(word)
+        if len(batch) >= 1000:
+            Word.objects.bulk_update(batch, ['prompt_answers', 'translation_answers'])
+            batch = []
+    if batch:
+        Word.objects.bulk_update(batch, ['prompt_answers', 'translation_answers'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0025_userword_due_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='word',
+            name='prompt_answers',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='word',
+            name='translation_answers',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(parse_existing_answers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-18 06:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0027_audiojob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiojob',
+            name='completed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='audiojob',
+            name='lesson',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='audio_jobs', to='base.lesson'),
+        ),
+        migrations.AddField(
+            model_name='audiojob',
+            name='total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='audiojob',
+            name='text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='audiojob',
+            name='word',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='audio_jobs', to='base.word'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-18 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0028_lesson_audio_jobs'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='word',
+            name='prompt_audio',
+            field=models.FileField(blank=True, db_index=True, null=True, upload_to='audio/prompts/'),
+        ),
+        migrations.AlterField(
+            model_name='word',
+            name='usage_audio',
+            field=models.FileField(blank=True, db_index=True, null=True, upload_to='audio/usages/'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-18 06:45
+
+from django.db import migrations, models
+
+# Codes that were hardcoded in base/utils_tts.py before languages had a code
+KNOWN_LANGUAGE_CODES = {
+    'English': 'en',
+    'Polish': 'pl',
+    'Spanish': 'es',
+    'Danish': 'da',
+    'French': 'fr',
+    'German': 'de',
+}
+
+
+def set_known_language_codes(apps, schema_editor):
+    Language = apps.get_model('base', 'Language')
+    for name, code in KNOWN_LANGUAGE_CODES.items():
+        Language.objects.filter(name=name, code='').update(code=code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0029_shared_audio_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='language',
+            name='code',
+            field=models.CharField(blank=True, max_length=10),
+        ),
+        migrations.RunPython(set_known_language_codes, migrations.RunPython.noop),
+    ]
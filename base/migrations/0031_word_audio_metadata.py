@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-18 06:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0030_language_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='word',
+            name='prompt_audio_codec',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='word',
+            name='prompt_audio_duration',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='word',
+            name='usage_audio_codec',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='word',
+            name='usage_audio_duration',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 07:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0031_word_audio_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='hidden_words',
+            field=models.ManyToManyField(blank=True, related_name='hidden_in_forks', to='base.word'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='word_source',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='word_forks', to='base.lesson'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.7 on 2026-10-18 07:09
+
+from django.db import migrations, models
+
+
+def build_directory_paths(apps, schema_editor):
+    """Compute the path and depth of existing directories, walking each tree from its roots."""
+    UserDirectory = apps.get_model('base', 'UserDirectory')
+
+    children = {}
+    for dir_id, parent_id in UserDirectory.objects.values_list('id', 'parent_directory_id'):
+        children.setdefault(parent_id, []).append(dir_id)
+    paths = {}
+    stack = [(dir_id, '/', 0) for dir_id in children.get(None, [])]
+    while stack:
+        dir_id, parent_path, depth = stack.pop()
+        if dir_id in paths:
+            continue
+        paths[dir_id] = (f'{parent_path}{dir_id}/', depth)
+        stack.extend((child, paths[dir_id][0], depth + 1) for child in children.get(dir_id, []))
+
+    batch = []
+    for directory in UserDirectory.objects.filter(id__in=paths).iterator(chunk_size=1000):
+        directory.path, directory.depth = paths[directory.id]
+        batch.append(directory)
+        if len(batch) >= 1000:
+            UserDirectory.objects.bulk_update(batch, ['path', 'depth'])
+            batch = []
+    if batch:
+        UserDirectory.objects.bulk_update(batch, ['path', 'depth'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0032_lesson_word_forks'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userdirectory',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userdirectory',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=1024),
+        ),
+        migrations.RunPython(build_directory_paths, migrations.RunPython.noop),
+    ]
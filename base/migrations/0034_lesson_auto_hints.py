@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0033_userdirectory_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='auto_hints',
+            field=models.BooleanField(default=False),
+        ),
+    ]
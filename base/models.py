@@ -1,9 +1,15 @@
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 import os
-from django.db.models.signals import pre_delete, post_save
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
+from django.utils import timezone
+from .utils_answers import parse_accepted_answers
+from .utils_audio_bundle import remove_lesson_bundle
 
 # Language learning app models
 
@@ -53,8 +59,46 @@ class AccessType(models.Model):
         return self.get_name_display()
 
 
+# ISO 639-1 codes of language names, given to languages saved without a code
+LANGUAGE_CODES = {
+    "English": "en",
+    "Polish": "pl",
+    "Spanish": "es",
+    "Danish": "da",
+    "French": "fr",
+    "German": "de",
+    "Italian": "it",
+    "Portuguese": "pt",
+    "Dutch": "nl",
+    "Swedish": "sv",
+    "Norwegian": "no",
+    "Finnish": "fi",
+    "Czech": "cs",
+    "Ukrainian": "uk",
+    "Russian": "ru",
+    "Greek": "el",
+    "Turkish": "tr",
+    "Japanese": "ja",
+    "Chinese": "zh",
+    "Korean": "ko",
+    # Add more as needed
+}
+
+
+def language_code_for(name):
+    """The ISO 639-1 code of a language name, or "" if it is not known."""
+    return LANGUAGE_CODES.get(name.strip().title(), "")
+
+
 class Language(models.Model):
     name = models.CharField(max_length=50, unique=True)
+    # ISO 639-1 code used for text-to-speech, e.g. "en"
+    code = models.CharField(max_length=10, blank=True)
+
+    def save(self, *args, **kwargs):
+        if not self.code:
+            self.code = language_code_for(self.name)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
@@ -98,28 +142,92 @@ class Lesson(models.Model):
     original_lesson = models.ForeignKey(
         "self", null=True, blank=True, on_delete=models.SET_NULL
     )
+    # Copy-on-write forks: the words of word_source are part of this lesson
+    # too, except hidden_words. A shared word gets its own row in the fork
+    # only once the fork edits it (see materialise_word).
+    word_source = models.ForeignKey(
+        "self", null=True, blank=True, on_delete=models.SET_NULL, related_name="word_forks"
+    )
+    hidden_words = models.ManyToManyField(
+        "Word", blank=True, related_name="hidden_in_forks"
+    )
+    # Words without a hint show the first letter of their prompt instead
+    # (forks made with UserProfile.auto_generate_hints, see word_hint)
+    auto_hints = models.BooleanField(default=False)
     updated = models.DateTimeField(auto_now=True)
     created = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.title} by {self.author.username}"
 
-
-@receiver(pre_delete, sender=Lesson)
-def delete_lesson_audio_files(sender, instance, **kwargs):
-    for word in instance.words.all():
-        if (
-            word.prompt_audio
-            and word.prompt_audio.path
-            and os.path.isfile(word.prompt_audio.path)
-        ):
-            os.remove(word.prompt_audio.path)
-        if (
-            word.usage_audio
-            and word.usage_audio.path
-            and os.path.isfile(word.usage_audio.path)
-        ):
-            os.remove(word.usage_audio.path)
+    def get_words(self):
+        """Words of the lesson, including those shared from its word_source."""
+        if self.word_source_id is None:
+            return Word.objects.filter(lesson=self)
+        return Word.objects.filter(
+            models.Q(lesson=self) | models.Q(lesson_id=self.word_source_id)
+        ).exclude(hidden_in_forks=self)
+
+    def is_shared_word(self, word):
+        """Whether `word` belongs to this fork's word_source rather than to the lesson itself."""
+        return word.lesson_id != self.id and word.lesson_id == self.word_source_id
+
+    def materialise_word(self, word):
+        """
+        Give this fork its own copy of a shared word, hide the original and
+        move the fork's UserWords to the copy. Returns the copy; audio
+        files are shared with the original.
+        """
+        copy = Word.objects.get(id=word.id)
+        copy.pk = None
+        copy.lesson = self
+        copy.save()
+        self.hidden_words.add(word)
+        UserWord.objects.filter(user_lesson__lesson=self, word=word).update(word=copy)
+        return copy
+
+    def hide_shared_word(self, word):
+        """Remove a shared word from this fork only."""
+        self.hidden_words.add(word)
+        UserWord.objects.filter(user_lesson__lesson=self, word=word).delete()
+
+    def materialise_shared_words(self, batch_size=1000):
+        """
+        Turn this fork into a regular lesson: copy every shared word it still
+        uses (in bulk batches) and move its UserWords to the copies.
+        """
+        if self.word_source_id is None:
+            return
+        shared = Word.objects.filter(lesson_id=self.word_source_id).exclude(
+            hidden_in_forks=self
+        ).order_by("id")
+        last_id = 0
+        while True:
+            batch = list(shared.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            copies = {}
+            for word in batch:
+                original_id = word.id
+                word.pk = None
+                word.lesson = self
+                copies[original_id] = word
+            Word.objects.bulk_create(copies.values())
+            user_words = list(
+                UserWord.objects.filter(user_lesson__lesson=self, word_id__in=copies)
+            )
+            for user_word in user_words:
+                user_word.word = copies[user_word.word_id]
+            UserWord.objects.bulk_update(user_words, ["word"])
+        self.hidden_words.clear()
+        self.word_source = None
+        self.save(update_fields=["word_source"])
+
+    def detach_word_from_forks(self, word):
+        """Give every fork still sharing `word` its own copy, before the word is deleted."""
+        for fork in self.word_forks.exclude(hidden_words=word):
+            fork.materialise_word(word)
 
 
 class Word(models.Model):
@@ -127,12 +235,48 @@ class Word(models.Model):
     prompt = models.CharField(max_length=255)
     translation = models.CharField(max_length=255)
     usage = models.TextField(blank=True)
-    prompt_audio = models.FileField(upload_to="audio/prompts/", blank=True, null=True)
-    usage_audio = models.FileField(upload_to="audio/usages/", blank=True, null=True)
+    # Audio files are shared between words with the same text and language
+    # (see utils_tts.audio_cache_path); indexed to count their references
+    prompt_audio = models.FileField(
+        upload_to="audio/prompts/", blank=True, null=True, db_index=True
+    )
+    usage_audio = models.FileField(
+        upload_to="audio/usages/", blank=True, null=True, db_index=True
+    )
+    # Codec and duration (seconds) of the audio files, see utils_audio_format
+    prompt_audio_codec = models.CharField(max_length=20, blank=True)
+    prompt_audio_duration = models.FloatField(null=True, blank=True)
+    usage_audio_codec = models.CharField(max_length=20, blank=True)
+    usage_audio_duration = models.FloatField(null=True, blank=True)
     hint = models.CharField(max_length=255, blank=True)
+    # Accepted alternatives of prompt/translation with their normalised form,
+    # see utils_answers.parse_accepted_answers; refreshed on every save
+    prompt_answers = models.JSONField(default=list, blank=True)
+    translation_answers = models.JSONField(default=list, blank=True)
     updated = models.DateTimeField(auto_now=True)
     created = models.DateTimeField(auto_now_add=True)
 
+    def update_accepted_answers(self):
+        """Parse prompt and translation into their accepted answers."""
+        self.prompt_answers = parse_accepted_answers(
+            self.prompt, self.lesson.prompt_language.name
+        )
+        self.translation_answers = parse_accepted_answers(
+            self.translation, self.lesson.translation_language.name
+        )
+
+    def save(self, *args, **kwargs):
+        self.update_accepted_answers()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and (
+            "prompt" in update_fields or "translation" in update_fields
+        ):
+            kwargs["update_fields"] = set(update_fields) | {
+                "prompt_answers",
+                "translation_answers",
+            }
+        super().save(*args, **kwargs)
+
     def has_prompt_audio(self):
         """Check if prompt audio file exists on disk."""
         return (
@@ -149,41 +293,79 @@ class Word(models.Model):
             and os.path.isfile(self.usage_audio.path)
         )
 
-    def delete(self, *args, **kwargs):
-        # Delete prompt audio file if it exists
-        if (
-            self.prompt_audio
-            and self.prompt_audio.path
-            and os.path.isfile(self.prompt_audio.path)
-        ):
-            os.remove(self.prompt_audio.path)
-        # Delete usage audio file if it exists
-        if (
-            self.usage_audio
-            and self.usage_audio.path
-            and os.path.isfile(self.usage_audio.path)
-        ):
-            os.remove(self.usage_audio.path)
-        super().delete(*args, **kwargs)
-
     def __str__(self):
         return f"{self.prompt} -> {self.translation}"
 
 
-@receiver(pre_delete, sender=Word)
+def word_hint(hint, prompt, auto_hints):
+    """The hint shown for a word: its own, or the first letter of its prompt in lessons with auto_hints."""
+    if hint or not auto_hints or not prompt:
+        return hint
+    return prompt[0].upper()
+
+
+def release_audio_files(names):
+    """
+    Remove the given audio files (names relative to MEDIA_ROOT) that are no
+    longer referenced by any word.
+
+    Audio files are shared, so the Word table acts as their reference count;
+    call this after the referencing rows were deleted or repointed.
+    """
+    names = {name for name in names if name}
+    if not names:
+        return
+    referenced = set()
+    for prompt_audio, usage_audio in Word.objects.filter(
+        models.Q(prompt_audio__in=names) | models.Q(usage_audio__in=names)
+    ).values_list("prompt_audio", "usage_audio"):
+        referenced.update((prompt_audio, usage_audio))
+    for name in names - referenced:
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+# post_delete rather than pre_delete: when a whole lesson is deleted its
+# words are removed together, and a file is only unreferenced once all of
+# them are gone
+@receiver(post_delete, sender=Word)
 def delete_word_audio_files(sender, instance, **kwargs):
-    if (
-        instance.prompt_audio
-        and instance.prompt_audio.path
-        and os.path.isfile(instance.prompt_audio.path)
-    ):
-        os.remove(instance.prompt_audio.path)
-    if (
-        instance.usage_audio
-        and instance.usage_audio.path
-        and os.path.isfile(instance.usage_audio.path)
-    ):
-        os.remove(instance.usage_audio.path)
+    release_audio_files([instance.prompt_audio.name, instance.usage_audio.name])
+
+
+def lessons_deleted_with(origin):
+    """Lessons removed by the same delete() call as `origin`, the object or queryset it started from."""
+    if isinstance(origin, Lesson):
+        return Lesson.objects.filter(pk=origin.pk)
+    if isinstance(origin, User):
+        return Lesson.objects.filter(author=origin)
+    if isinstance(origin, Language):
+        return Lesson.objects.filter(
+            models.Q(prompt_language=origin) | models.Q(translation_language=origin)
+        )
+    if isinstance(origin, models.QuerySet):
+        if origin.model is Lesson:
+            return origin
+        if origin.model is User:
+            return Lesson.objects.filter(author__in=origin)
+    return Lesson.objects.none()
+
+
+# pre_delete also runs for cascades (e.g. deleting the author) and queryset
+# deletes. A fork's UserWords are only removed after this, by word id, so
+# those moved to the copies survive.
+@receiver(pre_delete, sender=Lesson)
+def materialise_lesson_forks(sender, instance, origin=None, **kwargs):
+    # Forks keep the words they share with this lesson, unless they go too
+    forks = instance.word_forks.exclude(pk__in=lessons_deleted_with(origin).values("pk"))
+    for fork in forks:
+        fork.materialise_shared_words()
+
+
+@receiver(post_delete, sender=Lesson)
+def delete_lesson_audio_bundle(sender, instance, **kwargs):
+    remove_lesson_bundle(instance.id)
 
 
 class UserLesson(models.Model):
@@ -227,9 +409,19 @@ class UserWord(models.Model):
     word = models.ForeignKey(Word, on_delete=models.CASCADE)
     current_progress = models.PositiveIntegerField(default=0)
     notes = models.TextField(blank=True)
+    # Spaced-repetition state (see base/utils_scheduler.py)
+    due = models.DateTimeField(default=timezone.now)
+    ease_factor = models.FloatField(default=2.5)
+    interval = models.PositiveIntegerField(default=0)  # days
+    repetitions = models.PositiveIntegerField(default=0)
 
     class Meta:
         unique_together = ("user_lesson", "word")
+        indexes = [
+            models.Index(fields=["user_lesson", "due"]),
+            # Cross-lesson review walks due words of many lessons in due order
+            models.Index(fields=["due"]),
+        ]
 
     def __str__(self):
         return f"{self.word.prompt} ({self.user_lesson.user.username})"
@@ -256,6 +448,15 @@ class Rating(models.Model):
         return f"{self.user.username} rated {self.lesson.title} with {self.rating}"
 
 
+def subtree_q(path):
+    """
+    Filter for UserDirectory rows whose path starts with `path`. Paths only
+    hold digits and "/", and "0" sorts right after "/", so this is a range
+    on the path index rather than a LIKE.
+    """
+    return models.Q(path__gte=path, path__lt=path[:-1] + "0")
+
+
 class UserDirectory(models.Model):
     """
     Represents a directory/folder for organizing user lessons.
@@ -275,6 +476,11 @@ class UserDirectory(models.Model):
         related_name="subdirectories",
     )
     is_root = models.BooleanField(default=False)
+    # Materialised path: ids from the root down to this directory, like
+    # "/1/5/9/", and the number of ancestors. Maintained by save(); a
+    # directory's subtree is every path starting with its own.
+    path = models.CharField(max_length=1024, blank=True, db_index=True, editable=False)
+    depth = models.PositiveIntegerField(default=0, editable=False)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
@@ -286,19 +492,66 @@ class UserDirectory(models.Model):
     def __str__(self):
         return f"{self.name} ({self.user.username})"
 
+    def save(self, *args, **kwargs):
+        parent = self.parent_directory
+        if self.pk is None:
+            super().save(*args, **kwargs)
+            old_path, old_depth = None, 0
+        else:
+            old_path, old_depth = (
+                UserDirectory.objects.filter(pk=self.pk).values_list("path", "depth").first()
+                or (None, 0)
+            )
+            if parent is not None and old_path and parent.path.startswith(old_path):
+                raise ValueError("A directory cannot be moved into its own subtree.")
+            super().save(*args, **kwargs)
+
+        path = f"{parent.path if parent else '/'}{self.pk}/"
+        depth = parent.depth + 1 if parent else 0
+        if path == old_path:
+            return
+        if old_path:
+            # Move the whole subtree in one statement
+            UserDirectory.objects.filter(subtree_q(old_path)).update(
+                path=Concat(Value(path), Substr("path", len(old_path) + 1)),
+                depth=F("depth") + (depth - old_depth),
+            )
+        else:
+            UserDirectory.objects.filter(pk=self.pk).update(path=path, depth=depth)
+        self.path, self.depth = path, depth
+
+    def get_ancestor_ids(self):
+        """Ids of the directories from the root down to self, read from the path (no query)."""
+        return [int(dir_id) for dir_id in self.path.strip("/").split("/") if dir_id]
+
     def get_path(self):
-        """Returns the full path as a list of directories from root to self."""
-        path = []
-        current = self
-        visited = set()
-        while current is not None:
-            # Prevent infinite recursion from circular references
-            if current.id in visited:
-                break
-            visited.add(current.id)
-            path.insert(0, current)
-            current = current.parent_directory
-        return path
+        """Returns the full path as a list of directories from root to self (one query)."""
+        if self.parent_directory_id is None:
+            return [self]
+        return list(
+            UserDirectory.objects.filter(id__in=self.get_ancestor_ids()).order_by("depth")
+        )
+
+    def get_descendants(self, include_self=True):
+        """This directory's subtree, as one indexed range query on the path."""
+        descendants = UserDirectory.objects.filter(subtree_q(self.path))
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
+
+    def get_subtree_ids(self):
+        """Returns the ids of this directory and all its descendants (one query)."""
+        return list(self.get_descendants().values_list("id", flat=True))
+
+    def is_ancestor_of(self, directory):
+        """Whether `directory` is this directory or inside it (no query)."""
+        return directory.path.startswith(self.path)
+
+    def get_subtree_lessons(self):
+        """The owner's lessons anywhere in this directory's subtree."""
+        return UserLesson.objects.filter(
+            user_id=self.user_id, directory__in=self.get_descendants()
+        )
 
     def get_path_string(self):
         """Returns the full path as a string like '/Home/Folder1/Folder2'."""
@@ -320,3 +573,61 @@ class UserDirectory(models.Model):
 def create_user_root_directory(sender, instance, created, **kwargs):
     if created:
         UserDirectory.get_or_create_root_directory(instance)
+
+
+class AudioJob(models.Model):
+    """
+    A queued text-to-speech job: the prompt or usage audio of a word, or
+    (field "lesson") all audio of a lesson. Sweep jobs (field "sweep")
+    remove audio files left unreferenced by bulk deletes instead.
+
+    Word saves enqueue jobs instead of calling gTTS inside the request; the
+    audio worker (manage.py run_audio_worker, see base/utils_audio_jobs.py)
+    claims and runs them.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_DONE, "Done"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    word = models.ForeignKey(
+        Word, on_delete=models.CASCADE, null=True, blank=True, related_name="audio_jobs"
+    )
+    lesson = models.ForeignKey(
+        Lesson, on_delete=models.CASCADE, null=True, blank=True, related_name="audio_jobs"
+    )
+    field = models.CharField(max_length=20)  # "prompt", "usage", "lesson" or "sweep"
+    # Text to synthesise; a job whose text no longer matches the word is
+    # skipped. Sweep jobs hold the audio files to release, one per line
+    text = models.TextField(blank=True)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    # Set by the worker that claimed the job
+    claimed_by = models.CharField(max_length=32, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    # Progress of lesson jobs, in audio files
+    total = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"]),
+        ]
+
+    def __str__(self):
+        if self.field == "sweep":
+            return f"Audio sweep ({self.status})"
+        if self.lesson_id:
+            return f"Audio for lesson {self.lesson_id} ({self.status})"
+        return f"{self.field} audio for word {self.word_id} ({self.status})"
@@ -1,11 +1,37 @@
 # set DJANGO_SETTINGS_MODULE=languagelearningapp.settings
 # pytest languagelearningapp/base/test_views.py
+import csv
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import zipfile
 import pytest
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.db import connection
 from django.test import Client
+from django.test.utils import CaptureQueriesContext
 from django.contrib.messages import get_messages
-from .models import Lesson, Word, UserLesson, UserWord, AccessType, Language
+from django.utils import timezone
+from . import utils_audio_jobs, utils_lesson_import
+from .models import (
+    Lesson, Word, UserLesson, UserWord, AccessType, Language, UserDirectory, AudioJob
+)
+from .utils_answers import evaluate_answer, parse_accepted_answers
+from .utils_audio_jobs import convert_existing_audio, run_pending_jobs
+from .utils_lesson_clone import clone_lesson
+from .utils_tts import (
+    StubBackend, generate_audio_file, generate_audio_files, get_cached_audio, get_language_code
+)
+
+
+@pytest.fixture(autouse=True)
+def stub_tts(settings, tmp_path):
+    # Synthesise silent files into a temporary media root instead of calling gTTS
+    settings.TTS_BACKEND = "stub"
+    settings.MEDIA_ROOT = str(tmp_path)
 
 
 @pytest.fixture
@@ -353,7 +379,7 @@ def test_export_lesson_json(client, user, lesson):
     )
     assert response.status_code == 200
     assert response["Content-Type"] == "application/json"
-    assert b"title" in response.content
+    assert b"title" in b"".join(response.streaming_content)
 
 
 @pytest.mark.django_db
@@ -479,3 +505,976 @@ def test_generate_lesson_audio_unauthenticated(client, user_lesson):
         reverse("generate-lesson-audio", kwargs={"my_lesson_id": user_lesson.id})
     )
     assert response.status_code == 302  # Redirect to login
+
+
+@pytest.mark.django_db
+def test_practice_round_uses_cached_cards(
+    client, user, user_lesson, user_word, django_assert_max_num_queries
+):
+    client.login(username="testuser", password="testpass")
+    client.get(
+        reverse("start-practice", kwargs={"user_lesson_id": user_lesson.id, "mode": "normal"})
+    )
+    practice_url = reverse(
+        "practice", kwargs={"user_lesson_id": user_lesson.id, "mode": "normal"}
+    )
+    feedback_url = reverse(
+        "practice-feedback", kwargs={"user_lesson_id": user_lesson.id, "mode": "normal"}
+    )
+    # Each request only loads/saves the session and the user; grading adds
+    # the scheduler's refill query and a single progress UPDATE
+    with django_assert_max_num_queries(5):
+        response = client.post(practice_url, {"answer": "hello"})
+        assert response.status_code == 302
+    with django_assert_max_num_queries(7):
+        response = client.post(feedback_url)
+        assert response.status_code == 302
+    user_word.refresh_from_db()
+    assert user_word.current_progress == 1
+
+
+@pytest.mark.django_db
+def test_practice_progress_is_buffered_until_cancel(client, user, user_lesson, lesson, settings):
+    settings.PRACTICE_FLUSH_EVERY = 10
+    for prompt in ("one", "two"):
+        word = Word.objects.create(lesson=lesson, prompt=prompt, translation=prompt)
+        UserWord.objects.create(user_lesson=user_lesson, word=word)
+    client.login(username="testuser", password="testpass")
+    kwargs = {"user_lesson_id": user_lesson.id, "mode": "reverse"}
+    client.get(reverse("start-practice", kwargs=kwargs))
+    client.post(reverse("practice", kwargs=kwargs), {"answer": "wrong"})
+    client.post(reverse("practice-feedback", kwargs=kwargs), {"accept_as_correct": "1"})
+    # Progress is kept in the session until the next flush point
+    assert sum(UserWord.objects.values_list("current_progress", flat=True)) == 0
+    client.post(reverse("cancel-practice", kwargs={"user_lesson_id": user_lesson.id}))
+    assert sum(UserWord.objects.values_list("current_progress", flat=True)) == 1
+
+
+@pytest.mark.django_db
+def test_abandoned_sessions_are_written_back(client, user, user_lesson, lesson, settings):
+    settings.PRACTICE_FLUSH_EVERY = 10
+    for prompt in ("one", "two", "three"):
+        word = Word.objects.create(lesson=lesson, prompt=prompt, translation=prompt)
+        UserWord.objects.create(user_lesson=user_lesson, word=word)
+    root = UserDirectory.get_or_create_root_directory(user)
+    client.login(username="testuser", password="testpass")
+    kwargs = {"user_lesson_id": user_lesson.id, "mode": "reverse"}
+    client.get(reverse("start-practice", kwargs=kwargs))
+    client.post(reverse("practice", kwargs=kwargs), {"answer": "wrong"})
+    client.post(reverse("practice-feedback", kwargs=kwargs), {"accept_as_correct": "1"})
+    assert sum(UserWord.objects.values_list("current_progress", flat=True)) == 0
+
+    # Left mid-window for a review: the answer is saved when the review starts
+    client.get(reverse("start-review-directory", kwargs={"directory_id": root.id}))
+    assert sum(UserWord.objects.values_list("current_progress", flat=True)) == 1
+
+    review = {"directory_id": root.id}
+    prompt = client.get(reverse("review", kwargs=review)).context["card"]["prompt"]
+    client.post(reverse("review", kwargs=review), {"answer": prompt})
+    client.post(reverse("review-feedback", kwargs=review))
+    assert sum(UserWord.objects.values_list("current_progress", flat=True)) == 1
+    # Opening the lesson writes back the review's answers too
+    client.get(reverse("my-lesson-details", kwargs={"my_lesson_id": user_lesson.id}))
+    assert sum(UserWord.objects.values_list("current_progress", flat=True)) == 2
+
+
+@pytest.mark.django_db
+def test_copy_lesson_keeps_progress_buffered_by_practice(
+    client, user, user_lesson, lesson, access_type_private, settings
+):
+    settings.PRACTICE_FLUSH_EVERY = 10
+    for prompt in ("one", "two"):
+        word = Word.objects.create(lesson=lesson, prompt=prompt, translation=prompt)
+        UserWord.objects.create(user_lesson=user_lesson, word=word)
+    client.login(username="testuser", password="testpass")
+    kwargs = {"user_lesson_id": user_lesson.id, "mode": "reverse"}
+    client.get(reverse("start-practice", kwargs=kwargs))
+    client.post(reverse("practice", kwargs=kwargs), {"answer": "wrong"})
+    client.post(reverse("practice-feedback", kwargs=kwargs), {"accept_as_correct": "1"})
+    client.get(reverse("copy-lesson", kwargs={"my_lesson_id": user_lesson.id}))
+    copy = UserLesson.objects.get(user=user, lesson__original_lesson=lesson)
+    assert sum(copy.user_words.values_list("current_progress", flat=True)) == 1
+
+
+@pytest.mark.django_db
+def test_sm2_schedules_correct_answer_into_the_future(client, user, user_lesson, user_word, settings):
+    settings.PRACTICE_SCHEDULER = "sm2"
+    client.login(username="testuser", password="testpass")
+    kwargs = {"user_lesson_id": user_lesson.id, "mode": "normal"}
+    client.get(reverse("start-practice", kwargs=kwargs))
+    client.post(reverse("practice", kwargs=kwargs), {"answer": "hello"})
+    client.post(reverse("practice-feedback", kwargs=kwargs))
+    user_word.refresh_from_db()
+    assert user_word.repetitions == 1
+    assert user_word.interval == 1
+    assert user_word.due > timezone.now()
+    # Nothing is due any more, so a new session is not started
+    response = client.get(reverse("start-practice", kwargs=kwargs))
+    assert response.url == reverse("my-lesson-details", kwargs={"my_lesson_id": user_lesson.id})
+
+
+@pytest.mark.django_db
+def test_review_draws_due_words_from_all_lessons_in_subtree(client, user, lesson, language, access_type_write):
+    root = UserDirectory.get_or_create_root_directory(user)
+    folder = UserDirectory.objects.create(name="Folder", user=user, parent_directory=root)
+    other_lesson = Lesson.objects.create(
+        title="Other", prompt_language=language, translation_language=language,
+        author=user, access_type=access_type_write,
+    )
+    for target_lesson, directory in ((lesson, root), (other_lesson, folder)):
+        user_lesson = UserLesson.objects.create(user=user, lesson=target_lesson, directory=directory)
+        word = Word.objects.create(lesson=target_lesson, prompt=target_lesson.title, translation="x")
+        UserWord.objects.create(user_lesson=user_lesson, word=word)
+
+    client.login(username="testuser", password="testpass")
+    response = client.get(reverse("start-review-directory", kwargs={"directory_id": root.id}))
+    assert response.url == reverse("review", kwargs={"directory_id": root.id})
+    answered = set()
+    for _ in range(2):
+        response = client.get(reverse("review", kwargs={"directory_id": root.id}))
+        assert response.status_code == 200
+        prompt = response.context["card"]["prompt"]
+        answered.add(prompt)
+        client.post(reverse("review", kwargs={"directory_id": root.id}), {"answer": prompt})
+        client.post(reverse("review-feedback", kwargs={"directory_id": root.id}))
+    assert answered == {"Test Lesson", "Other"}
+    assert not UserWord.objects.filter(current_progress=0).exists()
+
+
+@pytest.mark.django_db
+def test_reset_progress_ends_reviews_that_cover_the_lesson(
+    client, user, lesson, language, access_type_write, settings
+):
+    settings.PRACTICE_FLUSH_EVERY = 10
+    root = UserDirectory.get_or_create_root_directory(user)
+    folder = UserDirectory.objects.create(name="Folder", user=user, parent_directory=root)
+    sibling = UserDirectory.objects.create(name="Sibling", user=user, parent_directory=root)
+    other_lesson = Lesson.objects.create(
+        title="Other", prompt_language=language, translation_language=language,
+        author=user, access_type=access_type_write,
+    )
+    user_lessons = {}
+    for target_lesson, directory in ((lesson, folder), (other_lesson, sibling)):
+        user_lessons[directory.id] = UserLesson.objects.create(
+            user=user, lesson=target_lesson, directory=directory
+        )
+        for prompt in ("one", "two"):
+            word = Word.objects.create(lesson=target_lesson, prompt=prompt, translation="x")
+            UserWord.objects.create(user_lesson=user_lessons[directory.id], word=word)
+
+    client.login(username="testuser", password="testpass")
+    for directory in (root, sibling):
+        client.get(reverse("start-review-directory", kwargs={"directory_id": directory.id}))
+    response = client.get(reverse("review", kwargs={"directory_id": root.id}))
+    prompt = response.context["card"]["prompt"]
+    client.post(reverse("review", kwargs={"directory_id": root.id}), {"answer": prompt})
+    client.post(reverse("review-feedback", kwargs={"directory_id": root.id}))
+
+    client.post(reverse("reset-progress", kwargs={"my_lesson_id": user_lessons[folder.id].id}))
+    assert f"practice_review_dir_{root.id}" not in client.session
+    assert f"practice_review_dir_{sibling.id}" in client.session
+    assert not UserWord.objects.filter(
+        user_lesson=user_lessons[folder.id], current_progress__gt=0
+    ).exists()
+
+
+@pytest.mark.django_db
+def test_shuffle_session_payload_does_not_grow_with_lesson(client, user, user_lesson, lesson, settings):
+    settings.PRACTICE_SCHEDULER = "shuffle"
+    user_lesson.practice_window = 2
+    user_lesson.save()
+    for i in range(30):
+        word = Word.objects.create(lesson=lesson, prompt=f"word{i}", translation=f"t{i}")
+        UserWord.objects.create(user_lesson=user_lesson, word=word)
+    client.login(username="testuser", password="testpass")
+    kwargs = {"user_lesson_id": user_lesson.id, "mode": "normal"}
+    client.get(reverse("start-practice", kwargs=kwargs))
+    state = client.session[f"practice_normal_{user_lesson.id}"]
+    assert len(state["cards"]) == 2
+    assert "pool" not in state
+    seen = []
+    while True:
+        response = client.get(reverse("practice", kwargs=kwargs))
+        if response.status_code != 200:
+            break
+        prompt = response.context["card"]["prompt"]
+        seen.append(prompt)
+        client.post(reverse("practice", kwargs=kwargs), {"answer": prompt})
+        client.post(reverse("practice-feedback", kwargs=kwargs))
+    # Every word is served exactly once and its progress written back
+    assert sorted(seen) == sorted(f"word{i}" for i in range(30))
+    assert not UserWord.objects.filter(current_progress=0).exists()
+
+
+def test_evaluate_answer_normalises_before_comparing(settings):
+    settings.ANSWER_NORMALISATION = [
+        "nfkc", "casefold", "strip_accents", "strip_punctuation",
+        "strip_articles", "collapse_whitespace",
+    ]
+    assert evaluate_answer("  zolw ", "Żółw!", "Polish") == (0, "")
+    assert evaluate_answer("Haus", "das Haus", "German") == (0, "")
+    # The highlight is drawn on the correct answer as written
+    assert evaluate_answer("Hund", "der Mund", "German") == (
+        1, 'der <span class="diff">M</span>und'
+    )
+    settings.ANSWER_NORMALISATION = ["casefold"]
+    assert evaluate_answer("zolw", "żółw", "Polish")[0] == 3
+
+
+@pytest.mark.django_db
+def test_practice_accepts_any_alternative_of_the_answer(client, user, user_lesson, lesson):
+    word = Word.objects.create(lesson=lesson, prompt="car; automobile", translation="Auto")
+    assert [a for a, _ in word.prompt_answers] == ["car", "automobile"]
+    assert [a for a, _ in parse_accepted_answers("to run / to jog|to race")] == [
+        "to run", "to jog", "to race"
+    ]
+    assert [a for a, _ in parse_accepted_answers("he/she")] == ["he/she"]
+    assert [a for a, _ in parse_accepted_answers("100 km/h")] == ["100 km/h"]
+    UserWord.objects.create(user_lesson=user_lesson, word=word)
+    client.login(username="testuser", password="testpass")
+    kwargs = {"user_lesson_id": user_lesson.id, "mode": "normal"}
+    client.get(reverse("start-practice", kwargs=kwargs))
+    client.post(reverse("practice", kwargs=kwargs), {"answer": "automobil"})
+    response = client.get(reverse("practice-feedback", kwargs=kwargs))
+    assert response.context["lev_distance"] == 1
+    assert response.context["diff_html"] == "automobil<span class=\"diff\">e</span>"
+
+
+@pytest.mark.django_db
+def test_edit_word_queues_audio_for_the_worker(client, user, user_word):
+    client.login(username="testuser", password="testpass")
+    data = {"prompt": "edited", "translation": "editado", "usage": "", "hint": ""}
+    client.post(reverse("edit-word", kwargs={"my_word_id": user_word.id}), data)
+    job = AudioJob.objects.get(word=user_word.word)
+    assert (job.field, job.text, job.status) == ("prompt", "edited", AudioJob.STATUS_PENDING)
+    status_url = reverse("word-audio-status", kwargs={"my_word_id": user_word.id})
+    assert client.get(status_url).json()["pending"] is True
+
+    assert run_pending_jobs() == 1
+    job.refresh_from_db()
+    assert job.status == AudioJob.STATUS_DONE
+    user_word.word.refresh_from_db()
+    assert user_word.word.has_prompt_audio()
+    assert client.get(status_url).json()["pending"] is False
+
+
+@pytest.mark.django_db
+def test_generate_lesson_audio_runs_as_one_job_with_progress(client, user, user_lesson, lesson):
+    for prompt in ("one", "two", "three"):
+        Word.objects.create(lesson=lesson, prompt=prompt, translation=prompt, usage=f"{prompt}!")
+    client.login(username="testuser", password="testpass")
+    response = client.post(
+        reverse("generate-lesson-audio", kwargs={"my_lesson_id": user_lesson.id})
+    )
+    job = AudioJob.objects.get(lesson=lesson)
+    assert response.url.endswith(f"?job={job.id}")
+
+    assert run_pending_jobs() == 1
+    progress = client.get(
+        reverse(
+            "generate-lesson-audio-progress",
+            kwargs={"my_lesson_id": user_lesson.id, "job_id": job.id},
+        )
+    ).json()
+    assert (progress["finished"], progress["completed"], progress["total"]) == (True, 6, 6)
+    assert not Word.objects.filter(lesson=lesson, usage_audio="").exists()
+
+
+@pytest.mark.django_db
+def test_audio_worker_survives_a_job_that_raises(settings, monkeypatch, lesson):
+    def broken(*args, **kwargs):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(utils_audio_jobs, "generate_words_audio", broken)
+    settings.AUDIO_JOB_MAX_ATTEMPTS = 2
+    job = AudioJob.objects.create(lesson=lesson, field="lesson")
+    assert utils_audio_jobs.run_pending_jobs() == 1
+    job.refresh_from_db()
+    assert (job.status, job.error, job.claimed_by) == (AudioJob.STATUS_PENDING, "disk full", "")
+    assert utils_audio_jobs.run_pending_jobs() == 1
+    job.refresh_from_db()
+    assert (job.status, job.attempts) == (AudioJob.STATUS_FAILED, 2)
+
+
+@pytest.mark.django_db
+def test_audio_files_are_shared_and_removed_with_their_last_word(lesson, tmp_path):
+    assert get_cached_audio("hello world", lesson.prompt_language) is None
+    rel_path = generate_audio_file("  hello   world ", lesson.prompt_language)
+    assert get_cached_audio("hello world", lesson.prompt_language) == rel_path
+
+    first = Word.objects.create(lesson=lesson, prompt="hello world", translation="x", prompt_audio=rel_path)
+    second = Word.objects.create(lesson=lesson, prompt="hello world!", translation="y", prompt_audio=rel_path)
+    first.delete()
+    assert (tmp_path / rel_path).exists()
+    second.delete()
+    assert not (tmp_path / rel_path).exists()
+
+
+@pytest.mark.django_db
+def test_new_languages_are_spoken_in_their_own_language(client, user, access_type_write):
+    client.login(username="testuser", password="testpass")
+    data = {
+        "title": "Ciao", "prompt_language": "Italian", "translation_language": "polish",
+        "access_type": "write", "words": [{"prompt": "ciao", "translation": "cześć"}],
+    }
+    file = io.BytesIO(json.dumps(data).encode())
+    file.name = "lesson.json"
+    client.post(reverse("import-lesson-json"), {"json_file": file})
+    lesson = Lesson.objects.get(title="Ciao")
+    assert (lesson.prompt_language.code, lesson.translation_language.code) == ("it", "pl")
+    # Rows saved without a code fall back to the code of their name
+    Language.objects.filter(name="Italian").update(code="")
+    lesson.prompt_language.refresh_from_db()
+    assert get_language_code(lesson.prompt_language) == "it"
+
+
+@pytest.mark.django_db
+def test_batch_tts_dedupes_and_skips_cached_texts(language, monkeypatch):
+    calls = []
+    synthesize = StubBackend.synthesize
+    monkeypatch.setattr(
+        StubBackend, "synthesize",
+        lambda self, text, lang, path: calls.append(text) or synthesize(self, text, lang, path),
+    )
+    requests = [("dog", language, 1), ("cat", language, 2), (" dog ", language, 3)]
+    found = generate_audio_files(requests)
+    assert sorted(calls) == ["cat", "dog"]
+    assert found[1] == found[3] != found[2]
+    # Everything is cached now; a lookup-only batch finds it without synthesis
+    assert generate_audio_files(requests, synthesize=False) == found
+    assert len(calls) == 2
+
+
+@pytest.mark.django_db
+def test_convert_audio_moves_legacy_files_into_cache_with_metadata(lesson, tmp_path):
+    (tmp_path / "audio").mkdir()
+    StubBackend().synthesize("hello", "en", str(tmp_path / "audio" / "legacy.wav"))
+    word = Word.objects.create(
+        lesson=lesson, prompt="hello", translation="hola", prompt_audio="audio/legacy.wav"
+    )
+    assert convert_existing_audio() == (1, [])
+    word.refresh_from_db()
+    assert word.prompt_audio.name == get_cached_audio("hello", lesson.prompt_language)
+    assert (word.prompt_audio_codec, word.prompt_audio_duration) == ("pcm", 0.05)
+    assert not (tmp_path / "audio" / "legacy.wav").exists()
+    # Already converted files are left alone
+    assert convert_existing_audio() == (0, [])
+
+
+@pytest.mark.django_db
+def test_convert_audio_skips_files_ffmpeg_cannot_read(lesson, tmp_path, settings):
+    settings.AUDIO_FORMAT = "opus"
+    settings.AUDIO_FFMPEG_COMMAND = str(tmp_path / "ffmpeg")
+    # Fails on the corrupt file, "converts" the other by copying it
+    (tmp_path / "ffmpeg").write_text(
+        '#!/bin/sh\nfor a; do :; done\ncase "$5" in *corrupt*) exit 1;; esac\ncp "$5" "$a"\n'
+    )
+    (tmp_path / "ffmpeg").chmod(0o755)
+    (tmp_path / "audio").mkdir()
+    for name in ("corrupt", "fine"):
+        StubBackend().synthesize(name, "en", str(tmp_path / "audio" / f"{name}.wav"))
+        Word.objects.create(
+            lesson=lesson, prompt=name, translation=name, prompt_audio=f"audio/{name}.wav"
+        )
+    assert convert_existing_audio() == (1, ["audio/corrupt.wav"])
+    assert Word.objects.get(prompt="corrupt").prompt_audio.name == "audio/corrupt.wav"
+    assert Word.objects.get(prompt="fine").prompt_audio.name.endswith(".ogg")
+
+
+@pytest.mark.django_db
+def test_convert_audio_keeps_files_it_cannot_reencode_and_probes_their_duration(
+    lesson, tmp_path, settings
+):
+    ffprobe = tmp_path / "ffprobe"
+    ffprobe.write_text(
+        "#!/bin/sh\necho '{\"streams\": [{\"codec_name\": \"mp3\"}], \"format\": {\"duration\": \"1.25\"}}'\n"
+    )
+    ffprobe.chmod(0o755)
+    settings.AUDIO_FFPROBE_COMMAND = str(ffprobe)
+    (tmp_path / "audio").mkdir()
+    (tmp_path / "audio" / "legacy.mp3").write_bytes(b"ID3 not really an mp3")
+    word = Word.objects.create(
+        lesson=lesson, prompt="hello", translation="hola", prompt_audio="audio/legacy.mp3"
+    )
+    # The stub backend writes WAV and nothing re-encodes, so the MP3 stays
+    assert convert_existing_audio() == (0, [])
+    word.refresh_from_db()
+    assert word.prompt_audio.name == "audio/legacy.mp3"
+    assert (word.prompt_audio_codec, word.prompt_audio_duration) == ("mp3", 1.25)
+    assert (tmp_path / "audio" / "legacy.mp3").exists()
+
+
+@pytest.mark.django_db
+def test_lesson_audio_bundle_serves_ranges_and_appends_new_audio(client, user, user_lesson, lesson, tmp_path):
+    def add_word(prompt):
+        rel_path = generate_audio_file(prompt, lesson.prompt_language)
+        return Word.objects.create(lesson=lesson, prompt=prompt, translation=prompt, prompt_audio=rel_path)
+
+    first = add_word("first")
+    client.login(username="testuser", password="testpass")
+    index_url = reverse("lesson-audio-bundle-index", kwargs={"my_lesson_id": user_lesson.id})
+    index = client.get(index_url).json()
+    entry = index["words"][str(first.id)]["prompt"]
+    assert entry["type"] == "audio/x-wav"
+
+    end = entry["offset"] + entry["length"] - 1
+    response = client.get(index["url"], HTTP_RANGE=f"bytes={entry['offset']}-{end}")
+    assert response.status_code == 206
+    assert b"".join(response.streaming_content) == first.prompt_audio.read()
+    assert client.get(index["url"], HTTP_IF_NONE_MATCH=f'"{index["hash"]}"').status_code == 304
+
+    # New audio is appended; what the client already has keeps its offsets
+    second = add_word("second")
+    updated = client.get(index_url).json()
+    assert updated["hash"] != index["hash"]
+    assert updated["words"][str(first.id)]["prompt"] == entry
+    assert updated["words"][str(second.id)]["prompt"]["offset"] == index["size"]
+    assert len(list((tmp_path / "audio" / "bundles").glob("*.bin"))) == 1
+
+
+@pytest.mark.django_db
+def test_import_lesson_json_streams_words_in_batches(client, user, settings, monkeypatch, django_assert_max_num_queries):
+    AccessType.objects.get_or_create(name="private")
+    # Tiny reads and batches exercise values split across chunks
+    monkeypatch.setattr(utils_lesson_import, "CHUNK_SIZE", 7)
+    settings.LESSON_IMPORT_BATCH_SIZE = 40
+    words = [{"prompt": f"słowo {i}", "translation": f"word {i}; w{i}"} for i in range(100)]
+    words.insert(3, {"prompt": "incomplete"})
+    # Words may come before the lesson fields
+    file = io.BytesIO(json.dumps({
+        "words": words, "title": "Big", "prompt_language": "Polish", "translation_language": "English",
+    }, ensure_ascii=False).encode())
+    file.name = "big.json"
+
+    client.login(username="testuser", password="testpass")
+    with django_assert_max_num_queries(60):
+        response = client.post(reverse("import-lesson-json"), {"json_file": file})
+    assert response.status_code == 302
+    lesson = Lesson.objects.get(title="Big")
+    assert lesson.words.count() == 100
+    assert UserWord.objects.filter(user_lesson__lesson=lesson).count() == 100
+    assert lesson.words.get(prompt="słowo 7").translation_answers[1][0] == "w7"
+
+
+@pytest.mark.django_db
+def test_export_lesson_formats_stream_every_word(client, user, lesson):
+    Word.objects.create(lesson=lesson, prompt="żółw", translation="turtle", usage='a "slow" one, really')
+    Word.objects.create(lesson=lesson, prompt="pies", translation="dog")
+    client.login(username="testuser", password="testpass")
+    url = reverse("export-lesson-json", kwargs={"lesson_id": lesson.id})
+
+    def export(export_format):
+        response = client.get(url, {"format": export_format})
+        assert response.status_code == 200
+        return b"".join(response.streaming_content).decode()
+
+    pretty = export("json")
+    data = json.loads(pretty)
+    assert pretty == json.dumps(data, ensure_ascii=False, indent=2)
+    assert json.loads(export("json-compact")) == data
+    lines = [json.loads(line) for line in export("jsonl").splitlines()]
+    assert lines[0]["title"] == data["title"] and lines[1:] == data["words"]
+    rows = [row for row in csv.reader(io.StringIO(export("tsv")), delimiter="\t") if not row[0].startswith("#")]
+    assert rows == [[w["prompt"], w["translation"], w["usage"], w["hint"]] for w in data["words"]]
+    assert client.get(url, {"format": "xml"}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_directory_archive_round_trip_restores_audio_without_tts(client, user, user_lesson, lesson, monkeypatch, settings):
+    root = UserDirectory.get_or_create_root_directory(user)
+    folder = UserDirectory.objects.create(user=user, parent_directory=root, name="Folder")
+    user_lesson.directory = folder
+    user_lesson.save()
+    rel_path = generate_audio_file("hello", lesson.prompt_language)
+    Word.objects.create(lesson=lesson, prompt="hello", translation="hola", prompt_audio=rel_path)
+    Word.objects.create(lesson=lesson, prompt="bye", translation="adiós")
+    # Lessons without a directory are in Home, so the archive of Home has them
+    loose = Lesson.objects.create(
+        title="Loose", prompt_language=lesson.prompt_language,
+        translation_language=lesson.translation_language, author=user,
+        access_type=lesson.access_type,
+    )
+    UserLesson.objects.create(user=user, lesson=loose)
+
+    client.login(username="testuser", password="testpass")
+    response = client.get(reverse("export-directory-archive", kwargs={"directory_id": root.id}))
+    archive = io.BytesIO(b"".join(response.streaming_content))
+    archive.name = "Home.zip"
+
+    def no_tts(*args):
+        raise AssertionError("restoring must not synthesise audio")
+
+    monkeypatch.setattr(StubBackend, "synthesize", no_tts)
+    other = User.objects.create_user(username="other", password="pass")
+    other_root = UserDirectory.get_or_create_root_directory(other)
+    client.login(username="other", password="pass")
+    response = client.post(
+        reverse("import-directory-archive", kwargs={"directory_id": other_root.id}),
+        {"archive_file": archive},
+    )
+    assert response.status_code == 302
+    assert UserLesson.objects.get(user=other, lesson__title="Loose").directory == other_root
+    restored = UserLesson.objects.get(user=other, lesson__title=lesson.title)
+    assert restored.directory.name == "Folder" and restored.directory.parent_directory == other_root
+    words = {w.prompt: w for w in restored.lesson.words.all()}
+    assert words["hello"].has_prompt_audio() and not words["bye"].prompt_audio
+    assert words["hello"].prompt_audio.read() == Word.objects.get(lesson=lesson, prompt="hello").prompt_audio.read()
+    assert UserWord.objects.filter(user_lesson=restored).count() == 2
+
+    # A damaged member (here a bad checksum) is reported, not a server error,
+    # and audio restored before it is removed with the rolled back lessons
+    audio = b"RIFF new audio"
+    audio_hash = hashlib.sha256(audio).hexdigest()
+    damaged = io.BytesIO()
+    with zipfile.ZipFile(damaged, "w", zipfile.ZIP_STORED) as z:
+        z.writestr("manifest.json", json.dumps({
+            "format": "languagelearningapp-archive", "version": 1, "name": "Home",
+            "directories": [], "lessons": [
+                {"file": "lessons/00001.jsonl", "directory": []},
+                {"file": "lessons/00002.jsonl", "directory": []},
+            ],
+        }))
+        z.writestr(f"audio/{audio_hash}.wav", audio)
+        z.writestr("lessons/00001.jsonl", "\n".join([
+            json.dumps({
+                "title": "Fine", "prompt_language": "English",
+                "translation_language": "English", "access_type": "write",
+            }),
+            json.dumps({"prompt": "hi", "translation": "hi", "prompt_audio": f"audio/{audio_hash}.wav"}),
+        ]))
+        z.writestr("lessons/00002.jsonl", '{"title": "Damaged"}\n')
+    damaged = io.BytesIO(damaged.getvalue().replace(b"Damaged", b"Dameged"))
+    damaged.name = "Home.zip"
+    response = client.post(
+        reverse("import-directory-archive", kwargs={"directory_id": other_root.id}),
+        {"archive_file": damaged},
+    )
+    assert response.status_code == 302
+    assert "Could not restore" in str(list(get_messages(response.wsgi_request))[-1])
+    assert not Lesson.objects.filter(title="Fine").exists()
+    assert not os.path.exists(
+        os.path.join(settings.MEDIA_ROOT, "audio", "imported", audio_hash[:2], f"{audio_hash}.wav")
+    )
+
+
+@pytest.mark.django_db
+def test_import_anki_deck_reuses_bundled_audio(client, user, language, access_type_write, tmp_path):
+    db_path = tmp_path / "collection.anki2"
+    db = sqlite3.connect(db_path)
+    db.execute("CREATE TABLE col (models TEXT)")
+    db.execute("CREATE TABLE notes (id INTEGER, mid INTEGER, flds TEXT)")
+    model = {"flds": [{"name": "Back", "ord": 1}, {"name": "Front", "ord": 0}, {"name": "Example", "ord": 2}]}
+    db.execute("INSERT INTO col VALUES (?)", [json.dumps({"7": model})])
+    db.executemany("INSERT INTO notes VALUES (?, 7, ?)", [
+        (1, "kot[sound:kot.wav]\x1fcat\x1fMój <b>kot</b>&nbsp;śpi"),
+        (2, "pies\x1fdog\x1f"),
+        (3, "\x1fno prompt\x1f"),
+    ])
+    db.commit()
+    db.close()
+    StubBackend().synthesize("kot", "pl", str(tmp_path / "kot.wav"))
+    apkg = io.BytesIO()
+    with zipfile.ZipFile(apkg, "w") as archive:
+        archive.write(db_path, "collection.anki2")
+        archive.write(tmp_path / "kot.wav", "0")
+        archive.writestr("media", json.dumps({"0": "kot.wav"}))
+    apkg.seek(0)
+    apkg.name = "Animals.apkg"
+
+    client.login(username="testuser", password="testpass")
+    form = {"prompt_language": language.id, "translation_language": language.id, "access_type": access_type_write.id}
+    response = client.post(reverse("import-deck"), {**form, "deck_file": apkg})
+    assert response.status_code == 302
+    lesson = Lesson.objects.get(title="Animals")
+    kot = lesson.words.get(prompt="kot")
+    assert (kot.translation, kot.usage) == ("cat", "Mój kot śpi")
+    assert kot.has_prompt_audio() and kot.prompt_audio_codec == "pcm"
+    assert not lesson.words.get(prompt="pies").prompt_audio
+    assert lesson.words.count() == UserWord.objects.filter(user_lesson__lesson=lesson).count() == 2
+
+    tsv = io.BytesIO("#separator:tab\n#columns:hint\tprompt\ttranslation\nh\tdom\thouse\n".encode())
+    tsv.name = "Home.tsv"
+    client.post(reverse("import-deck"), {**form, "deck_file": tsv})
+    assert Lesson.objects.get(title="Home").words.get().hint == "h"
+
+
+@pytest.mark.django_db
+def test_import_anki_deck_rejects_bad_decks_without_leaving_audio(client, user, language, access_type_write, tmp_path, settings):
+    def apkg(notes, extra=()):
+        db_path = tmp_path / "collection.anki2"
+        db_path.unlink(missing_ok=True)
+        db = sqlite3.connect(db_path)
+        db.execute("CREATE TABLE col (models TEXT)")
+        db.execute("CREATE TABLE notes (id INTEGER, mid INTEGER, flds TEXT)")
+        db.execute("INSERT INTO col VALUES (?)", [json.dumps({"7": {"flds": [{"name": "Front", "ord": 0}, {"name": "Back", "ord": 1}]}})])
+        db.executemany("INSERT INTO notes VALUES (?, 7, ?)", notes)
+        db.commit()
+        db.close()
+        StubBackend().synthesize("kot", "pl", str(tmp_path / "kot.wav"))
+        data = io.BytesIO()
+        with zipfile.ZipFile(data, "w") as archive:
+            archive.write(db_path, "collection.anki2")
+            archive.write(tmp_path / "kot.wav", "0")
+            archive.writestr("media", json.dumps({"0": "kot.wav"}))
+            for name in extra:
+                archive.writestr(name, b"zstd")
+        data.seek(0)
+        data.name = "Bad.apkg"
+        return data
+
+    client.login(username="testuser", password="testpass")
+    form = {"prompt_language": language.id, "translation_language": language.id, "access_type": access_type_write.id}
+    placeholder = apkg([(1, "Please update Anki\x1fx")], extra=["collection.anki21b"])
+    response = client.post(reverse("import-deck"), {**form, "deck_file": placeholder})
+    assert "newest Anki format" in str(list(get_messages(response.wsgi_request))[0])
+
+    broken = apkg([(1, "kot[sound:kot.wav]\x1fcat"), (2, None)])
+    response = client.post(reverse("import-deck"), {**form, "deck_file": broken})
+    assert response.status_code == 302
+    assert not Lesson.objects.filter(title="Bad").exists()
+    imported_dir = os.path.join(settings.MEDIA_ROOT, "audio", "imported")
+    assert os.path.isdir(imported_dir)
+    assert not [files for _, _, files in os.walk(imported_dir) if files]
+
+
+@pytest.mark.django_db
+def test_copy_lesson_clones_words_in_bulk_with_progress_and_audio(
+    client, user, user_lesson, lesson, access_type_private, django_assert_max_num_queries
+):
+    rel_path = generate_audio_file("shared", lesson.prompt_language)
+    for i in range(60):
+        word = Word.objects.create(lesson=lesson, prompt=f"p{i}", translation=f"t{i}", prompt_audio=rel_path)
+        UserWord.objects.create(user_lesson=user_lesson, word=word, current_progress=i % 3, notes=f"n{i}")
+
+    client.login(username="testuser", password="testpass")
+    with django_assert_max_num_queries(30):
+        response = client.get(reverse("copy-lesson", kwargs={"my_lesson_id": user_lesson.id}))
+    assert response.status_code == 302
+    copy = UserLesson.objects.get(user=user, lesson__original_lesson=lesson)
+    user_words = {uw.word.prompt: uw for uw in copy.user_words.select_related("word")}
+    assert len(user_words) == 60
+    assert (user_words["p7"].current_progress, user_words["p7"].notes) == (1, "n7")
+    assert user_words["p7"].word.prompt_audio.name == rel_path
+    assert user_words["p7"].word.translation_answers == [["t7", "t7"]]
+
+
+@pytest.mark.django_db
+def test_lesson_fork_shares_words_until_it_changes_them(client, user, user_lesson, lesson, access_type_private):
+    words = [Word.objects.create(lesson=lesson, prompt=f"p{i}", translation=f"t{i}") for i in range(3)]
+    for word in words:
+        UserWord.objects.create(user_lesson=user_lesson, word=word)
+
+    client.login(username="testuser", password="testpass")
+    client.get(reverse("copy-lesson", kwargs={"my_lesson_id": user_lesson.id}))
+    fork = UserLesson.objects.get(user=user, lesson__original_lesson=lesson)
+    assert Word.objects.count() == 3
+    assert fork.lesson.word_source == lesson
+
+    edited = fork.user_words.get(word=words[0])
+    data = {"prompt": "p0", "translation": "changed", "usage": "", "hint": ""}
+    client.post(reverse("edit-word", kwargs={"my_word_id": edited.id}), data)
+    edited.refresh_from_db()
+    assert edited.word.lesson == fork.lesson and edited.word.translation == "changed"
+    words[0].refresh_from_db()
+    assert words[0].translation == "t0"
+
+    client.post(reverse("delete-word", kwargs={"my_word_id": fork.user_words.get(word=words[1]).id}))
+    assert Word.objects.filter(id=words[1].id).exists()
+    assert sorted(fork.lesson.get_words().values_list("translation", flat=True)) == ["changed", "t2"]
+
+    # Upstream edits reach the words the fork still shares
+    Word.objects.filter(id=words[2].id).update(translation="upstream")
+    assert fork.lesson.get_words().filter(translation="upstream").exists()
+
+    lesson.delete()
+    fork.lesson.refresh_from_db()
+    assert fork.lesson.word_source is None
+    assert sorted(fork.lesson.words.values_list("translation", flat=True)) == ["changed", "upstream"]
+    assert fork.user_words.count() == 2
+
+
+@pytest.mark.django_db
+def test_importing_a_lesson_without_hints_shares_its_words(client, user, lesson, access_type_private):
+    for prompt in ("house", "tree"):
+        Word.objects.create(lesson=lesson, prompt=prompt, translation=prompt)
+    other = User.objects.create_user(username="other", password="pass")
+    assert other.userprofile.auto_generate_hints
+    client.login(username="other", password="pass")
+    client.get(reverse("import-lesson", kwargs={"lesson_id": lesson.id}))
+    fork = UserLesson.objects.get(user=other)
+    assert Word.objects.count() == 2 and fork.lesson.auto_hints
+
+    # The hint is derived when the word is shown
+    my_word = fork.user_words.get(word__prompt="house")
+    response = client.get(reverse("my-word-details", kwargs={"my_word_id": my_word.id}))
+    assert response.context["hint"] == "H"
+    kwargs = {"user_lesson_id": fork.id, "mode": "normal"}
+    client.get(reverse("start-practice", kwargs=kwargs))
+    response = client.get(reverse("practice", kwargs=kwargs))
+    assert response.context["card"]["hint"] in ("H", "T")
+
+
+@pytest.mark.django_db
+def test_lesson_fork_keeps_shared_words_when_the_source_goes(client, user, language, access_type_write, access_type_private):
+    author = User.objects.create_user(username="author", password="authorpass")
+    source = Lesson.objects.create(
+        title="Source", prompt_language=language, translation_language=language,
+        author=author, access_type=access_type_write,
+    )
+    author_lesson = UserLesson.objects.create(user=author, lesson=source)
+    words = [Word.objects.create(lesson=source, prompt=f"p{i}", translation=f"t{i}") for i in range(3)]
+    for word in words:
+        UserWord.objects.create(user_lesson=author_lesson, word=word)
+    fork = clone_lesson(source, user, UserDirectory.get_or_create_root_directory(user))
+    fork.lesson.access_type = access_type_write
+    fork.lesson.save()
+
+    client.login(username="testuser", password="testpass")
+    url = reverse("word-details", kwargs={"lesson_id": fork.lesson.id, "prompt": "p1"})
+    assert client.get(url).status_code == 200
+
+    client.login(username="author", password="authorpass")
+    author_word = author_lesson.user_words.get(word=words[0])
+    client.post(reverse("delete-word", kwargs={"my_word_id": author_word.id}))
+    assert not Word.objects.filter(id=words[0].id).exists()
+    assert fork.lesson.get_words().count() == 3 and fork.user_words.count() == 3
+
+    # Deleting the author cascades to the source lesson
+    author.delete()
+    fork.lesson.refresh_from_db()
+    assert fork.lesson.word_source is None
+    assert sorted(fork.lesson.words.values_list("prompt", flat=True)) == ["p0", "p1", "p2"]
+    assert fork.user_words.count() == 3
+
+
+@pytest.mark.django_db
+def test_directory_paths_follow_moves_and_answer_tree_queries(client, user, django_assert_num_queries):
+    root = UserDirectory.get_or_create_root_directory(user)
+    a = UserDirectory.objects.create(user=user, parent_directory=root, name="A")
+    b = UserDirectory.objects.create(user=user, parent_directory=a, name="B")
+    c = UserDirectory.objects.create(user=user, parent_directory=b, name="C")
+    other = UserDirectory.objects.create(user=user, parent_directory=root, name="Other")
+    assert (c.path, c.depth) == (f"/{root.id}/{a.id}/{b.id}/{c.id}/", 3)
+
+    with django_assert_num_queries(1):
+        assert c.get_path() == [root, a, b, c]
+    with django_assert_num_queries(1):
+        assert sorted(a.get_subtree_ids()) == sorted([a.id, b.id, c.id])
+    assert a.is_ancestor_of(c) and not c.is_ancestor_of(a)
+
+    client.login(username="testuser", password="testpass")
+    move = {"item_type": "directory", "item_id": a.id, "target_directory_id": c.id}
+    client.post(reverse("drag-drop-move"), move)
+    a.refresh_from_db()
+    assert a.parent_directory == root
+
+    a.parent_directory = other
+    a.save()
+    c.refresh_from_db()
+    assert (c.path, c.depth) == (f"/{root.id}/{other.id}/{a.id}/{b.id}/{c.id}/", 4)
+    assert [d.name for d in c.get_path()] == ["Home", "Other", "A", "B", "C"]
+
+
+@pytest.mark.django_db
+def test_breadcrumbs_come_from_the_cached_directory_tree(client, user, lesson):
+    root = UserDirectory.get_or_create_root_directory(user)
+    folder = UserDirectory.objects.create(user=user, parent_directory=root, name="Folder")
+    my_lesson = UserLesson.objects.create(user=user, lesson=lesson, directory=folder)
+    url = reverse("my-lesson-details", kwargs={"my_lesson_id": my_lesson.id})
+
+    client.login(username="testuser", password="testpass")
+    client.get(url)
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(url)
+    assert b"Folder" in response.content
+    assert not [q for q in queries.captured_queries if "base_userdirectory" in q["sql"]]
+
+    # Any directory change replaces the version stamp
+    folder.name = "Renamed"
+    folder.save()
+    assert b"Renamed" in client.get(url).content
+
+
+@pytest.mark.django_db
+def test_delete_directory_works_on_whole_subtrees(client, user, language, access_type_write, django_assert_max_num_queries):
+    root = UserDirectory.get_or_create_root_directory(user)
+    folder = UserDirectory.objects.create(user=user, parent_directory=root, name="Folder")
+    clash = UserDirectory.objects.create(user=user, parent_directory=root, name="Sub")
+    sub = UserDirectory.objects.create(user=user, parent_directory=folder, name="Sub")
+    deep = UserDirectory.objects.create(user=user, parent_directory=sub, name="Deep")
+    for i, directory in enumerate([folder, sub, deep] * 4):
+        lesson = Lesson.objects.create(
+            title=f"L{i}", prompt_language=language, translation_language=language,
+            author=user, access_type=access_type_write,
+        )
+        user_lesson = UserLesson.objects.create(user=user, lesson=lesson, directory=directory)
+        for j in range(5):
+            word = Word.objects.create(lesson=lesson, prompt=f"p{j}", translation=f"t{j}")
+            UserWord.objects.create(user_lesson=user_lesson, word=word)
+
+    client.login(username="testuser", password="testpass")
+    url = reverse("delete-directory", kwargs={"directory_id": folder.id})
+    client.post(url, {"action": "move_contents"})
+    sub.refresh_from_db()
+    deep.refresh_from_db()
+    assert (sub.parent_directory, sub.name) == (root, "Sub (2)")
+    assert (deep.path, deep.depth) == (f"/{root.id}/{sub.id}/{deep.id}/", 2)
+    assert UserLesson.objects.filter(directory=root).count() == 4
+
+    url = reverse("delete-directory", kwargs={"directory_id": sub.id})
+    with django_assert_max_num_queries(30):
+        client.post(url, {"action": "delete_all"})
+    assert not UserDirectory.objects.filter(id__in=[sub.id, deep.id]).exists()
+    assert UserLesson.objects.count() == 4
+    assert UserWord.objects.count() == 20
+    assert Lesson.objects.count() == 12
+    assert UserDirectory.objects.filter(id=clash.id).exists()
+
+
+@pytest.mark.django_db
+def test_delete_directory_removes_private_lessons_nobody_else_uses(
+    client, user, language, access_type_write, access_type_private, settings
+):
+    root = UserDirectory.get_or_create_root_directory(user)
+    folder = UserDirectory.objects.create(user=user, parent_directory=root, name="Folder")
+    other = User.objects.create_user(username="other", password="pass")
+    lessons = {}
+    for name, access_type in [
+        ("orphan", access_type_private), ("shared", access_type_private),
+        ("forked", access_type_private), ("public", access_type_write),
+    ]:
+        lessons[name] = Lesson.objects.create(
+            title=name, prompt_language=language, translation_language=language,
+            author=user, access_type=access_type,
+        )
+        UserLesson.objects.create(user=user, lesson=lessons[name], directory=folder)
+    UserLesson.objects.create(user=other, lesson=lessons["shared"])
+    Lesson.objects.create(
+        title="fork", prompt_language=language, translation_language=language,
+        author=other, access_type=access_type_private, word_source=lessons["forked"],
+    )
+    only = generate_audio_file("only", language)
+    kept = generate_audio_file("kept", language)
+    Word.objects.create(lesson=lessons["orphan"], prompt="only", translation="t", prompt_audio=only)
+    Word.objects.create(lesson=lessons["orphan"], prompt="kept", translation="t", prompt_audio=kept)
+    Word.objects.create(lesson=lessons["public"], prompt="kept", translation="t", prompt_audio=kept)
+
+    client.login(username="testuser", password="testpass")
+    url = reverse("delete-directory", kwargs={"directory_id": folder.id})
+    client.post(url, {"action": "delete_all"})
+    assert set(Lesson.objects.values_list("title", flat=True)) == {"shared", "forked", "public", "fork"}
+    # The files are left to the audio worker
+    job = AudioJob.objects.get(field="sweep")
+    assert job.text.splitlines() == sorted([only, kept])
+    assert os.path.isfile(os.path.join(settings.MEDIA_ROOT, only))
+
+    assert run_pending_jobs() == 1
+    assert not os.path.isfile(os.path.join(settings.MEDIA_ROOT, only))
+    assert os.path.isfile(os.path.join(settings.MEDIA_ROOT, kept))
+
+
+@pytest.mark.django_db
+def test_delete_directory_removes_private_lessons_with_set_based_deletes(
+    client, user, language, access_type_private, django_assert_max_num_queries
+):
+    root = UserDirectory.get_or_create_root_directory(user)
+    folder = UserDirectory.objects.create(user=user, parent_directory=root, name="Folder")
+    rel_path = generate_audio_file("shared", language)
+    for i in range(30):
+        lesson = Lesson.objects.create(
+            title=f"L{i}", prompt_language=language, translation_language=language,
+            author=user, access_type=access_type_private,
+        )
+        user_lesson = UserLesson.objects.create(user=user, lesson=lesson, directory=folder)
+        words = Word.objects.bulk_create(
+            Word(lesson=lesson, prompt=f"p{j}", translation=f"t{j}", prompt_audio=rel_path)
+            for j in range(20)
+        )
+        UserWord.objects.bulk_create(UserWord(user_lesson=user_lesson, word=w) for w in words)
+        AudioJob.objects.create(lesson=lesson, field="lesson")
+
+    client.login(username="testuser", password="testpass")
+    url = reverse("delete-directory", kwargs={"directory_id": folder.id})
+    # Neither the 600 words nor the 30 lessons are loaded one by one
+    with django_assert_max_num_queries(40):
+        client.post(url, {"action": "delete_all"})
+    assert not Lesson.objects.exists() and not Word.objects.exists()
+    assert not UserWord.objects.exists()
+    assert AudioJob.objects.get().text == rel_path
+
+
+@pytest.mark.django_db
+def test_batch_items_moves_and_deletes_many_items_in_one_request(client, user, language, access_type_write):
+    root = UserDirectory.get_or_create_root_directory(user)
+    a = UserDirectory.objects.create(user=user, parent_directory=root, name="A")
+    b = UserDirectory.objects.create(user=user, parent_directory=a, name="B")
+    target = UserDirectory.objects.create(user=user, parent_directory=root, name="Target")
+    UserDirectory.objects.create(user=user, parent_directory=target, name="B")
+    user_lessons = []
+    for i in range(50):
+        lesson = Lesson.objects.create(
+            title=f"L{i}", prompt_language=language, translation_language=language,
+            author=user, access_type=access_type_write,
+        )
+        user_lessons.append(UserLesson.objects.create(user=user, lesson=lesson, directory=root))
+
+    client.login(username="testuser", password="testpass")
+    url = reverse("batch-items")
+
+    def post(data):
+        return client.post(url, json.dumps(data), content_type="application/json")
+
+    response = post({"action": "move", "directories": [a.id], "target_directory_id": b.id})
+    assert response.status_code == 400
+    a.refresh_from_db()
+    assert a.parent_directory == root
+
+    response = post({
+        "action": "move",
+        "lessons": [ul.id for ul in user_lessons],
+        "directories": [b.id],
+        "target_directory_id": target.id,
+    })
+    assert response.json() == {"success": True, "lessons": 50, "directories": 1}
+    b.refresh_from_db()
+    assert (b.parent_directory, b.name, b.path) == (target, "B (2)", f"/{root.id}/{target.id}/{b.id}/")
+    assert UserLesson.objects.filter(directory=target).count() == 50
+
+    response = post({"action": "delete", "lessons": [user_lessons[0].id], "directories": [target.id, b.id]})
+    assert response.json()["success"]
+    assert not UserDirectory.objects.filter(id__in=[target.id, b.id]).exists()
+    assert UserLesson.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_my_lessons_shows_cached_recursive_stats(client, user, language, access_type_write, django_assert_max_num_queries):
+    root = UserDirectory.get_or_create_root_directory(user)
+    folder = UserDirectory.objects.create(user=user, parent_directory=root, name="Folder")
+    sub = UserDirectory.objects.create(user=user, parent_directory=folder, name="Sub")
+    user_lessons = []
+    for i, directory in enumerate([root, folder, sub] * 3):
+        lesson = Lesson.objects.create(
+            title=f"L{i}", prompt_language=language, translation_language=language,
+            author=user, access_type=access_type_write,
+        )
+        user_lesson = UserLesson.objects.create(
+            user=user, lesson=lesson, directory=directory, target_progress=2
+        )
+        user_lessons.append(user_lesson)
+        for j in range(4):
+            word = Word.objects.create(lesson=lesson, prompt=f"p{j}", translation=f"t{j}")
+            UserWord.objects.create(user_lesson=user_lesson, word=word, current_progress=j)
+
+    client.login(username="testuser", password="testpass")
+    client.get(reverse("my-lessons"))
+    with django_assert_max_num_queries(8):
+        response = client.get(reverse("my-lessons"))
+    stats = {subdir.name: subdir.stats for subdir in response.context["subdirectories"]}
+    assert stats["Folder"] == {"lessons": 6, "words": 24, "mastered": 12, "percent": 50}
+    assert response.context["my_lessons"][0].stats == {"words": 4, "mastered": 2, "percent": 50}
+    assert response.context["current_stats"]["words"] == 36
+
+    client.post(reverse("reset-progress", kwargs={"my_lesson_id": user_lessons[2].id}))
+    response = client.get(reverse("my-lessons"))
+    stats = {subdir.name: subdir.stats for subdir in response.context["subdirectories"]}
+    assert stats["Folder"]["mastered"] == 10
@@ -17,8 +17,11 @@ urlpatterns = [
     path("rename-directory/<int:directory_id>/", views.renameDirectory, name="rename-directory"),
     path("move-directory/<int:directory_id>/", views.moveDirectory, name="move-directory"),
     path("delete-directory/<int:directory_id>/", views.deleteDirectory, name="delete-directory"),
+    path("export-directory/<int:directory_id>/", views.export_directory_archive, name="export-directory-archive"),
+    path("import-archive/<int:directory_id>/", views.import_directory_archive, name="import-directory-archive"),
     path("move-lesson/<int:my_lesson_id>/", views.moveLesson, name="move-lesson"),
     path("drag-drop-move/", views.dragDropMove, name="drag-drop-move"),
+    path("batch-items/", views.batch_items, name="batch-items"),
     path(
         "delete-my-lesson/<int:my_lesson_id>/",
         views.deleteMyLesson,
@@ -62,6 +65,7 @@ urlpatterns = [
     path("edit_word/<int:my_word_id>/", views.editWord, name="edit-word"),
     path("delete_word/<int:my_word_id>/", views.deleteWord, name="delete-word"),
     path("update_notes/<int:my_word_id>/", views.updateNotes, name="update-notes"),
+    path("word_audio/<int:my_word_id>/", views.wordAudioStatus, name="word-audio-status"),
     path(
         "start_practice/<int:user_lesson_id>/<str:mode>/",
         views.start_practice,
@@ -78,10 +82,28 @@ urlpatterns = [
         views.cancel_practice,
         name="cancel-practice",
     ),
+    path("start_review/", views.start_review, name="start-review"),
+    path(
+        "start_review/<int:directory_id>/",
+        views.start_review,
+        name="start-review-directory",
+    ),
+    path("review/<int:directory_id>/", views.review, name="review"),
+    path(
+        "review_feedback/<int:directory_id>/",
+        views.review_feedback,
+        name="review-feedback",
+    ),
+    path(
+        "cancel_review/<int:directory_id>/",
+        views.cancel_review,
+        name="cancel-review",
+    ),
     path(
         "reset_progress/<int:my_lesson_id>/", views.resetProgress, name="reset-progress"
     ),
     path("import_lesson_json/", views.import_lesson_json, name="import-lesson-json"),
+    path("import_deck/", views.import_deck, name="import-deck"),
     path(
         "generate_lesson_audio/<int:my_lesson_id>/start/",
         views.generate_lesson_audio_start,
@@ -92,6 +114,11 @@ urlpatterns = [
         views.generate_lesson_audio,
         name="generate-lesson-audio",
     ),
+    path(
+        "generate_lesson_audio/<int:my_lesson_id>/progress/<int:job_id>/",
+        views.generate_lesson_audio_progress,
+        name="generate-lesson-audio-progress",
+    ),
     path(
         "password_reset/",
         auth_views.PasswordResetView.as_view(
@@ -129,6 +156,16 @@ urlpatterns = [
         ),
         name="password_change",
     ),
+    path(
+        "lesson_audio_bundle/<int:my_lesson_id>/",
+        views.lesson_audio_bundle,
+        name="lesson-audio-bundle",
+    ),
+    path(
+        "lesson_audio_bundle/<int:my_lesson_id>/index/",
+        views.lesson_audio_bundle_index,
+        name="lesson-audio-bundle-index",
+    ),
     path(
         "export-lesson/<int:lesson_id>/",
         views.export_lesson_json,
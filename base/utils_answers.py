@@ -0,0 +1,193 @@
+import re
+import unicodedata
+from django.conf import settings
+from django.utils.html import escape
+from rapidfuzz import process
+from rapidfuzz.distance import Levenshtein
+
+# Alternatives in a prompt or translation, e.g. "car; automobile" or "to run / to jog";
+# a slash only separates with spaces around it, so "he/she" or "km/h" stay whole
+ANSWER_SEPARATORS = re.compile(r"[;|]|\s+/\s+")
+
+# Articles stripped from answers by the "strip_articles" step, keyed by Language.name
+LANGUAGE_ARTICLES = {
+    "English": {"the", "a", "an"},
+    "German": {"der", "die", "das", "den", "dem", "des", "ein", "eine", "einen", "einem", "einer", "eines"},
+    "French": {"le", "la", "les", "l", "un", "une", "des"},
+    "Spanish": {"el", "la", "los", "las", "un", "una", "unos", "unas"},
+    "Danish": {"en", "et"},
+    # Polish has no articles
+    # Add more as needed
+}
+
+# Letters that carry no combining mark in Unicode but are commonly typed without one
+FOLDED_LETTERS = {
+    "ł": "l",
+    "ø": "o",
+    "æ": "ae",
+    "œ": "oe",
+    "ß": "ss",
+    "đ": "d",
+}
+
+
+# Normalisation works on a list of (character, index in the original text)
+# pairs, so that the highlight can be drawn on the answer as it was typed.
+
+
+def nfkc(chars, language_name):
+    return [(n, i) for c, i in chars for n in unicodedata.normalize("NFKC", c)]
+
+
+def casefold(chars, language_name):
+    return [(n, i) for c, i in chars for n in c.casefold()]
+
+
+def strip_accents(chars, language_name):
+    result = []
+    for c, i in chars:
+        c = FOLDED_LETTERS.get(c, c)
+        for n in unicodedata.normalize("NFKD", c):
+            if not unicodedata.combining(n):
+                result.append((n, i))
+    return result
+
+
+def strip_punctuation(chars, language_name):
+    # Apostrophes separate elided articles ("l'homme"), so keep a word break
+    return [
+        (" ", i) if c in "'’" else (c, i)
+        for c, i in chars
+        if c in "'’" or not unicodedata.category(c).startswith("P")
+    ]
+
+
+def strip_articles(chars, language_name):
+    articles = LANGUAGE_ARTICLES.get(language_name)
+    if not articles:
+        return chars
+    words = []
+    current = []
+    for c, i in chars:
+        if c.isspace():
+            if current:
+                words.append(current)
+                current = []
+        else:
+            current.append((c, i))
+    if current:
+        words.append(current)
+    # Never strip the answer down to nothing ("a" on its own stays)
+    kept = [w for w in words if "".join(c for c, _ in w).lower() not in articles]
+    if not kept:
+        kept = words
+    result = []
+    for word in kept:
+        if result:
+            result.append((" ", word[0][1]))
+        result.extend(word)
+    return result
+
+
+def collapse_whitespace(chars, language_name):
+    result = []
+    for c, i in chars:
+        if c.isspace():
+            if result and result[-1][0] != " ":
+                result.append((" ", i))
+        else:
+            result.append((c, i))
+    if result and result[-1][0] == " ":
+        result.pop()
+    return result
+
+
+NORMALISATION_STEPS = {
+    "nfkc": nfkc,
+    "casefold": casefold,
+    "strip_accents": strip_accents,
+    "strip_punctuation": strip_punctuation,
+    "strip_articles": strip_articles,
+    "collapse_whitespace": collapse_whitespace,
+    # Add more steps as needed
+}
+
+
+def normalise(text, language_name=None, steps=None):
+    """
+    Run `text` through the configured normalisation steps.
+
+    Returns the normalised string and, for each of its characters, the index
+    of the character in `text` it came from.
+    """
+    chars = [(c, i) for i, c in enumerate(text.strip())]
+    for step in steps if steps is not None else settings.ANSWER_NORMALISATION:
+        chars = NORMALISATION_STEPS[step](chars, language_name)
+    return "".join(c for c, _ in chars), [i for _, i in chars]
+
+
+def highlight(text, marked):
+    """Escape `text` and wrap the characters whose index is in `marked` in <span class="diff">."""
+    result = []
+    run = []
+    run_marked = False
+    for i, c in enumerate(text):
+        if (i in marked) != run_marked and run:
+            chunk = escape("".join(run))
+            result.append(f'<span class="diff">{chunk}</span>' if run_marked else chunk)
+            run = []
+        run_marked = i in marked
+        run.append(c)
+    if run:
+        chunk = escape("".join(run))
+        result.append(f'<span class="diff">{chunk}</span>' if run_marked else chunk)
+    return "".join(result)
+
+
+def split_answers(text):
+    """Split a prompt or translation into its accepted alternatives."""
+    alternatives = [a.strip() for a in ANSWER_SEPARATORS.split(text)]
+    return [a for a in alternatives if a] or [text.strip()]
+
+
+def parse_accepted_answers(text, language_name=None):
+    """
+    Precompute the accepted answers of a prompt or translation.
+
+    Returns a JSON-serialisable list of [alternative, normalised alternative]
+    pairs; Word stores it when saved so practice does not parse it again.
+    """
+    return [[a, normalise(a, language_name)[0]] for a in split_answers(text)]
+
+
+def evaluate_answer(answer, correct_answer, language_name=None, accepted_answers=None):
+    """
+    Compare an answer with the accepted alternatives after normalisation.
+
+    The closest alternative is picked with one rapidfuzz extractOne call over
+    the precomputed normalised alternatives (parsed from `correct_answer` if
+    `accepted_answers` is not given). Both the edit distance and the
+    highlight of that alternative come from a single Levenshtein alignment.
+    Returns (distance, diff_html); diff_html is empty when the answer matches.
+    """
+    if not accepted_answers:
+        accepted_answers = parse_accepted_answers(correct_answer, language_name)
+    normalised_answer, _ = normalise(answer, language_name)
+    if len(accepted_answers) == 1:
+        best = 0
+    else:
+        _, _, best = process.extractOne(
+            normalised_answer,
+            [normalised for _, normalised in accepted_answers],
+            scorer=Levenshtein.distance,
+        )
+    alternative = accepted_answers[best][0]
+    normalised_correct, positions = normalise(alternative, language_name)
+    editops = Levenshtein.editops(normalised_answer, normalised_correct)
+    if not editops:
+        return 0, ""
+    marked = set()
+    for opcode in editops.as_opcodes():
+        if opcode.tag != "equal":
+            marked.update(positions[opcode.dest_start:opcode.dest_end])
+    return len(editops), highlight(alternative.strip(), marked)
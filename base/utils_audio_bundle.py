@@ -0,0 +1,181 @@
+import glob
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import tempfile
+from django.conf import settings
+
+# Packed per-lesson audio, relative to MEDIA_ROOT: <lesson id>.json holds the
+# index of the current <lesson id>-<hash>.bin bundle
+BUNDLE_DIR = "audio/bundles"
+
+BUNDLE_AUDIO_FIELDS = ("prompt_audio", "usage_audio")
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_HEADER = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def bundle_index_path(lesson_id):
+    return os.path.join(settings.MEDIA_ROOT, BUNDLE_DIR, f"{lesson_id}.json")
+
+
+def read_bundle_index(lesson_id):
+    """Return the stored index of a lesson's bundle, or None if it has none (or lost its file)."""
+    try:
+        with open(bundle_index_path(lesson_id), encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not os.path.isfile(os.path.join(settings.MEDIA_ROOT, index["file"])):
+        return None
+    return index
+
+
+def write_bundle(lesson_id, names, base=None):
+    """
+    Write a new bundle holding the audio files `names`, after the whole
+    content of the `base` bundle when given (its segments are kept as they
+    are). Returns the new index.
+    """
+    directory = os.path.join(settings.MEDIA_ROOT, BUNDLE_DIR)
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    segments = dict(base["segments"]) if base else {}
+    offset = base["size"] if base else 0
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            sources = [base["file"]] if base else []
+            sources += names
+            for rel_path in sources:
+                length = 0
+                with open(os.path.join(settings.MEDIA_ROOT, rel_path), "rb") as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        out.write(chunk)
+                        digest.update(chunk)
+                        length += len(chunk)
+                if rel_path in names:
+                    segments[rel_path] = [offset, length]
+                    offset += length
+        content_hash = digest.hexdigest()
+        rel_file = f"{BUNDLE_DIR}/{lesson_id}-{content_hash[:16]}.bin"
+        os.replace(tmp_path, os.path.join(settings.MEDIA_ROOT, rel_file))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    index = {"hash": content_hash, "file": rel_file, "size": offset, "segments": segments}
+    index_tmp = f"{bundle_index_path(lesson_id)}.tmp"
+    with open(index_tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(index_tmp, bundle_index_path(lesson_id))
+    # Older versions of this lesson's bundle are superseded
+    for path in glob.glob(os.path.join(directory, f"{lesson_id}-*.bin")):
+        if not path.endswith(rel_file.rsplit("/", 1)[-1]):
+            os.remove(path)
+    return index
+
+
+def get_lesson_bundle(lesson):
+    """
+    Return the index of a lesson's audio bundle, one file packing the prompt
+    and usage audio of all its words, and (re)build it when needed.
+
+    Audio files are content-addressed (see utils_tts.audio_cache_path), so
+    a file already in the bundle never changes. When words gain new audio
+    only the new files are appended after the existing bundle; the bundle
+    is compacted from scratch once unused files take up more room than the
+    ones still referenced. Each version is named after the hash of its
+    content, which clients use to cache it.
+
+    The returned dict has the bundle "hash", "size" and "file", and "words":
+    {word id: {"prompt"|"usage": {offset, length, type, codec, duration}}}.
+    """
+    columns = ["id"]
+    for field in BUNDLE_AUDIO_FIELDS:
+        columns += [field, f"{field}_codec", f"{field}_duration"]
+    rows = list(lesson.get_words().order_by("id").values(*columns))
+
+    needed = []
+    for row in rows:
+        for field in BUNDLE_AUDIO_FIELDS:
+            name = row[field]
+            if name and name not in needed and os.path.isfile(
+                os.path.join(settings.MEDIA_ROOT, name)
+            ):
+                needed.append(name)
+
+    index = read_bundle_index(lesson.id)
+    segments = index["segments"] if index else {}
+    missing = [name for name in needed if name not in segments]
+    live = sum(segments[name][1] for name in needed if name in segments)
+    if index is None or index["size"] - live > live:
+        index = write_bundle(lesson.id, needed)
+    elif missing:
+        index = write_bundle(lesson.id, missing, base=index)
+
+    words = {}
+    for row in rows:
+        entries = {}
+        for field in BUNDLE_AUDIO_FIELDS:
+            segment = index["segments"].get(row[field])
+            if segment:
+                entries[field.removesuffix("_audio")] = {
+                    "offset": segment[0],
+                    "length": segment[1],
+                    "type": mimetypes.guess_type(row[field])[0] or "application/octet-stream",
+                    "codec": row[f"{field}_codec"],
+                    "duration": row[f"{field}_duration"],
+                }
+        if entries:
+            words[row["id"]] = entries
+    return {
+        "hash": index["hash"],
+        "size": index["size"],
+        "file": index["file"],
+        "words": words,
+    }
+
+
+def remove_lesson_bundle(lesson_id):
+    directory = os.path.join(settings.MEDIA_ROOT, BUNDLE_DIR)
+    for path in glob.glob(os.path.join(directory, f"{lesson_id}-*.bin")):
+        os.remove(path)
+    if os.path.exists(bundle_index_path(lesson_id)):
+        os.remove(bundle_index_path(lesson_id))
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range "Range: bytes=..." header against a file of `size`
+    bytes. Returns (start, end) inclusive, None for no (or an unsupported)
+    range, or False if the range cannot be satisfied.
+    """
+    match = RANGE_HEADER.match(header or "")
+    if not match or match.groups() == ("", ""):
+        return None
+    start, end = match.groups()
+    if start == "":
+        # Suffix range: the last `end` bytes
+        start, end = max(0, size - int(end)), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def iter_file_range(path, start, length):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
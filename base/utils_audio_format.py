@@ -0,0 +1,127 @@
+import json
+import os
+import struct
+import subprocess
+import wave
+from django.conf import settings
+
+# Output formats of the post-processing stage -> (file extension, ffmpeg codec arguments)
+AUDIO_FORMATS = {
+    "opus": ("ogg", ["-c:a", "libopus", "-application", "voip"]),
+    "mp3": ("mp3", ["-c:a", "libmp3lame"]),
+    # Add more formats as needed
+}
+
+# ffmpeg filter removing leading and trailing silence
+TRIM_SILENCE_FILTER = (
+    "silenceremove=start_periods=1:start_threshold=-50dB,"
+    "areverse,silenceremove=start_periods=1:start_threshold=-50dB,areverse"
+)
+
+
+def postprocessing_enabled():
+    return settings.AUDIO_FORMAT in AUDIO_FORMATS or settings.AUDIO_TRIM_SILENCE
+
+
+def get_audio_profile(extension):
+    """
+    Describe the post-processing applied to clips that a TTS backend writes
+    as `extension` files.
+
+    Returns (profile id, output extension); the id takes part in the audio
+    cache key, so changing the configuration never reuses old clips.
+    """
+    if not postprocessing_enabled():
+        return "original", extension
+    output_extension = AUDIO_FORMATS.get(settings.AUDIO_FORMAT, (extension, None))[0]
+    profile = (
+        f"{settings.AUDIO_FORMAT}:{settings.AUDIO_BITRATE}:"
+        f"{'trim' if settings.AUDIO_TRIM_SILENCE else 'full'}"
+    )
+    return profile, output_extension
+
+
+def postprocess_audio(src_path, dst_path):
+    """
+    Re-encode a clip with ffmpeg according to the deployment's settings:
+    mono, AUDIO_FORMAT at AUDIO_BITRATE, optionally with silence trimmed.
+    """
+    command = [settings.AUDIO_FFMPEG_COMMAND, "-y", "-loglevel", "error", "-i", src_path]
+    if settings.AUDIO_TRIM_SILENCE:
+        command += ["-af", TRIM_SILENCE_FILTER]
+    command += ["-ac", "1"]
+    if settings.AUDIO_FORMAT in AUDIO_FORMATS:
+        command += AUDIO_FORMATS[settings.AUDIO_FORMAT][1] + ["-b:a", settings.AUDIO_BITRATE]
+    command.append(dst_path)
+    subprocess.run(command, check=True, capture_output=True, timeout=settings.TTS_TIMEOUT)
+
+
+def read_wav_metadata(path):
+    with wave.open(path, "rb") as f:
+        return "pcm", f.getnframes() / f.getframerate()
+
+
+def read_ogg_metadata(path):
+    """
+    Codec and duration of an Ogg file from its first and last pages, without
+    decoding. The duration is only known for Opus, whose granule position
+    counts 48 kHz samples.
+    """
+    with open(path, "rb") as f:
+        head = f.read(512)
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - 65536))
+        tail = f.read()
+    if b"OpusHead" not in head:
+        return ("vorbis" if b"vorbis" in head else "ogg"), None
+    pre_skip = struct.unpack_from("<H", head, head.index(b"OpusHead") + 10)[0]
+    last_page = tail.rfind(b"OggS")
+    if last_page < 0 or last_page + 14 > len(tail):
+        return "opus", None
+    granule = struct.unpack_from("<q", tail, last_page + 6)[0]
+    return "opus", max(0, granule - pre_skip) / 48000
+
+
+METADATA_READERS = {
+    "wav": read_wav_metadata,
+    "ogg": read_ogg_metadata,
+    # Add more readers as needed
+}
+
+
+def probe_audio_metadata(path):
+    """Codec and duration of any audio file, read with ffprobe; None if it cannot be probed."""
+    command = [
+        settings.AUDIO_FFPROBE_COMMAND, "-v", "error", "-select_streams", "a:0",
+        "-show_entries", "stream=codec_name:format=duration", "-of", "json", path,
+    ]
+    try:
+        result = subprocess.run(
+            command, check=True, capture_output=True, timeout=settings.TTS_TIMEOUT
+        )
+        info = json.loads(result.stdout)
+        return info["streams"][0]["codec_name"], float(info["format"]["duration"])
+    except (OSError, subprocess.SubprocessError, ValueError, KeyError, IndexError, TypeError):
+        return None
+
+
+def audio_metadata(rel_path, probe=False):
+    """
+    Return (codec, duration in seconds) of an audio file relative to
+    MEDIA_ROOT. The duration is None when it cannot be read from the headers
+    (e.g. MP3), unless `probe` asks ffprobe for it; that costs a process
+    per file, so only batch jobs like convert_audio do it.
+    """
+    extension = rel_path.rsplit(".", 1)[-1].lower()
+    path = os.path.join(settings.MEDIA_ROOT, rel_path)
+    metadata = extension, None
+    reader = METADATA_READERS.get(extension)
+    if reader:
+        try:
+            metadata = reader(path)
+        except (OSError, EOFError, wave.Error, struct.error):
+            pass
+    if probe and metadata[1] is None:
+        metadata = probe_audio_metadata(path) or metadata
+    return metadata
@@ -0,0 +1,362 @@
+import logging
+import os
+import shutil
+import subprocess
+import time
+import uuid
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import AudioJob, Lesson, Word, release_audio_files
+from .utils_audio_format import audio_metadata, postprocess_audio, postprocessing_enabled
+from .utils_tts import (
+    audio_cache_path,
+    generate_audio_file,
+    generate_audio_files,
+    get_cached_audio,
+)
+
+logger = logging.getLogger(__name__)
+
+# Audio field of a word -> (text field, FileField)
+AUDIO_FIELDS = {
+    "prompt": ("prompt", "prompt_audio"),
+    "usage": ("usage", "usage_audio"),
+}
+
+# Every column written when a word's audio changes
+AUDIO_COLUMNS = [
+    column
+    for _, file_field in AUDIO_FIELDS.values()
+    for column in (file_field, f"{file_field}_codec", f"{file_field}_duration")
+]
+
+
+def audio_values(file_field, rel_path, probe=False):
+    """Column values for pointing a word's `file_field` at `rel_path`, with codec and duration."""
+    codec, duration = audio_metadata(rel_path, probe)
+    return {
+        file_field: rel_path,
+        f"{file_field}_codec": codec,
+        f"{file_field}_duration": duration,
+    }
+
+
+def set_word_audio(word, file_field, rel_path):
+    values = audio_values(file_field, rel_path)
+    for column, value in values.items():
+        setattr(word, column, value)
+    return values
+
+
+def enqueue_word_audio(word, fields=("prompt", "usage")):
+    """
+    Queue audio generation for the given fields of a saved word.
+
+    Texts already in the audio cache are assigned right away. Older pending
+    jobs for the same field are dropped, so editing a word twice in a row
+    synthesises only the latest text. With AUDIO_JOBS_EAGER the jobs run
+    right after the surrounding transaction commits instead.
+    """
+    jobs = []
+    for field in fields:
+        text_field, file_field = AUDIO_FIELDS[field]
+        text = getattr(word, text_field)
+        if not text:
+            continue
+        AudioJob.objects.filter(
+            word=word, field=field, status=AudioJob.STATUS_PENDING
+        ).delete()
+        cached = get_cached_audio(text, word.lesson.prompt_language)
+        if cached:
+            Word.objects.filter(id=word.id).update(**set_word_audio(word, file_field, cached))
+            continue
+        jobs.append(AudioJob.objects.create(word=word, field=field, text=text))
+    if jobs and settings.AUDIO_JOBS_EAGER:
+        transaction.on_commit(lambda: [run_job_safely(job) for job in jobs])
+    return jobs
+
+
+def enqueue_lesson_audio(lesson):
+    """
+    Queue (re)generation of all audio of a lesson as one job.
+
+    The job replaces pending jobs of the lesson and of its words, since it
+    regenerates their audio anyway.
+    """
+    AudioJob.objects.filter(status=AudioJob.STATUS_PENDING).filter(
+        Q(lesson=lesson) | Q(word__in=lesson.get_words())
+    ).delete()
+    job = AudioJob.objects.create(lesson=lesson, field="lesson")
+    if settings.AUDIO_JOBS_EAGER:
+        transaction.on_commit(lambda: run_job_safely(job))
+    return job
+
+
+def enqueue_audio_sweep(names):
+    """
+    Queue the removal of audio files that bulk deletes may have left
+    unreferenced (see utils_directory_tree.delete_unshared_lessons), so the
+    request does not check each file itself. Files referenced again by
+    then are kept.
+    """
+    names = sorted(name for name in names if name)
+    if not names:
+        return None
+    job = AudioJob.objects.create(field="sweep", text="\n".join(names))
+    if settings.AUDIO_JOBS_EAGER:
+        transaction.on_commit(lambda: run_job_safely(job))
+    return job
+
+
+def claim_jobs(limit):
+    """
+    Mark up to `limit` pending jobs as running for this worker and return them.
+
+    The claim is a single conditional UPDATE, so several workers can share
+    the queue without handing out the same job twice.
+    """
+    token = uuid.uuid4().hex
+    ids = list(
+        AudioJob.objects.filter(status=AudioJob.STATUS_PENDING)
+        .order_by("id")
+        .values_list("id", flat=True)[:limit]
+    )
+    if not ids:
+        return []
+    AudioJob.objects.filter(id__in=ids, status=AudioJob.STATUS_PENDING).update(
+        status=AudioJob.STATUS_RUNNING,
+        claimed_by=token,
+        attempts=F("attempts") + 1,
+        updated=timezone.now(),
+    )
+    return list(AudioJob.objects.filter(claimed_by=token).order_by("id"))
+
+
+def fail_job(job, error):
+    """Put a job that raised back into the queue, or mark it failed after its last attempt."""
+    failed = job.attempts >= settings.AUDIO_JOB_MAX_ATTEMPTS
+    AudioJob.objects.filter(id=job.id).update(
+        status=AudioJob.STATUS_FAILED if failed else AudioJob.STATUS_PENDING,
+        error=str(error),
+        claimed_by="",
+    )
+
+
+def run_job_safely(job):
+    """
+    Run a job, recording any error on it instead of raising, so one bad
+    job (a missing file, a database error) neither stops the worker nor
+    stays "running" forever.
+    """
+    try:
+        return run_job(job)
+    except Exception as e:
+        logger.exception("Audio job %s failed", job.id)
+        fail_job(job, e)
+        return False
+
+
+def run_job(job):
+    """Run one job: synthesise a word's audio and store its path on the word."""
+    if job.field == "lesson":
+        return run_lesson_job(job)
+    if job.field == "sweep":
+        release_audio_files(job.text.splitlines())
+        AudioJob.objects.filter(id=job.id).update(status=AudioJob.STATUS_DONE)
+        return True
+    text_field, file_field = AUDIO_FIELDS[job.field]
+    word = (
+        Word.objects.select_related("lesson__prompt_language")
+        .filter(id=job.word_id)
+        .first()
+    )
+    # The word was deleted or edited again since the job was queued
+    if word is None or getattr(word, text_field) != job.text:
+        AudioJob.objects.filter(id=job.id).update(status=AudioJob.STATUS_DONE)
+        return False
+    try:
+        rel_path = generate_audio_file(job.text, word.lesson.prompt_language)
+    except Exception as e:
+        fail_job(job, e)
+        return False
+    old_name = getattr(word, file_field).name
+    # Bump `updated` so templates cache-bust the audio URL (?v=...)
+    Word.objects.filter(id=word.id).update(
+        **audio_values(file_field, rel_path), updated=timezone.now()
+    )
+    if old_name != rel_path:
+        release_audio_files([old_name])
+    AudioJob.objects.filter(id=job.id).update(status=AudioJob.STATUS_DONE, error="")
+    return True
+
+
+def word_audio_requests(words, language, missing_only=False):
+    """Batch TTS requests (see utils_tts.generate_audio_files) for the audio of `words`."""
+    return [
+        (getattr(word, text_field), language, (i, file_field))
+        for i, word in enumerate(words)
+        for text_field, file_field in AUDIO_FIELDS.values()
+        if getattr(word, text_field)
+        and not (missing_only and getattr(word, file_field))
+    ]
+
+
+def fill_cached_audio(words, language):
+    """
+    Point words that have no audio yet at cached files for their text.
+
+    Used when words are copied or imported: nothing is synthesised, and the
+    whole batch costs one cache scan.
+    """
+    found = generate_audio_files(
+        word_audio_requests(words, language, missing_only=True), synthesize=False
+    )
+    for (i, file_field), rel_path in found.items():
+        set_word_audio(words[i], file_field, rel_path)
+
+
+def generate_words_audio(words, language, progress=None):
+    """
+    Fill in the prompt and usage audio of `words` (all of one lesson).
+
+    Everything goes through one batch TTS call, which deduplicates texts,
+    skips those already cached and synthesises the rest in parallel. The
+    database is only touched once at the end, with a single bulk_update of
+    the audio paths. `progress` is called with the number of synthesised
+    texts and the total. Returns the number of audio files that could not
+    be generated and the number requested.
+    """
+    requests = word_audio_requests(words, language)
+    found = generate_audio_files(requests, progress=progress)
+
+    old_names = []
+    for (i, file_field), rel_path in found.items():
+        old_names.append(getattr(words[i], file_field).name)
+        set_word_audio(words[i], file_field, rel_path)
+    # Bump `updated` so templates cache-bust the audio URLs (?v=...)
+    now = timezone.now()
+    for word in words:
+        word.updated = now
+    Word.objects.bulk_update(words, AUDIO_COLUMNS + ["updated"])
+    release_audio_files(name for name in old_names if name not in found.values())
+    return len(requests) - len(found), len(requests)
+
+
+def run_lesson_job(job):
+    """Regenerate all audio of a lesson, recording progress on the job."""
+    lesson = (
+        Lesson.objects.select_related("prompt_language").filter(id=job.lesson_id).first()
+    )
+    if lesson is None:
+        AudioJob.objects.filter(id=job.id).update(status=AudioJob.STATUS_DONE)
+        return False
+
+    last_report = [0.0]
+
+    def progress(completed, total):
+        # At most one small UPDATE per second; the page polls about as often
+        if completed in (0, total) or time.monotonic() - last_report[0] >= 1:
+            last_report[0] = time.monotonic()
+            AudioJob.objects.filter(id=job.id).update(completed=completed, total=total)
+
+    words = list(lesson.get_words())
+    failed, total = generate_words_audio(words, lesson.prompt_language, progress)
+    AudioJob.objects.filter(id=job.id).update(
+        status=AudioJob.STATUS_FAILED if total and failed == total else AudioJob.STATUS_DONE,
+        error=f"{failed} of {total} audio files could not be generated." if failed else "",
+    )
+    return not failed
+
+
+def convert_existing_audio(batch_size=200):
+    """
+    Bring every audio file referenced by a word to the configured format.
+
+    Each distinct file is re-encoded (or, without post-processing, copied
+    if it already has the target's extension) once to its cache path under
+    the current profile; all words sharing it are repointed with one
+    UPDATE and the old file is released. Files already in place, and those
+    that could only be copied into a different format, only get their
+    codec and duration filled in (with ffprobe where the headers do not
+    tell). A file that cannot be converted is logged and left as it is.
+    Returns the number of files converted and the names of those that
+    failed.
+    """
+    converted = 0
+    failed = []
+    for text_field, file_field in AUDIO_FIELDS.values():
+        names = list(
+            Word.objects.exclude(**{f"{file_field}__isnull": True})
+            .exclude(**{file_field: ""})
+            .order_by(file_field)
+            .values_list(file_field, flat=True)
+            .distinct()
+        )
+        for start in range(0, len(names), batch_size):
+            batch = names[start:start + batch_size]
+            # One word per file tells its text and language
+            sources = {}
+            for word in Word.objects.filter(**{f"{file_field}__in": batch}).select_related(
+                "lesson__prompt_language"
+            ):
+                sources.setdefault(getattr(word, file_field).name, word)
+            for name, word in sources.items():
+                old_path = os.path.join(settings.MEDIA_ROOT, name)
+                if not os.path.isfile(old_path):
+                    continue
+                target = audio_cache_path(getattr(word, text_field), word.lesson.prompt_language)
+                target_path = os.path.join(settings.MEDIA_ROOT, target)
+                same_format = name.rsplit(".", 1)[-1].lower() == target.rsplit(".", 1)[-1]
+                if target != name and not os.path.isfile(target_path):
+                    if not (postprocessing_enabled() or same_format):
+                        # Copying would put e.g. MP3 data under a .wav name; keep the file
+                        target = name
+                    else:
+                        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                        tmp_path = f"{target_path}.tmp.{target.rsplit('.', 1)[-1]}"
+                        try:
+                            if postprocessing_enabled():
+                                postprocess_audio(old_path, tmp_path)
+                            else:
+                                shutil.copyfile(old_path, tmp_path)
+                            os.replace(tmp_path, target_path)
+                        except (OSError, subprocess.SubprocessError):
+                            # A corrupt file must not stop the rest of the conversion
+                            logger.exception("Could not convert audio file %s", name)
+                            failed.append(name)
+                            continue
+                        finally:
+                            if os.path.exists(tmp_path):
+                                os.remove(tmp_path)
+                Word.objects.filter(**{file_field: name}).update(
+                    **audio_values(file_field, target, probe=True)
+                )
+                if target != name:
+                    release_audio_files([name])
+                    converted += 1
+    return converted, failed
+
+
+def run_pending_jobs(limit=10):
+    """Claim and run up to `limit` pending jobs; returns how many were claimed."""
+    jobs = claim_jobs(limit)
+    for job in jobs:
+        run_job_safely(job)
+    return len(jobs)
+
+
+def requeue_stale_jobs():
+    """Put jobs left running by a worker that died back into the queue."""
+    return AudioJob.objects.filter(status=AudioJob.STATUS_RUNNING).update(
+        status=AudioJob.STATUS_PENDING, claimed_by=""
+    )
+
+
+def has_pending_audio(word):
+    """Whether audio for the word (or its whole lesson) is still queued or being generated."""
+    return AudioJob.objects.filter(
+        Q(word_id=word.id) | Q(lesson_id=word.lesson_id),
+        status__in=[AudioJob.STATUS_PENDING, AudioJob.STATUS_RUNNING],
+    ).exists()
@@ -0,0 +1,246 @@
+import csv
+import html
+import io
+import itertools
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import zipfile
+import zlib
+from .utils_audio_jobs import AUDIO_FIELDS, audio_values
+from .utils_lesson_archive import store_imported_audio
+
+# Deck field (or column) names recognised for each Word field, lower case
+FIELD_ALIASES = {
+    "prompt": ("prompt", "front", "word", "question", "expression", "term"),
+    "translation": ("translation", "back", "meaning", "answer", "definition"),
+    "usage": ("usage", "example", "sentence", "context"),
+    "hint": ("hint", "extra", "notes", "note"),
+}
+
+# Fields of a deck without recognisable names, by position
+DEFAULT_FIELD_ORDER = ("prompt", "translation", "usage", "hint")
+
+# Values of Anki's "#separator:" header line
+SEPARATOR_NAMES = {"tab": "\t", "comma": ",", "semicolon": ";", "pipe": "|", "space": " "}
+
+# Audio references in Anki fields: [sound:file.mp3]
+SOUND_TAG = re.compile(r"\[sound:([^\]]+)\]")
+LINE_BREAK_TAG = re.compile(r"<\s*(br|/div|/p|/li)\s*/?>", re.IGNORECASE)
+HTML_TAG = re.compile(r"<[^>]*>")
+
+AUDIO_EXTENSIONS = {"mp3", "ogg", "opus", "wav", "m4a", "aac", "flac", "webm"}
+
+# Collection databases inside an .apkg, newest first
+APKG_COLLECTIONS = ("collection.anki21", "collection.anki2")
+# zstd-compressed collection of current Anki versions; their exports hold a
+# placeholder collection.anki2 next to it, with a single "update Anki" note
+APKG_ANKI21B = "collection.anki21b"
+
+# Errors from reading a damaged member of the .apkg zip
+ZIP_MEMBER_ERRORS = (zipfile.BadZipFile, zlib.error, EOFError)
+
+CHUNK_SIZE = 64 * 1024
+
+
+class DeckImportError(ValueError):
+    pass
+
+
+def clean_field(value):
+    """Plain text of an Anki field: sound tags, HTML tags and entities removed."""
+    value = SOUND_TAG.sub(" ", value)
+    value = LINE_BREAK_TAG.sub(" ", value)
+    value = HTML_TAG.sub("", value)
+    return " ".join(html.unescape(value).split())
+
+
+def map_fields(names):
+    """
+    Return {Word field: index} for a deck's field names, recognising the
+    names in FIELD_ALIASES and falling back to DEFAULT_FIELD_ORDER for
+    prompt and translation.
+    """
+    mapping = {}
+    for index, name in enumerate(names):
+        for field, aliases in FIELD_ALIASES.items():
+            if field not in mapping and name.strip().lower() in aliases:
+                mapping[field] = index
+                break
+    for index, field in enumerate(DEFAULT_FIELD_ORDER[:2]):
+        if field not in mapping and index < len(names) and index not in mapping.values():
+            mapping[field] = index
+    return mapping
+
+
+def row_to_entry(values, mapping):
+    """A word entry for import_words from a row of field values; None if it has no prompt or translation."""
+    entry = {
+        field: clean_field(values[index]) if index < len(values) else ""
+        for field, index in mapping.items()
+    }
+    if not entry.get("prompt") or not entry.get("translation"):
+        return None
+    return entry
+
+
+def iter_delimited_deck(file, file_name):
+    """
+    Word entries of a CSV/TSV deck, read row by row.
+
+    Anki's "#separator:" and "#columns:" header lines are honoured (the
+    format export_lesson writes); other "#" lines are skipped. Without a
+    separator header, .csv files are comma separated and anything else tab
+    separated. Without column names, columns are prompt, translation,
+    usage and hint in that order.
+    """
+    lines = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    delimiter = "," if file_name.lower().endswith(".csv") else "\t"
+    column_names = None
+    first = None
+    for line in lines:
+        if not line.startswith("#"):
+            first = line
+            break
+        key, _, value = line[1:].strip().partition(":")
+        if key == "separator":
+            delimiter = SEPARATOR_NAMES.get(value.lower(), value[:1] or delimiter)
+        elif key == "columns":
+            column_names = value
+    if first is None:
+        return
+
+    if column_names is not None:
+        mapping = map_fields(next(csv.reader([column_names], delimiter=delimiter)))
+    else:
+        mapping = dict(zip(DEFAULT_FIELD_ORDER, range(len(DEFAULT_FIELD_ORDER))))
+    for values in csv.reader(itertools.chain([first], lines), delimiter=delimiter):
+        entry = row_to_entry(values, mapping)
+        if entry:
+            yield entry
+
+
+def read_apkg_field_names(db):
+    """{note type id: [field names]} of an Anki collection, for old and new schemas."""
+    try:
+        models = json.loads(db.execute("SELECT models FROM col").fetchone()[0] or "{}")
+    except (sqlite3.Error, TypeError, ValueError):
+        models = {}
+    if models:
+        try:
+            return {
+                int(mid): [f["name"] for f in sorted(model["flds"], key=lambda f: f["ord"])]
+                for mid, model in models.items()
+            }
+        except (KeyError, TypeError, ValueError):
+            raise DeckImportError("The deck has an invalid note type.")
+    names = {}
+    for ntid, name in db.execute("SELECT ntid, name FROM fields ORDER BY ntid, ord"):
+        names.setdefault(ntid, []).append(name)
+    return names
+
+
+def iter_apkg_deck(file, created_files=None):
+    """
+    Word entries of an Anki .apkg deck (a zip holding a SQLite collection
+    and its media), read note by note.
+
+    Fields are mapped by name (see FIELD_ALIASES). The first sound of the
+    prompt field (or, failing that, of the translation) becomes the
+    word's prompt audio and the first sound of the usage field its usage
+    audio; they are copied once each into the shared imported audio
+    directory, so nothing has to be synthesised. Files that did not exist
+    before are listed in `created_files` (see store_imported_audio).
+    """
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile as e:
+        raise DeckImportError(f"Invalid .apkg file: {e}")
+
+    with archive:
+        names = set(archive.namelist())
+        if APKG_ANKI21B in names:
+            raise DeckImportError(
+                "This .apkg uses the newest Anki format; export it from Anki with "
+                "'Support older Anki versions' enabled."
+            )
+        collection = next((name for name in APKG_COLLECTIONS if name in names), None)
+        if collection is None:
+            raise DeckImportError(
+                "Unsupported .apkg file; export it from Anki with "
+                "'Support older Anki versions' enabled."
+            )
+        # Media file name -> zip member ("0", "1", ...)
+        try:
+            media = {name: member for member, name in json.loads(archive.read("media")).items()}
+        except (KeyError, ValueError, *ZIP_MEMBER_ERRORS):
+            media = {}
+
+        # sqlite3 needs a real file
+        fd, db_path = tempfile.mkstemp(suffix=".anki2")
+        try:
+            try:
+                with os.fdopen(fd, "wb") as out, archive.open(collection) as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        out.write(chunk)
+            except ZIP_MEMBER_ERRORS as e:
+                raise DeckImportError(f"Invalid .apkg file: {e}")
+            db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+            try:
+                field_names = read_apkg_field_names(db)
+                mappings = {}
+                stored_audio = {}
+
+                def audio_of(value):
+                    for sound in SOUND_TAG.findall(value):
+                        extension = sound.rsplit(".", 1)[-1].lower()
+                        if media.get(sound) not in names or extension not in AUDIO_EXTENSIONS:
+                            continue
+                        if sound not in stored_audio:
+                            try:
+                                with archive.open(media[sound]) as f:
+                                    stored_audio[sound] = store_imported_audio(
+                                        f, extension, created=created_files
+                                    )
+                            except ZIP_MEMBER_ERRORS as e:
+                                raise DeckImportError(f"Invalid audio file '{sound}': {e}")
+                        return stored_audio[sound]
+                    return None
+
+                for mid, fields in db.execute("SELECT mid, flds FROM notes ORDER BY id"):
+                    if fields is None:
+                        raise DeckImportError("The deck has a note without fields.")
+                    values = fields.split("\x1f")
+                    if mid not in mappings:
+                        # Unknown note types are mapped by position
+                        mappings[mid] = map_fields(field_names.get(mid) or [""] * len(values))
+                    mapping = mappings[mid]
+                    entry = row_to_entry(values, mapping)
+                    if not entry:
+                        continue
+                    sources = {
+                        "prompt": [mapping.get("prompt"), mapping.get("translation")],
+                        "usage": [mapping.get("usage")],
+                    }
+                    for field, (_, file_field) in AUDIO_FIELDS.items():
+                        for index in sources[field]:
+                            if index is None or index >= len(values):
+                                continue
+                            rel_path = audio_of(values[index])
+                            if rel_path:
+                                entry.update(audio_values(file_field, rel_path))
+                                break
+                    yield entry
+            finally:
+                db.close()
+        finally:
+            os.remove(db_path)
+
+
+def iter_deck(file, file_name, created_files=None):
+    """Word entries of an uploaded deck, by file type (.apkg, .csv, .tsv or .txt)."""
+    if file_name.lower().endswith(".apkg"):
+        return iter_apkg_deck(file, created_files)
+    return iter_delimited_deck(file, file_name)
@@ -0,0 +1,370 @@
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Value
+from django.db.models.functions import Concat, Substr
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import AudioJob, Lesson, Rating, UserDirectory, UserLesson, UserWord, Word, subtree_q
+from .utils_audio_bundle import remove_lesson_bundle
+from .utils_audio_jobs import enqueue_audio_sweep
+
+# Rows deleted per statement when a whole subtree goes
+DELETE_BATCH_SIZE = 100
+
+# Fields of each cached directory, enough to rebuild UserDirectory instances
+# (in model order, as Model.from_db expects)
+TREE_FIELDS = ("id", "name", "user_id", "parent_directory_id", "is_root", "path", "depth")
+
+
+def version_key(user_id):
+    return f"directory-tree-version:{user_id}"
+
+
+def stats_version_key(user_id):
+    return f"folder-stats-version:{user_id}"
+
+
+def tree_key(user_id, version):
+    return f"directory-tree:{user_id}:{version}"
+
+
+class DirectoryTree:
+    """
+    All directories of one user, loaded with a single query and served
+    from memory: root lookups, directories by id and breadcrumbs.
+
+    The instances are plain UserDirectory objects (without their user or
+    parent loaded), fine for reading, linking lessons to and building
+    URLs; views that change a directory should load it from the database.
+    """
+
+    def __init__(self, rows):
+        self.directories = {
+            row[0]: UserDirectory.from_db("default", TREE_FIELDS, row) for row in rows
+        }
+        self.root = next((d for d in self.directories.values() if d.is_root), None)
+
+    def get(self, directory_id):
+        try:
+            return self.directories.get(int(directory_id))
+        except (TypeError, ValueError):
+            return None
+
+    def get_children(self, directory):
+        """Subdirectories of `directory`, sorted by name."""
+        return sorted(
+            (d for d in self.directories.values() if d.parent_directory_id == directory.id),
+            key=lambda d: d.name.lower(),
+        )
+
+    def get_path(self, directory):
+        """Breadcrumb of `directory`, from the root down (see UserDirectory.get_path)."""
+        path = [self.directories.get(dir_id) for dir_id in directory.get_ancestor_ids()]
+        if not path or None in path:
+            # Not in this tree (yet): ask the database
+            return directory.get_path()
+        return path
+
+
+def get_directory_tree(request):
+    """
+    The directory tree of the request's user, shared by everything that
+    renders during the request and cached between requests under a
+    version stamp that every directory change replaces (see
+    invalidate_directory_tree). The user's Home directory is created if
+    it is missing.
+    """
+    user = request.user
+    version = cache.get(version_key(user.id))
+    memo = getattr(request, "_directory_tree", None)
+    if memo is not None and version is not None and memo[0] == version:
+        return memo[1]
+
+    rows = cache.get(tree_key(user.id, version)) if version is not None else None
+    if rows is None:
+        if version is None:
+            version = uuid.uuid4().hex
+            cache.set(version_key(user.id), version, settings.DIRECTORY_TREE_CACHE_TIMEOUT)
+        rows = list(UserDirectory.objects.filter(user=user).values_list(*TREE_FIELDS))
+        if not any(row[TREE_FIELDS.index("is_root")] for row in rows):
+            UserDirectory.get_or_create_root_directory(user)
+            return get_directory_tree(request)
+        cache.set(tree_key(user.id, version), rows, settings.DIRECTORY_TREE_CACHE_TIMEOUT)
+
+    tree = DirectoryTree(rows)
+    request._directory_tree = (version, tree)
+    return tree
+
+
+def get_folder_stats(request):
+    """
+    Word counts and progress of every lesson and folder of the request's
+    user, as {"lessons": {UserLesson id: stats}, "directories": {id:
+    stats}}. A lesson's stats are its "words", the words "mastered"
+    (practised up to the lesson's target) and "percent" mastered; a
+    folder's add up everything below it, with the number of "lessons".
+
+    Computed with one aggregated query over all of the user's words and
+    summed up the directory tree in memory, then cached under both the
+    tree's version stamp and a stamp replaced whenever words or progress
+    change (see invalidate_folder_stats).
+    """
+    user = request.user
+    tree = get_directory_tree(request)
+    stats_version = cache.get(stats_version_key(user.id))
+    if stats_version is None:
+        stats_version = uuid.uuid4().hex
+        cache.set(stats_version_key(user.id), stats_version, settings.DIRECTORY_TREE_CACHE_TIMEOUT)
+    key = f"folder-stats:{user.id}:{request._directory_tree[0]}:{stats_version}"
+    stats = cache.get(key)
+    if stats is not None:
+        return stats
+
+    lessons = {}
+    directories = {
+        dir_id: {"lessons": 0, "words": 0, "mastered": 0} for dir_id in tree.directories
+    }
+    rows = UserLesson.objects.filter(user=user).values("id", "directory_id").annotate(
+        words=Count("user_words"),
+        mastered=Count(
+            "user_words", filter=Q(user_words__current_progress__gte=F("target_progress"))
+        ),
+    )
+    for row in rows:
+        lessons[row["id"]] = {"words": row["words"], "mastered": row["mastered"]}
+        # Lessons without a directory live in Home
+        directory = tree.get(row["directory_id"]) or tree.root
+        for dir_id in directory.get_ancestor_ids():
+            if dir_id in directories:
+                totals = directories[dir_id]
+                totals["lessons"] += 1
+                totals["words"] += row["words"]
+                totals["mastered"] += row["mastered"]
+    for item in [*lessons.values(), *directories.values()]:
+        item["percent"] = round(100 * item["mastered"] / item["words"]) if item["words"] else 0
+
+    stats = {"lessons": lessons, "directories": directories}
+    cache.set(key, stats, settings.DIRECTORY_TREE_CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate_folder_stats(user_id):
+    """Make the next get_folder_stats of the user recompute (see invalidate_directory_tree)."""
+    def bump():
+        cache.set(stats_version_key(user_id), uuid.uuid4().hex, settings.DIRECTORY_TREE_CACHE_TIMEOUT)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def invalidate_directory_tree(user_id):
+    """
+    Give the user's tree a new version stamp, so the next request reloads
+    it. Done again once the transaction commits, in case a concurrent
+    request cached the tree as it was before.
+    """
+    def bump():
+        cache.set(version_key(user_id), uuid.uuid4().hex, settings.DIRECTORY_TREE_CACHE_TIMEOUT)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+class DirectoryTreeError(ValueError):
+    pass
+
+
+def number_clashing_names(directories, taken):
+    """Number the directories whose name is in `taken` (or repeats among them), one UPDATE each."""
+    taken = set(taken)
+    for directory in directories:
+        name, n = directory.name, 1
+        while name in taken:
+            n += 1
+            name = f"{directory.name} ({n})"
+        taken.add(name)
+        if name != directory.name:
+            UserDirectory.objects.filter(pk=directory.pk).update(name=name)
+
+
+def move_items(user, lesson_ids, directory_ids, target):
+    """
+    Move many of `user`'s lessons (UserLesson ids) and directories into
+    `target` at once. Every id is checked first, cycles included, against
+    one query on the directory paths; then the lessons move with one
+    UPDATE, the directories with one, and each moved subtree's paths with
+    one more. Run it in a transaction. Returns (lessons, directories)
+    moved.
+    """
+    lesson_ids, directory_ids = set(lesson_ids), set(directory_ids)
+    if UserLesson.objects.filter(user=user, id__in=lesson_ids).count() != len(lesson_ids):
+        raise DirectoryTreeError("Some of the lessons do not exist.")
+    directories = list(
+        UserDirectory.objects.filter(user=user, id__in=directory_ids).order_by("-depth")
+    )
+    if len(directories) != len(directory_ids):
+        raise DirectoryTreeError("Some of the folders do not exist.")
+    for directory in directories:
+        if directory.is_root:
+            raise DirectoryTreeError("Cannot move the Home folder.")
+        if directory.is_ancestor_of(target):
+            raise DirectoryTreeError(
+                f"Cannot move folder '{directory.name}' into itself or one of its subfolders."
+            )
+
+    UserLesson.objects.filter(id__in=lesson_ids).update(directory=target)
+    moving = [d for d in directories if d.parent_directory_id != target.id]
+    number_clashing_names(
+        moving,
+        target.subdirectories.exclude(id__in=[d.id for d in moving]).values_list("name", flat=True),
+    )
+    # Deepest first: moving a directory never changes the path of one moved after it
+    for directory in moving:
+        UserDirectory.objects.filter(subtree_q(directory.path)).update(
+            path=Concat(Value(target.path), Substr("path", len(directory.path) - len(str(directory.id)))),
+            depth=F("depth") + (target.depth + 1 - directory.depth),
+        )
+    UserDirectory.objects.filter(id__in=[d.id for d in moving]).update(parent_directory=target)
+    invalidate_directory_tree(user.id)
+    return len(lesson_ids), len(directories)
+
+
+def delete_items(user, lesson_ids, directory_ids):
+    """
+    Delete many of `user`'s lessons (UserLesson ids) and directories, with
+    their subtrees (see delete_directory_subtree). Run it in a
+    transaction. Returns (lessons, directories) deleted as selected.
+    """
+    lesson_ids, directory_ids = set(lesson_ids), set(directory_ids)
+    if UserLesson.objects.filter(user=user, id__in=lesson_ids).count() != len(lesson_ids):
+        raise DirectoryTreeError("Some of the lessons do not exist.")
+    directories = list(
+        UserDirectory.objects.filter(user=user, id__in=directory_ids).order_by("depth")
+    )
+    if len(directories) != len(directory_ids):
+        raise DirectoryTreeError("Some of the folders do not exist.")
+    if any(directory.is_root for directory in directories):
+        raise DirectoryTreeError("Cannot delete the Home folder.")
+
+    lesson_ids = sorted(lesson_ids)
+    for start in range(0, len(lesson_ids), DELETE_BATCH_SIZE):
+        UserLesson.objects.filter(id__in=lesson_ids[start:start + DELETE_BATCH_SIZE]).delete()
+    deleted = []
+    for directory in directories:
+        # Selected folders inside another selected folder went with it
+        if not any(parent.is_ancestor_of(directory) for parent in deleted):
+            delete_directory_subtree(directory)
+            deleted.append(directory)
+    return len(lesson_ids), len(directories)
+
+
+def move_directory_contents(directory):
+    """
+    Move the subdirectories and lessons of `directory` to its parent with
+    one UPDATE per table (plus one for the paths below it). Subdirectories
+    whose name is taken in the parent are numbered first.
+    """
+    parent = directory.parent_directory
+    number_clashing_names(
+        directory.subdirectories.all(),
+        parent.subdirectories.exclude(pk=directory.pk).values_list("name", flat=True),
+    )
+
+    UserLesson.objects.filter(directory=directory).update(directory=parent)
+    UserDirectory.objects.filter(subtree_q(directory.path)).exclude(pk=directory.pk).update(
+        path=Concat(Value(parent.path), Substr("path", len(directory.path) + 1)),
+        depth=F("depth") - 1,
+    )
+    directory.subdirectories.update(parent_directory=parent)
+    invalidate_directory_tree(directory.user_id)
+
+
+def delete_unshared_lessons(lesson_ids):
+    """
+    Delete lessons that nothing references any more (no UserLesson, no
+    forks) with their words, one DELETE per table and never loading a row.
+
+    The Word and Lesson delete signals are bypassed: without forks there
+    is nothing for materialise_lesson_forks to do, and the words' audio
+    files, read with one query, are left to one background sweep job
+    instead of being released word by word.
+    """
+    words = Word.objects.filter(lesson_id__in=lesson_ids)
+    audio_names = {
+        name for names in words.values_list("prompt_audio", "usage_audio") for name in names
+    }
+    UserWord.objects.filter(word__in=words).delete()
+    AudioJob.objects.filter(Q(lesson_id__in=lesson_ids) | Q(word__in=words)).delete()
+    Lesson.hidden_words.through.objects.filter(
+        Q(lesson_id__in=lesson_ids) | Q(word__in=words)
+    ).delete()
+    Rating.objects.filter(lesson_id__in=lesson_ids).delete()
+    Lesson.objects.filter(original_lesson_id__in=lesson_ids).update(original_lesson=None)
+    words._raw_delete(words.db)
+    lessons = Lesson.objects.filter(id__in=lesson_ids)
+    lessons._raw_delete(lessons.db)
+    for lesson_id in lesson_ids:
+        remove_lesson_bundle(lesson_id)
+    enqueue_audio_sweep(audio_names)
+
+
+def delete_directory_subtree(directory):
+    """
+    Delete `directory`, every directory below it and the owner's lessons
+    in them: their UserLessons and UserWords, and the owner's own private
+    lessons that nothing else references any more (no other UserLesson
+    and no forks), with their words. Shared lessons stay in the
+    repository, as with deleting a single lesson reference.
+
+    Works in bounded batches: UserLessons DELETE_BATCH_SIZE at a time
+    (their UserWords go with one DELETE per batch, never loaded), then the
+    orphaned private lessons (see delete_unshared_lessons), then the
+    directories deepest first. Returns the number of lessons removed.
+    """
+    subtree = UserDirectory.objects.filter(subtree_q(directory.path))
+    user_lessons = UserLesson.objects.filter(user_id=directory.user_id, directory__in=subtree)
+    private_ids = set(
+        user_lessons.filter(
+            lesson__author_id=directory.user_id, lesson__access_type__name="private"
+        ).values_list("lesson_id", flat=True)
+    )
+    removed = 0
+    while True:
+        batch = list(user_lessons.values_list("id", flat=True)[:DELETE_BATCH_SIZE])
+        if not batch:
+            break
+        UserLesson.objects.filter(id__in=batch).delete()
+        removed += len(batch)
+
+    orphan_ids = sorted(
+        Lesson.objects.filter(
+            id__in=private_ids, userlesson__isnull=True, word_forks__isnull=True
+        ).values_list("id", flat=True)
+    )
+    for start in range(0, len(orphan_ids), DELETE_BATCH_SIZE):
+        delete_unshared_lessons(orphan_ids[start:start + DELETE_BATCH_SIZE])
+
+    # Deepest first, so a batch never holds a directory whose children are left
+    directory_ids = list(subtree.order_by("-depth").values_list("id", flat=True))
+    for start in range(0, len(directory_ids), DELETE_BATCH_SIZE):
+        UserDirectory.objects.filter(
+            id__in=directory_ids[start:start + DELETE_BATCH_SIZE]
+        ).delete()
+    invalidate_directory_tree(directory.user_id)
+    return removed
+
+
+@receiver(post_save, sender=UserDirectory)
+@receiver(post_delete, sender=UserDirectory)
+def directory_changed(sender, instance, **kwargs):
+    invalidate_directory_tree(instance.user_id)
+
+
+# Lessons added, moved or removed one at a time; bulk changes call
+# invalidate_folder_stats themselves
+@receiver(post_save, sender=UserLesson)
+@receiver(post_delete, sender=UserLesson)
+def user_lesson_changed(sender, instance, **kwargs):
+    invalidate_folder_stats(instance.user_id)
@@ -0,0 +1,306 @@
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import zipfile
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import AccessType, Language, Lesson, UserDirectory, UserLesson
+from .utils_audio_jobs import AUDIO_COLUMNS, AUDIO_FIELDS
+from .utils_lesson_export import EXPORT_WORD_FIELDS, lesson_export_data
+from .utils_lesson_import import import_words
+
+# Archive layout: manifest.json first, then for each lesson the audio it
+# uses (audio/<sha256 of content>.<ext>, each file once) and
+# lessons/<n>.jsonl (lesson fields on the first line, then one word per line)
+ARCHIVE_FORMAT = "languagelearningapp-archive"
+ARCHIVE_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+# Restored audio, relative to MEDIA_ROOT, named after the content hash
+ARCHIVE_AUDIO_DIR = "audio/imported"
+
+ARCHIVE_AUDIO_NAME = re.compile(r"^audio/([0-9a-f]{64})\.(\w{1,10})$")
+
+# UserLesson settings carried over with each lesson
+USER_LESSON_SETTINGS = ("target_progress", "practice_window", "allowed_error_margin")
+
+CHUNK_SIZE = 64 * 1024
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+class ZipStream:
+    """Write-only file object collecting the bytes zipfile writes, to be drained into a response."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_directory_archive(directory):
+    """
+    Yield the bytes of a zip archive holding `directory`, its subdirectories
+    and the owner's lessons in them, with their words and audio. Lessons
+    without a directory live in Home, so archiving Home includes them.
+
+    The archive is produced while it is sent: lessons are read one at a
+    time and their words with .iterator(), so memory does not grow with
+    the size of the tree (apart from the names of audio files already
+    written, which are stored only once).
+    """
+    parents = {
+        row["id"]: row
+        for row in directory.get_descendants().values("id", "name", "parent_directory_id")
+    }
+    subtree_ids = list(parents)
+
+    def relative_path(dir_id):
+        path = []
+        while dir_id != directory.id:
+            path.insert(0, parents[dir_id]["name"])
+            dir_id = parents[dir_id]["parent_directory_id"]
+        return path
+
+    in_subtree = Q(directory_id__in=subtree_ids)
+    if directory.is_root:
+        in_subtree |= Q(directory__isnull=True)
+    user_lessons = list(
+        UserLesson.objects.filter(in_subtree, user_id=directory.user_id)
+        .select_related(
+            "lesson__prompt_language", "lesson__translation_language", "lesson__access_type"
+        )
+        .order_by("id")
+    )
+    manifest = {
+        "format": ARCHIVE_FORMAT,
+        "version": ARCHIVE_VERSION,
+        "created": timezone.now().isoformat(),
+        "name": directory.name,
+        "directories": sorted(
+            relative_path(dir_id) for dir_id in subtree_ids if dir_id != directory.id
+        ),
+        "lessons": [
+            {
+                "file": f"lessons/{i:05d}.jsonl",
+                "directory": relative_path(user_lesson.directory_id or directory.id),
+                "title": user_lesson.lesson.title,
+                "settings": {key: getattr(user_lesson, key) for key in USER_LESSON_SETTINGS},
+            }
+            for i, user_lesson in enumerate(user_lessons, start=1)
+        ],
+    }
+
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+        yield stream.drain()
+
+        # Source file name -> archive name, and content hashes already written
+        archived_audio = {}
+        archived_hashes = set()
+        for entry, user_lesson in zip(manifest["lessons"], user_lessons):
+            lesson = user_lesson.lesson
+            for _, file_field in AUDIO_FIELDS.values():
+                names = (
+                    lesson.get_words().exclude(**{file_field: ""})
+                    .exclude(**{f"{file_field}__isnull": True})
+                    .values_list(file_field, flat=True)
+                    .distinct()
+                )
+                for name in names.iterator():
+                    path = os.path.join(settings.MEDIA_ROOT, name)
+                    if name in archived_audio or not os.path.isfile(path):
+                        continue
+                    content_hash = hash_file(path)
+                    archive_name = f"audio/{content_hash}.{name.rsplit('.', 1)[-1].lower()}"
+                    archived_audio[name] = archive_name
+                    if content_hash in archived_hashes:
+                        continue
+                    archived_hashes.add(content_hash)
+                    # Audio is already compressed
+                    archive.write(path, archive_name, compress_type=zipfile.ZIP_STORED)
+                    yield stream.drain()
+
+            with archive.open(entry["file"], "w", force_zip64=True) as f:
+                f.write((json.dumps(lesson_export_data(lesson), ensure_ascii=False) + "\n").encode())
+                rows = lesson.get_words().order_by("id").values(*EXPORT_WORD_FIELDS, *AUDIO_COLUMNS)
+                for row in rows.iterator(chunk_size=2000):
+                    for _, file_field in AUDIO_FIELDS.values():
+                        row[file_field] = archived_audio.get(row[file_field])
+                    f.write((json.dumps(row, ensure_ascii=False) + "\n").encode())
+                    if sum(len(chunk) for chunk in stream.chunks) >= CHUNK_SIZE:
+                        yield stream.drain()
+            yield stream.drain()
+    yield stream.drain()
+
+
+def unique_directory_name(user, parent, name):
+    """`name`, numbered if `parent` already has a directory called that."""
+    taken = set(
+        UserDirectory.objects.filter(user=user, parent_directory=parent).values_list(
+            "name", flat=True
+        )
+    )
+    candidate, n = name, 1
+    while candidate in taken:
+        n += 1
+        candidate = f"{name} ({n})"
+    return candidate
+
+
+def store_imported_audio(f, extension, expected_hash=None, created=None):
+    """
+    Copy an audio file from the file object `f` into ARCHIVE_AUDIO_DIR,
+    named after the hash of its content, and return its path relative to
+    MEDIA_ROOT. Identical files imported before (by any user) are shared.
+    With `expected_hash`, a file whose content does not match is rejected.
+    Paths of files that did not exist yet are appended to the `created`
+    list, so a failed import can release them.
+    """
+    directory = os.path.join(settings.MEDIA_ROOT, ARCHIVE_AUDIO_DIR)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        digest = hashlib.sha256()
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                out.write(chunk)
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+        if expected_hash and content_hash != expected_hash:
+            raise ArchiveError("An audio file in the archive is corrupted.")
+        rel_path = f"{ARCHIVE_AUDIO_DIR}/{content_hash[:2]}/{content_hash}.{extension}"
+        path = os.path.join(settings.MEDIA_ROOT, rel_path)
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            if created is not None:
+                created.append(rel_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return rel_path
+
+
+def restore_audio(archive, archive_name, created=None):
+    """Restore an audio file of the archive (see store_imported_audio) and return its path."""
+    match = ARCHIVE_AUDIO_NAME.match(archive_name)
+    if not match:
+        raise ArchiveError(f"Invalid audio file name '{archive_name}'.")
+    content_hash, extension = match.groups()
+    rel_path = f"{ARCHIVE_AUDIO_DIR}/{content_hash[:2]}/{content_hash}.{extension}"
+    if os.path.isfile(os.path.join(settings.MEDIA_ROOT, rel_path)):
+        return rel_path
+    with archive.open(archive_name) as f:
+        return store_imported_audio(f, extension, expected_hash=content_hash, created=created)
+
+
+def restore_directory_archive(file, target_directory, created_files=None):
+    """
+    Restore an archive written by iter_directory_archive into
+    `target_directory`: its subdirectories are recreated there (renamed if
+    the name is taken) and every lesson is created for the directory's
+    owner, with its audio taken from the archive so nothing has to be
+    synthesised again.
+
+    Lessons are read line by line and imported in bulk batches (see
+    import_words). Run it in a transaction; audio files are written
+    before the rows referencing them, and those that did not exist yet are
+    appended to `created_files`, so a failed restore can release them.
+    Returns the number of lessons restored.
+    """
+    user = target_directory.user
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile as e:
+        raise ArchiveError(f"Invalid archive: {e}")
+
+    with archive:
+        try:
+            manifest = json.loads(archive.read(MANIFEST_NAME))
+        except (KeyError, ValueError):
+            raise ArchiveError("The archive has no valid manifest.")
+        if manifest.get("format") != ARCHIVE_FORMAT or manifest.get("version") != ARCHIVE_VERSION:
+            raise ArchiveError("Unsupported archive format.")
+
+        directories = {(): target_directory}
+        for path in sorted(manifest["directories"], key=len):
+            parent = directories[tuple(path[:-1])]
+            directories[tuple(path)] = UserDirectory.objects.create(
+                user=user,
+                parent_directory=parent,
+                name=unique_directory_name(user, parent, path[-1]),
+            )
+
+        access_types = {a.name: a for a in AccessType.objects.all()}
+        restored_audio = {}
+        for entry in manifest["lessons"]:
+            with archive.open(entry["file"]) as f:
+                lines = io.TextIOWrapper(f, encoding="utf-8")
+                data = json.loads(next(lines))
+                prompt_lang, _ = Language.objects.get_or_create(name=data["prompt_language"])
+                translation_lang, _ = Language.objects.get_or_create(
+                    name=data["translation_language"]
+                )
+                lesson = Lesson.objects.create(
+                    title=data["title"],
+                    description=data.get("description", ""),
+                    prompt_language=prompt_lang,
+                    translation_language=translation_lang,
+                    author=user,
+                    access_type=access_types.get(
+                        data.get("access_type"), access_types.get("private")
+                    ),
+                    changes_log=f"{timezone.now()} Lesson restored by {user.username} from an archive",
+                )
+                user_lesson = UserLesson.objects.create(
+                    user=user,
+                    lesson=lesson,
+                    directory=directories[tuple(entry["directory"])],
+                    **{
+                        key: value
+                        for key, value in entry.get("settings", {}).items()
+                        if key in USER_LESSON_SETTINGS
+                    },
+                )
+
+                def words():
+                    for line in lines:
+                        word = json.loads(line)
+                        for _, file_field in AUDIO_FIELDS.values():
+                            name = word.get(file_field)
+                            if name:
+                                if name not in restored_audio:
+                                    restored_audio[name] = restore_audio(
+                                        archive, name, created_files
+                                    )
+                                word[file_field] = restored_audio[name]
+                        yield word
+
+                import_words(user_lesson, words(), with_audio=True)
+    return len(manifest["lessons"])
@@ -0,0 +1,133 @@
+from django.conf import settings
+from .models import AccessType, Lesson, UserLesson, UserWord, Word
+from .utils_audio_jobs import AUDIO_COLUMNS, fill_cached_audio
+
+# Word columns copied when a fork needs its own row; audio files are shared by reference
+CLONED_WORD_FIELDS = (
+    "prompt", "translation", "prompt_answers", "translation_answers", "usage", "hint",
+    *AUDIO_COLUMNS,
+)
+
+# UserWord columns carried over when progress is kept
+PROGRESS_FIELDS = ("current_progress", "notes", "due", "ease_factor", "interval", "repetitions")
+
+
+def iter_word_batches(words, fields=()):
+    """
+    Yield the rows of a Word queryset as lists of value dicts,
+    LESSON_IMPORT_BATCH_SIZE at a time in id order (keyset pagination, one
+    query per batch).
+    """
+    last_id = 0
+    while True:
+        batch = list(
+            words.filter(id__gt=last_id)
+            .order_by("id")
+            .values("id", *fields)[:settings.LESSON_IMPORT_BATCH_SIZE]
+        )
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]["id"]
+
+
+def get_progress(progress_from, word_ids):
+    """{word id: UserWord progress values} of `progress_from` for the given words."""
+    if progress_from is None:
+        return {}
+    return {
+        row.pop("word_id"): row
+        for row in UserWord.objects.filter(
+            user_lesson=progress_from, word_id__in=word_ids
+        ).values("word_id", *PROGRESS_FIELDS)
+    }
+
+
+def create_user_words(user_lesson, progress_from=None, source_ids=None):
+    """
+    Give `user_lesson` a UserWord for every word of its lesson (shared
+    words of a fork included), in bulk batches.
+
+    With `progress_from`, another UserLesson, its progress, notes and
+    schedule are carried over. Its words are matched by id, or through
+    `source_ids` ({word id: id of the word in progress_from's lesson}) for
+    words that were copied.
+    """
+    source_ids = source_ids or {}
+    for batch in iter_word_batches(user_lesson.lesson.get_words()):
+        word_ids = [row["id"] for row in batch]
+        progress = get_progress(
+            progress_from, [source_ids.get(word_id, word_id) for word_id in word_ids]
+        )
+        UserWord.objects.bulk_create(
+            UserWord(
+                user_lesson=user_lesson,
+                word_id=word_id,
+                **progress.get(source_ids.get(word_id, word_id), {}),
+            )
+            for word_id in word_ids
+        )
+
+
+def copy_words(words, new_lesson):
+    """
+    Copy a Word queryset into `new_lesson` in bulk batches. Returns
+    {copy id: original id}.
+    """
+    source_ids = {}
+    for batch in iter_word_batches(words, CLONED_WORD_FIELDS):
+        new_words = [
+            Word(lesson=new_lesson, **{field: row[field] for field in CLONED_WORD_FIELDS})
+            for row in batch
+        ]
+        fill_cached_audio(new_words, new_lesson.prompt_language)
+        Word.objects.bulk_create(new_words)
+        source_ids.update((word.id, row["id"]) for word, row in zip(new_words, batch))
+    return source_ids
+
+
+def clone_lesson(lesson, user, directory, changes_log="", user_lesson_settings=None,
+                 progress_from=None, auto_generate_hints=False):
+    """
+    Fork `lesson` into a private lesson owned by `user` in `directory` and
+    return the new UserLesson.
+
+    The fork is copy-on-write: it shares the words of the lesson (or of
+    the lesson it was itself forked from) through Lesson.word_source
+    instead of duplicating them, so only the words the source fork had
+    changed or added get rows of their own. With `auto_generate_hints`
+    the fork shows the first letter of the prompt for words without a
+    hint (Lesson.auto_hints) instead of copying them to store one. Every
+    word still gets a UserWord, inserted in bulk batches; with
+    `progress_from`, a UserLesson of the original lesson, progress and
+    notes carry over.
+    """
+    source = lesson.word_source if lesson.word_source_id else lesson
+    new_lesson = Lesson.objects.create(
+        title=lesson.title,
+        description=lesson.description,
+        prompt_language=lesson.prompt_language,
+        translation_language=lesson.translation_language,
+        author=user,
+        access_type=AccessType.objects.get(name="private"),  # Set to private by default
+        original_lesson=lesson,  # Link to the original lesson
+        word_source=source,
+        auto_hints=auto_generate_hints or lesson.auto_hints,
+        changes_log=changes_log,
+    )
+    new_user_lesson = UserLesson.objects.create(
+        user=user, lesson=new_lesson, directory=directory, **(user_lesson_settings or {})
+    )
+
+    hidden_ids = set()
+    source_ids = {}
+    if source != lesson:
+        hidden_ids.update(lesson.hidden_words.values_list("id", flat=True))
+        source_ids.update(copy_words(lesson.words.all(), new_lesson))
+    Lesson.hidden_words.through.objects.bulk_create(
+        Lesson.hidden_words.through(lesson_id=new_lesson.id, word_id=word_id)
+        for word_id in hidden_ids
+    )
+
+    create_user_words(new_user_lesson, progress_from, source_ids)
+    return new_user_lesson
@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+import textwrap
+
+# Fields exported for every word, in column order
+EXPORT_WORD_FIELDS = ("prompt", "translation", "usage", "hint")
+
+# Text collected before a chunk is handed to the response
+CHUNK_SIZE = 64 * 1024
+
+
+def lesson_export_data(lesson):
+    """The lesson fields of an export, without its words."""
+    return {
+        "title": lesson.title,
+        "description": lesson.description,
+        "prompt_language": lesson.prompt_language.name,
+        "translation_language": lesson.translation_language.name,
+        "access_type": lesson.access_type.name,
+    }
+
+
+def iter_word_data(lesson):
+    """Exported fields of the lesson's words, fetched in chunks rather than all at once."""
+    rows = lesson.get_words().order_by("id").values_list(*EXPORT_WORD_FIELDS)
+    for row in rows.iterator(chunk_size=2000):
+        yield dict(zip(EXPORT_WORD_FIELDS, row))
+
+
+def buffered(parts):
+    """Join small text parts into chunks of about CHUNK_SIZE characters."""
+    buffer, size = [], 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def write_json(lesson, indent=2):
+    """
+    The lesson as one JSON document, the format read by import_lesson_json.
+    With indent=2 the output is the same as json.dumps(data, indent=2).
+    """
+    if indent:
+        separators, newline, pad = (",", ": "), "\n", " " * indent
+    else:
+        separators, newline, pad = (",", ":"), "", ""
+    header = json.dumps(
+        lesson_export_data(lesson), ensure_ascii=False, indent=indent, separators=separators
+    )
+    # Reopen the object to append the words array
+    yield header[:-1].rstrip() + f",{newline}{pad}" + json.dumps("words") + separators[1] + "["
+    first = True
+    for word in iter_word_data(lesson):
+        item = json.dumps(word, ensure_ascii=False, indent=indent, separators=separators)
+        if indent:
+            item = textwrap.indent(item, pad * 2)
+        yield ("" if first else ",") + newline + item
+        first = False
+    yield ("" if first else newline + pad) + "]" + newline + "}"
+
+
+def write_jsonl(lesson):
+    """JSON Lines: the lesson fields on the first line, then one word per line."""
+    yield json.dumps(lesson_export_data(lesson), ensure_ascii=False) + "\n"
+    for word in iter_word_data(lesson):
+        yield json.dumps(word, ensure_ascii=False) + "\n"
+
+
+def write_delimited(lesson, delimiter):
+    """
+    One word per row. The "#" header lines tell Anki's text importer the
+    separator and columns; other tools can skip them as comments.
+    """
+    separator = "Tab" if delimiter == "\t" else "Comma"
+    yield f"#separator:{separator}\n#html:false\n"
+    yield "#columns:" + delimiter.join(EXPORT_WORD_FIELDS) + "\n"
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter, lineterminator="\n")
+    for word in iter_word_data(lesson):
+        writer.writerow([word[field] for field in EXPORT_WORD_FIELDS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+# format -> (content type, file extension, writer)
+EXPORT_FORMATS = {
+    "json": ("application/json", "json", write_json),
+    "json-compact": ("application/json", "json", lambda lesson: write_json(lesson, indent=None)),
+    "jsonl": ("application/x-ndjson", "jsonl", write_jsonl),
+    "csv": ("text/csv; charset=utf-8", "csv", lambda lesson: write_delimited(lesson, ",")),
+    "tsv": ("text/tab-separated-values; charset=utf-8", "tsv", lambda lesson: write_delimited(lesson, "\t")),
+    # Add more formats as needed
+}
+
+
+def export_lesson(lesson, export_format):
+    """
+    Return (content type, file extension, chunk iterator) for exporting
+    `lesson` in one of EXPORT_FORMATS. Words are read from the database
+    while the chunks are produced, so memory use does not grow with the
+    lesson.
+    """
+    content_type, extension, writer = EXPORT_FORMATS[export_format]
+    return content_type, extension, buffered(writer(lesson))
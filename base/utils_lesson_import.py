@@ -0,0 +1,183 @@
+import codecs
+import json
+from django.conf import settings
+from .models import UserWord, Word
+from .utils_audio_jobs import AUDIO_COLUMNS, fill_cached_audio
+
+# Top-level members of a lesson JSON file that must be present
+LESSON_JSON_REQUIRED = ("title", "prompt_language", "translation_language", "words")
+
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+
+
+class JSONStream:
+    """
+    Incremental reader of a JSON document from a binary file.
+
+    Only the text around the current position is kept in memory, so
+    values can be read one by one from arbitrarily large files as long as
+    each single value is small.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read another chunk; returns False at the end of the file."""
+        if self.eof:
+            return False
+        chunk = self.file.read(CHUNK_SIZE)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+        return not self.eof
+
+    def peek(self):
+        """Return the next non-whitespace character without consuming it ("" at the end)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at character {self.pos}.")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # The value may just be cut off at the end of the buffer
+                if self.fill():
+                    continue
+                raise
+            # A number running into the end of the buffer may continue
+            if end == len(self.buffer) and not self.eof and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def members(self):
+        """Iterate over the keys of an object; the caller reads (or skips) each value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+    def items(self):
+        """Iterate over the values of an array, decoding one at a time."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+
+def read_lesson_json(file):
+    """
+    Read the lesson members of an exported lesson JSON file, skipping over
+    its words. Returns a dict of all top-level members except "words",
+    which is set to True when the file has a words array.
+    """
+    data = {}
+    stream = JSONStream(file)
+    for key in stream.members():
+        if key == "words":
+            for _ in stream.items():
+                pass
+            data[key] = True
+        else:
+            data[key] = stream.value()
+    return data
+
+
+def iter_lesson_json_words(file):
+    """Iterate over the word entries of a lesson JSON file, one at a time."""
+    stream = JSONStream(file)
+    for key in stream.members():
+        if key == "words":
+            yield from stream.items()
+        else:
+            stream.value()
+
+
+def import_words(user_lesson, entries, auto_generate_hints=False, with_audio=False):
+    """
+    Add words to the lesson of `user_lesson` (and to the user's progress)
+    from an iterable of {"prompt", "translation", "usage", "hint"} dicts.
+    With with_audio, the entries' AUDIO_COLUMNS (paths under MEDIA_ROOT the
+    caller has vetted, codecs and durations) are stored as well.
+
+    Entries are consumed lazily and inserted in bulk_create batches of
+    LESSON_IMPORT_BATCH_SIZE together with their UserWords, so an import
+    costs a few queries per batch and memory for one batch whatever its
+    size. Entries without a prompt and translation are skipped. Returns the
+    number of words imported.
+    """
+    lesson = user_lesson.lesson
+    imported = 0
+    batch = []
+
+    def flush():
+        for word in batch:
+            # bulk_create bypasses Word.save()
+            word.update_accepted_answers()
+        # Reuse audio already synthesised for the same texts
+        fill_cached_audio(batch, lesson.prompt_language)
+        Word.objects.bulk_create(batch)
+        UserWord.objects.bulk_create(
+            UserWord(user_lesson=user_lesson, word=word, current_progress=0, notes="")
+            for word in batch
+        )
+        batch.clear()
+
+    for entry in entries:
+        if not isinstance(entry, dict) or not all(k in entry for k in ("prompt", "translation")):
+            continue  # skip incomplete word entries
+        hint_value = entry.get("hint", "")
+        if not hint_value and auto_generate_hints and entry["prompt"]:
+            hint_value = entry["prompt"][0].upper()
+        word = Word(
+            lesson=lesson,
+            prompt=entry["prompt"],
+            translation=entry["translation"],
+            usage=entry.get("usage", ""),
+            hint=hint_value,
+        )
+        if with_audio:
+            for column in AUDIO_COLUMNS:
+                if entry.get(column) is not None:
+                    setattr(word, column, entry[column])
+        batch.append(word)
+        imported += 1
+        if len(batch) >= settings.LESSON_IMPORT_BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+    return imported
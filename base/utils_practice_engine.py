@@ -0,0 +1,398 @@
+import base64
+import os
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+from .models import UserWord, word_hint
+from .utils_directory_tree import invalidate_folder_stats
+from .utils_scheduler import PASSING_QUALITY, get_scheduler
+
+# Session keys of all practice sessions start with this prefix
+PRACTICE_SESSION_PREFIX = "practice_"
+
+# Columns needed to render and grade a card, fetched with a single query
+CARD_VALUES = (
+    "id",
+    "current_progress",
+    "notes",
+    "word__prompt",
+    "word__translation",
+    "word__usage",
+    "word__hint",
+    "word__prompt_answers",
+    "word__translation_answers",
+    "word__prompt_audio",
+    "word__usage_audio",
+    "word__updated",
+    "ease_factor",
+    "interval",
+    "repetitions",
+    "user_lesson_id",
+    "user_lesson__allowed_error_margin",
+    "user_lesson__lesson__title",
+    "user_lesson__lesson__auto_hints",
+    "user_lesson__lesson__prompt_language__name",
+    "user_lesson__lesson__translation_language__name",
+)
+
+# Card keys that are written back to UserWord columns when a session flushes
+CARD_TO_FIELD = {
+    "progress": "current_progress",
+    "due": "due",
+    "ease_factor": "ease_factor",
+    "interval": "interval",
+    "repetitions": "repetitions",
+}
+
+
+def get_audio_url(name):
+    """Return the media URL of an audio file, or "" if it is not on disk."""
+    if name and os.path.isfile(os.path.join(settings.MEDIA_ROOT, name)):
+        return default_storage.url(name)
+    return ""
+
+
+def card_from_values(row):
+    """Build a JSON-serialisable card from a UserWord .values() row."""
+    return {
+        "id": row["id"],
+        "progress": row["current_progress"],
+        "notes": row["notes"],
+        "prompt": row["word__prompt"],
+        "translation": row["word__translation"],
+        "usage": row["word__usage"],
+        "hint": word_hint(
+            row["word__hint"], row["word__prompt"], row["user_lesson__lesson__auto_hints"]
+        ),
+        "prompt_answers": row["word__prompt_answers"],
+        "translation_answers": row["word__translation_answers"],
+        "prompt_audio_url": get_audio_url(row["word__prompt_audio"]),
+        "usage_audio_url": get_audio_url(row["word__usage_audio"]),
+        "version": int(row["word__updated"].timestamp()),
+        "ease_factor": row["ease_factor"],
+        "interval": row["interval"],
+        "repetitions": row["repetitions"],
+        "user_lesson_id": row["user_lesson_id"],
+        "allowed_error_margin": row["user_lesson__allowed_error_margin"],
+        "lesson_title": row["user_lesson__lesson__title"],
+        "prompt_language": row["user_lesson__lesson__prompt_language__name"],
+        "translation_language": row["user_lesson__lesson__translation_language__name"],
+    }
+
+
+def load_cards(user_word_ids):
+    """Load the cards for the given UserWord ids, keyed by str(id)."""
+    if not user_word_ids:
+        return {}
+    rows = UserWord.objects.filter(id__in=user_word_ids).values(*CARD_VALUES)
+    return {str(row["id"]): card_from_values(row) for row in rows}
+
+
+def scope_queryset(scope):
+    """
+    Return the UserWords a session scope covers.
+
+    A scope is either a single lesson ({"user_lesson_id": ...}) or all
+    lessons of a user under a set of directories ({"user_id": ...,
+    "directory_ids": [...], "include_unfiled": bool}).
+    """
+    if "user_lesson_id" in scope:
+        return UserWord.objects.filter(user_lesson_id=scope["user_lesson_id"])
+    directory_filter = Q(user_lesson__directory_id__in=scope["directory_ids"])
+    if scope.get("include_unfiled"):
+        directory_filter |= Q(user_lesson__directory__isnull=True)
+    return UserWord.objects.filter(user_lesson__user_id=scope["user_id"]).filter(
+        directory_filter
+    )
+
+
+def scope_covers(scope, user_lesson):
+    """Whether a session scope (see scope_queryset) includes the words of `user_lesson`."""
+    if "user_lesson_id" in scope:
+        return scope["user_lesson_id"] == user_lesson.id
+    if scope["user_id"] != user_lesson.user_id:
+        return False
+    if user_lesson.directory_id is None:
+        return bool(scope.get("include_unfiled"))
+    return user_lesson.directory_id in scope["directory_ids"]
+
+
+def breadcrumb_from_path(path):
+    """Turn UserDirectory.get_path() into plain dicts for the breadcrumb include."""
+    return [{"id": d.id, "name": d.name, "is_root": d.is_root} for d in path]
+
+
+def pack_ids(ids):
+    """
+    Encode a list of ids as base64 zigzag-delta varints.
+
+    Neighbouring ids of a lesson are usually close to each other, so most
+    entries take one or two bytes instead of the ~8 characters of a JSON list
+    entry.
+    """
+    data = bytearray()
+    previous = 0
+    for value in ids:
+        delta = value - previous
+        previous = value
+        zigzag = delta * 2 if delta >= 0 else -delta * 2 - 1
+        while zigzag >= 0x80:
+            data.append((zigzag & 0x7F) | 0x80)
+            zigzag >>= 7
+        data.append(zigzag)
+    return base64.b64encode(bytes(data)).decode("ascii")
+
+
+def unpack_ids(packed):
+    """Decode the output of pack_ids back into a list of ids."""
+    ids = []
+    previous = 0
+    zigzag = shift = 0
+    for byte in base64.b64decode(packed):
+        zigzag |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        delta = zigzag >> 1 if not zigzag & 1 else -((zigzag + 1) >> 1)
+        previous += delta
+        ids.append(previous)
+        zigzag = shift = 0
+    return ids
+
+
+def field_value(card_key, value):
+    """Convert a buffered card value back into a model field value."""
+    if card_key == "due":
+        return datetime.fromtimestamp(value, tz=dt_timezone.utc)
+    return value
+
+
+class PracticeSession:
+    """
+    State of one practice session, stored under a single key in request.session.
+
+    Cards (prompt, translation, hint, audio URLs, progress) of the words in
+    the window are cached, so serving a question or grading an answer does
+    not have to go back to the database. Which words are shown and when they
+    come back is decided by a scheduler (see utils_scheduler), which keeps
+    only a small cursor instead of the list of remaining words. The window
+    is stored packed (see pack_ids), so the payload stays the same size no
+    matter how many words the lesson has.
+    """
+
+    def __init__(self, session, key):
+        self.session = session
+        self.key = key
+        self.state = session.get(key)
+
+    @classmethod
+    def start(cls, session, key, scope, window_size, breadcrumb_path, user_lesson=None, scheduler=None):
+        """
+        Create a session over `scope` (see scope_queryset) and load its first cards.
+
+        `user_lesson` is given for single-lesson sessions and shown in the
+        breadcrumb; cross-lesson sessions show each card's own lesson instead.
+        """
+        scheduler = scheduler or get_scheduler()
+        practice_session = cls(session, key)
+        practice_session.state = {
+            "lesson": {
+                "id": user_lesson.id,
+                "lesson": {"title": user_lesson.lesson.title},
+            } if user_lesson else None,
+            "scope": scope,
+            # Owner of the words, whose folder stats change on flush
+            "user_id": user_lesson.user_id if user_lesson else scope.get("user_id"),
+            "scheduler": scheduler.name,
+            "breadcrumb": breadcrumb_from_path(breadcrumb_path),
+            "answer": None,
+            "pending": {},
+            "answered": 0,
+        }
+        window, cursor = scheduler.start(practice_session.queryset(), window_size)
+        practice_session.state.update({
+            "window": pack_ids(window),
+            "cursor": cursor,
+            "cards": load_cards(window),
+        })
+        practice_session.save()
+        return practice_session
+
+    @property
+    def scheduler(self):
+        return get_scheduler(self.state["scheduler"])
+
+    def queryset(self):
+        """The UserWords this session draws its cards from."""
+        return scope_queryset(self.state["scope"])
+
+    @property
+    def active(self):
+        return bool(self.state and self.state["window"])
+
+    @property
+    def window(self):
+        return unpack_ids(self.state["window"])
+
+    @window.setter
+    def window(self, ids):
+        self.state["window"] = pack_ids(ids)
+
+    @property
+    def lesson(self):
+        return self.state["lesson"]
+
+    def breadcrumb_lesson(self, card):
+        """The lesson shown at the end of the breadcrumb for this card."""
+        if self.state["lesson"]:
+            return self.state["lesson"]
+        return {"id": card["user_lesson_id"], "lesson": {"title": card["lesson_title"]}}
+
+    @property
+    def breadcrumb(self):
+        return self.state["breadcrumb"]
+
+    @property
+    def answer(self):
+        return self.state["answer"] if self.state else None
+
+    def save(self):
+        self.session[self.key] = self.state
+        self.session.modified = True
+
+    def clear(self):
+        self.flush()
+        self.session.pop(self.key, None)
+        self.state = None
+
+    def flush(self):
+        """
+        Write buffered progress and scheduling changes back with bulk_update.
+
+        The buffer holds absolute values rather than increments, so
+        writing it twice (e.g. when a request dies after the UPDATE but before
+        the session is saved) leaves the database in the same state.
+        """
+        pending = self.state.get("pending") if self.state else None
+        if not pending:
+            return
+        # bulk_update writes the same columns for every row, so group the
+        # buffered rows by the set of fields they changed
+        groups = {}
+        for user_word_id, changes in pending.items():
+            user_word = UserWord(id=int(user_word_id))
+            for card_key, value in changes.items():
+                setattr(user_word, CARD_TO_FIELD[card_key], field_value(card_key, value))
+            fields = tuple(sorted(CARD_TO_FIELD[card_key] for card_key in changes))
+            groups.setdefault(fields, []).append(user_word)
+        for fields, user_words in groups.items():
+            UserWord.objects.bulk_update(user_words, fields=list(fields))
+        if self.state.get("user_id"):
+            invalidate_folder_stats(self.state["user_id"])
+        self.state["pending"] = {}
+        self.state["answered"] = 0
+        self.save()
+
+    def current_card(self):
+        """Return the card at the head of the window, reloading it if it was invalidated."""
+        window = self.window
+        cards = self.state["cards"]
+        while window:
+            card = cards.get(str(window[0]))
+            if card is None:
+                cards.update(load_cards([window[0]]))
+                card = cards.get(str(window[0]))
+                if card is not None:
+                    # The database does not have the buffered changes yet
+                    card.update(self.state["pending"].get(str(card["id"]), {}))
+                self.save()
+            if card is not None:
+                return card
+            # The word was deleted while the session was running
+            window.pop(0)
+            self.window = window
+            self.save()
+        return None
+
+    def set_answer(self, answer_data):
+        self.state["answer"] = answer_data
+        self.save()
+
+    def advance(self, quality):
+        """
+        Apply the graded answer (SM-2 quality 0-5) to the current card and
+        rotate the window.
+
+        A passing answer moves the card out of the window and asks the
+        scheduler for the next one; a failed one sends it to the back of the
+        window. Changes are buffered in the session, which is saved with every
+        response, and flushed every PRACTICE_FLUSH_EVERY answers or when the
+        window drains.
+        """
+        card = self.current_card()
+        if card is None:
+            return
+        window = self.window
+        scheduler = self.scheduler
+        changes = scheduler.review(card, quality, timezone.now())
+        if quality >= PASSING_QUALITY:
+            changes["progress"] = card["progress"] + 1
+            window.pop(0)
+            # The card leaves the session; only its buffered changes are kept
+            self.state["cards"].pop(str(card["id"]), None)
+        else:
+            changes["progress"] = max(0, card["progress"] - 1)
+            window.append(window.pop(0))
+        card.update(changes)
+        pending = self.state["pending"]
+        pending.setdefault(str(card["id"]), {}).update(changes)
+        if quality >= PASSING_QUALITY:
+            next_id = scheduler.refill(
+                self.queryset(),
+                self.state["cursor"],
+                window + [int(user_word_id) for user_word_id in pending],
+            )
+            if next_id is not None:
+                window.append(next_id)
+                self.state["cards"].update(load_cards([next_id]))
+        self.window = window
+        self.state["answered"] += 1
+        self.state["answer"] = None
+        self.save()
+        if not window or self.state["answered"] >= settings.PRACTICE_FLUSH_EVERY:
+            self.flush()
+
+
+def iter_practice_sessions(session):
+    """Yield a PracticeSession for every practice session stored in this session."""
+    for key in list(session.keys()):
+        if key.startswith(PRACTICE_SESSION_PREFIX):
+            practice_session = PracticeSession(session, key)
+            if isinstance(practice_session.state, dict):
+                yield practice_session
+
+
+def forget_card(session, user_word_id, notes=None):
+    """
+    Invalidate a cached card after its word was edited outside the practice views.
+
+    When only the notes changed they are patched in place instead.
+    """
+    for practice_session in iter_practice_sessions(session):
+        cards = practice_session.state["cards"]
+        card = cards.get(str(user_word_id))
+        if card is None:
+            continue
+        if notes is not None:
+            card["notes"] = notes
+        else:
+            cards.pop(str(user_word_id))
+        practice_session.save()
+
+
+def flush_practice_sessions(session):
+    """Write back the buffered progress of every practice session, e.g. before logout."""
+    for practice_session in iter_practice_sessions(session):
+        practice_session.flush()
@@ -1,9 +1,17 @@
-from random import shuffle
-from .models import UserWord
+from .utils_directory_tree import get_directory_tree
+from .utils_practice_engine import (
+    PracticeSession,
+    flush_practice_sessions,
+    iter_practice_sessions,
+    scope_covers,
+)
+from .utils_scheduler import SM2Scheduler
 
 PRACTICE_MODES = {
     "normal": 0,
     "reverse": 1,
+    # Due words of every lesson under a directory, see initialize_review_session
+    "review": 2,
     # Add more modes as needed
 }
 
@@ -12,38 +20,123 @@ def get_mode_from_str(mode_str):
     return PRACTICE_MODES.get(mode_str, 0)
 
 
-def get_practice_session_keys(user_lesson_id, mode):
-    prefix = f"practice_{mode}_{user_lesson_id}"
-    return (f"{prefix}_window", f"{prefix}_pool", f"{prefix}_answer")
+def get_practice_session_key(user_lesson_id, mode):
+    return f"practice_{mode}_{user_lesson_id}"
 
 
-def initialize_practice_session(request, user_lesson, mode):
-    window_key, pool_key, answer_key = get_practice_session_keys(user_lesson.id, mode)
-    # Clear all possible practice sessions for this lesson
+def get_review_session_key(directory_id):
+    return f"practice_review_dir_{directory_id}"
+
+
+def get_practice_session(request, user_lesson_id, mode):
+    return PracticeSession(
+        request.session, get_practice_session_key(user_lesson_id, mode)
+    )
+
+
+def clear_practice_sessions(request, user_lesson_id):
+    """Flush and drop the practice sessions of a lesson in every mode."""
     for m in PRACTICE_MODES:
-        w, p, a = get_practice_session_keys(user_lesson.id, m)
-        request.session.pop(w, None)
-        request.session.pop(p, None)
-        request.session.pop(a, None)
-
-    user_words = list(
-        UserWord.objects.filter(
-            user_lesson=user_lesson, current_progress__lt=user_lesson.target_progress
-        ).values_list("id", flat=True)
+        get_practice_session(request, user_lesson_id, m).clear()
+
+
+def clear_sessions_covering(request, user_lesson):
+    """
+    Flush and drop every session that draws words from a lesson: its own
+    practice sessions and the reviews of folders above it.
+    """
+    for practice_session in iter_practice_sessions(request.session):
+        if scope_covers(practice_session.state["scope"], user_lesson):
+            practice_session.clear()
+
+
+def flush_sessions_covering(request, user_lesson):
+    """
+    Write back the buffered progress of every session that draws words
+    from a lesson, reviews of the folders above it included, without
+    ending them.
+    """
+    for practice_session in iter_practice_sessions(request.session):
+        if scope_covers(practice_session.state["scope"], user_lesson):
+            practice_session.flush()
+
+
+def initialize_practice_session(request, user_lesson, mode, scheduler=None):
+    # Sessions left unfinished elsewhere may be abandoned: save their answers
+    flush_practice_sessions(request.session)
+    # Clear all possible practice sessions for this lesson
+    clear_practice_sessions(request, user_lesson.id)
+
+    # Resolve the breadcrumb once; practice rounds reuse it from the session
+    tree = get_directory_tree(request)
+    current_directory = tree.get(user_lesson.directory_id) or user_lesson.directory
+    if not current_directory:
+        current_directory = tree.root
+
+    return PracticeSession.start(
+        request.session,
+        get_practice_session_key(user_lesson.id, mode),
+        {"user_lesson_id": user_lesson.id},
+        user_lesson.practice_window,
+        tree.get_path(current_directory),
+        user_lesson=user_lesson,
+        scheduler=scheduler,
     )
 
-    shuffle(user_words)
-    window = user_words[: user_lesson.practice_window]
-    pool = user_words[user_lesson.practice_window :]
-    request.session[window_key] = window
-    request.session[pool_key] = pool
+
+def get_review_session(request, directory_id):
+    return PracticeSession(request.session, get_review_session_key(directory_id))
+
+
+def get_review_scope(directory):
+    """Scope covering every lesson of the directory's owner under that directory."""
+    return {
+        "user_id": directory.user_id,
+        "directory_ids": directory.get_subtree_ids(),
+        # Lessons without a directory live in Home
+        "include_unfiled": directory.is_root,
+    }
+
+
+def initialize_review_session(request, directory, scope, window_size):
+    """
+    Start a "review" session over the due words of all lessons under a directory.
+
+    Reviewing due words only makes sense with spaced repetition, so these
+    sessions always use the SM-2 scheduler.
+    """
+    # Sessions left unfinished elsewhere may be abandoned: save their answers
+    flush_practice_sessions(request.session)
+    get_review_session(request, directory.id).clear()
+    return PracticeSession.start(
+        request.session,
+        get_review_session_key(directory.id),
+        scope,
+        window_size,
+        get_directory_tree(request).get_path(directory),
+        scheduler=SM2Scheduler(),
+    )
 
 
-def get_question_and_answer(user_word, mode):
+def get_question_and_answer(card, mode):
     if mode == "reverse":
-        question = user_word.word.prompt
-        correct_answer = user_word.word.translation.strip()
+        question = card["prompt"]
+        correct_answer = card["translation"].strip()
     else:  # normal
-        question = user_word.word.translation
-        correct_answer = user_word.word.prompt.strip()
+        question = card["translation"]
+        correct_answer = card["prompt"].strip()
     return question, correct_answer
+
+
+def get_accepted_answers(card, mode):
+    """Precomputed accepted answers (see Word.prompt_answers) for the mode."""
+    if mode == "reverse":
+        return card["translation_answers"]
+    return card["prompt_answers"]
+
+
+def get_answer_language(card, mode):
+    """Name of the language the answer is typed in, used by answer normalisation."""
+    if mode == "reverse":
+        return card["translation_language"]
+    return card["prompt_language"]
@@ -0,0 +1,177 @@
+from datetime import timedelta
+from random import randrange
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Mod
+from django.utils import timezone
+
+# Answer grades on the SM-2 scale (0-5); anything below PASSING_QUALITY is a lapse
+QUALITY_PERFECT = 5
+QUALITY_CORRECT = 4
+QUALITY_ACCEPTED = 3
+QUALITY_WRONG = 1
+PASSING_QUALITY = 3
+
+
+class BaseScheduler:
+    """
+    Decides which words a practice session shows and when they come back.
+
+    Schedulers work on a UserWord queryset describing the session scope, so
+    the same implementation serves single-lesson and cross-lesson sessions.
+    """
+
+    name = None
+    empty_message = "There are no words to practice."
+
+    def candidates(self, queryset):
+        """Words of the scope that are eligible for practice right now."""
+        raise NotImplementedError
+
+    def has_candidates(self, queryset):
+        return self.candidates(queryset).exists()
+
+    def start(self, queryset, window_size):
+        """
+        Return the initial window (list of UserWord ids) and a small,
+        JSON-serialisable cursor the scheduler uses to continue later.
+        """
+        raise NotImplementedError
+
+    def refill(self, queryset, cursor, exclude_ids):
+        """Return the id of the next word to enter the window, or None; may update cursor."""
+        raise NotImplementedError
+
+    def review(self, card, quality, now):
+        """Return the scheduling fields to change on a card after an answer."""
+        return {}
+
+
+class ShuffleWindowScheduler(BaseScheduler):
+    """
+    The original algorithm: shuffle every word under the target progress and
+    feed them through the window in that order.
+
+    The shuffled order is not stored. Each session draws a random
+    permutation key (id * a + b) mod SHUFFLE_MODULUS, which the database can
+    order by, and only remembers the key of the last word it handed out.
+    The session payload is therefore the same size for any lesson.
+    """
+
+    name = "shuffle"
+    empty_message = (
+        "Target progress has been reached for all words! Consider resetting "
+        "progress or increasing target progress in Edit lesson settings."
+    )
+    # Prime modulus: for ids below it, the key is unique for every id
+    SHUFFLE_MODULUS = 2147483647
+
+    def candidates(self, queryset):
+        return queryset.filter(current_progress__lt=F("user_lesson__target_progress"))
+
+    def ordered(self, queryset, cursor):
+        key = Mod(F("id") * Value(cursor["a"]) + Value(cursor["b"]), Value(self.SHUFFLE_MODULUS))
+        return (
+            self.candidates(queryset)
+            .annotate(shuffle_key=key)
+            .filter(shuffle_key__gt=cursor["last"])
+            .order_by("shuffle_key")
+        )
+
+    def start(self, queryset, window_size):
+        cursor = {
+            "a": randrange(1, self.SHUFFLE_MODULUS),
+            "b": randrange(self.SHUFFLE_MODULUS),
+            "last": -1,
+        }
+        rows = list(
+            self.ordered(queryset, cursor).values_list("id", "shuffle_key")[:window_size]
+        )
+        if rows:
+            cursor["last"] = rows[-1][1]
+        return [user_word_id for user_word_id, _ in rows], cursor
+
+    def refill(self, queryset, cursor, exclude_ids):
+        row = (
+            self.ordered(queryset, cursor)
+            .exclude(id__in=exclude_ids)
+            .values_list("id", "shuffle_key")
+            .first()
+        )
+        if row is None:
+            return None
+        cursor["last"] = row[1]
+        return row[0]
+
+
+class SM2Scheduler(BaseScheduler):
+    """
+    SM-2 spaced repetition.
+
+    Every UserWord carries a due timestamp, an ease factor, the current
+    interval in days and the number of successful repetitions. Sessions pick
+    words from the (user_lesson, due) index, most overdue first, so starting
+    a session costs one LIMIT query regardless of the lesson size.
+    """
+
+    name = "sm2"
+    empty_message = (
+        "No words are due for review right now! Come back later or reset "
+        "progress to practice all words again."
+    )
+    min_ease_factor = 1.3
+
+    def candidates(self, queryset):
+        return queryset.filter(due__lte=timezone.now()).order_by("due", "id")
+
+    def start(self, queryset, window_size):
+        window = list(
+            self.candidates(queryset).values_list("id", flat=True)[:window_size]
+        )
+        return window, {}
+
+    def refill(self, queryset, cursor, exclude_ids):
+        return (
+            self.candidates(queryset)
+            .exclude(id__in=exclude_ids)
+            .values_list("id", flat=True)
+            .first()
+        )
+
+    def review(self, card, quality, now):
+        ease_factor = card["ease_factor"]
+        if quality < PASSING_QUALITY:
+            # Lapse: start over and keep the word due right away
+            repetitions = 0
+            interval = 0
+        else:
+            repetitions = card["repetitions"] + 1
+            if repetitions == 1:
+                interval = 1
+            elif repetitions == 2:
+                interval = 6
+            else:
+                interval = round(card["interval"] * ease_factor)
+        ease_factor = max(
+            self.min_ease_factor,
+            ease_factor + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02),
+        )
+        return {
+            "repetitions": repetitions,
+            "interval": interval,
+            "ease_factor": round(ease_factor, 4),
+            "due": (now + timedelta(days=interval)).timestamp(),
+        }
+
+
+SCHEDULERS = {
+    ShuffleWindowScheduler.name: ShuffleWindowScheduler,
+    SM2Scheduler.name: SM2Scheduler,
+    # Add more schedulers as needed
+}
+
+
+def get_scheduler(name=None):
+    """Return a scheduler instance by name, defaulting to settings.PRACTICE_SCHEDULER."""
+    name = name or settings.PRACTICE_SCHEDULER
+    return SCHEDULERS.get(name, SM2Scheduler)()
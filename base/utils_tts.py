@@ -1,34 +1,333 @@
+import hashlib
+import json
 import os
+import subprocess
+import tempfile
+import unicodedata
+import wave
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from gtts import gTTS
 from django.conf import settings
+from .models import language_code_for
+from .utils_audio_format import get_audio_profile, postprocess_audio, postprocessing_enabled
 
-# Map your Language model's name to gTTS language codes
-LANGUAGE_NAME_TO_GTTS = {
-    "English": "en",
-    "Polish": "pl",
-    "Spanish": "es",
-    "Danish": "da",
-    "French": "fr",
-    "German": "de",
-    # Add more as needed
+# Content-addressed audio files, relative to MEDIA_ROOT (see audio_cache_path)
+AUDIO_CACHE_DIR = "audio/cache"
+
+
+class BaseTTSBackend:
+    """
+    A text-to-speech engine.
+
+    Backends write the audio of one text into a file. `cache_id` takes part
+    in the audio cache key, so switching engines or voices never reuses
+    files produced by another one.
+    """
+
+    name = None
+    extension = "mp3"
+    # Whether synthesize_many handles a whole batch in one engine invocation
+    supports_batch = False
+
+    @property
+    def cache_id(self):
+        return self.name
+
+    def synthesize(self, text, lang, path):
+        """Write the audio of `text` in language `lang` (ISO 639-1 code) to `path`."""
+        raise NotImplementedError
+
+    def synthesize_many(self, items, lang):
+        """Write the audio of every (text, path) in `items`, all in language `lang`."""
+        for text, path in items:
+            self.synthesize(text, lang, path)
+
+
+class GTTSBackend(BaseTTSBackend):
+    """Google Translate TTS; needs network access for every call."""
+
+    name = "gtts"
+
+    def synthesize(self, text, lang, path):
+        gTTS(text, lang=lang).save(path)
+
+
+class EspeakBackend(BaseTTSBackend):
+    """
+    Offline synthesis with a local espeak-ng (or compatible) executable,
+    set with TTS_ESPEAK_COMMAND.
+    """
+
+    name = "espeak"
+    extension = "wav"
+
+    @property
+    def cache_id(self):
+        return f"{self.name}:{settings.TTS_ESPEAK_VOICE_VARIANT}"
+
+    def synthesize(self, text, lang, path):
+        voice = lang
+        if settings.TTS_ESPEAK_VOICE_VARIANT:
+            voice = f"{lang}+{settings.TTS_ESPEAK_VOICE_VARIANT}"
+        subprocess.run(
+            [settings.TTS_ESPEAK_COMMAND, "-v", voice, "-w", path, text],
+            check=True,
+            capture_output=True,
+            timeout=settings.TTS_TIMEOUT,
+        )
+
+
+class PiperBackend(BaseTTSBackend):
+    """
+    Offline neural synthesis with a local piper executable (TTS_PIPER_COMMAND).
+
+    Each language needs a voice model, configured in TTS_PIPER_MODELS as
+    "code=path" entries. A batch is one piper process per language, fed
+    with JSON lines naming the output file of every text.
+    """
+
+    name = "piper"
+    extension = "wav"
+    supports_batch = True
+
+    @property
+    def cache_id(self):
+        return f"{self.name}:{','.join(sorted(settings.TTS_PIPER_MODELS))}"
+
+    def get_model(self, lang):
+        models = dict(entry.split("=", 1) for entry in settings.TTS_PIPER_MODELS)
+        if lang not in models:
+            raise ValueError(f"No piper voice model configured for '{lang}'.")
+        return models[lang]
+
+    def synthesize(self, text, lang, path):
+        self.synthesize_many([(text, path)], lang)
+
+    def synthesize_many(self, items, lang):
+        lines = "\n".join(
+            json.dumps({"text": text, "output_file": path}) for text, path in items
+        )
+        subprocess.run(
+            [settings.TTS_PIPER_COMMAND, "--model", self.get_model(lang), "--json-input"],
+            input=lines + "\n",
+            text=True,
+            check=True,
+            capture_output=True,
+            timeout=settings.TTS_TIMEOUT * len(items),
+        )
+
+
+class StubBackend(BaseTTSBackend):
+    """
+    Writes a short silent WAV whose length depends on the text, without any
+    engine. Deterministic and fast, for tests and benchmarks.
+    """
+
+    name = "stub"
+    extension = "wav"
+    sample_rate = 8000
+
+    def synthesize(self, text, lang, path):
+        with wave.open(path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(1)
+            f.setframerate(self.sample_rate)
+            # 10 ms of silence per character
+            f.writeframes(b"\x80" * (len(text) * self.sample_rate // 100))
+
+
+TTS_BACKENDS = {
+    GTTSBackend.name: GTTSBackend,
+    EspeakBackend.name: EspeakBackend,
+    PiperBackend.name: PiperBackend,
+    StubBackend.name: StubBackend,
+    # Add more backends as needed
 }
 
 
-def get_gtts_lang(language_obj):
-    """Get gTTS language code from a Language model instance."""
-    return LANGUAGE_NAME_TO_GTTS.get(language_obj.name, "en")  # Default to English
+def get_tts_backend(name=None):
+    """Return a TTS backend instance by name, defaulting to settings.TTS_BACKEND."""
+    name = name or settings.TTS_BACKEND
+    return TTS_BACKENDS.get(name, GTTSBackend)()
+
+
+def get_language_code(language_obj):
+    """
+    Get the ISO 639-1 code used for speech from a Language model instance,
+    falling back to the code known for its name (for rows saved without one).
+    """
+    return (
+        language_obj.code
+        or language_code_for(language_obj.name)
+        or settings.TTS_DEFAULT_LANGUAGE
+    )
+
+
+def normalise_tts_text(text):
+    """Normalise text the way it is keyed in the audio cache."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def audio_cache_path(text, language_obj, backend=None):
+    """
+    Path (relative to MEDIA_ROOT) of the audio for `text` in the cache.
+
+    Files are named after a hash of the engine, the post-processing
+    profile, the language code and the normalised text, so identical
+    phrases share one file across words and lessons.
+    """
+    backend = backend or get_tts_backend()
+    profile, extension = get_audio_profile(backend.extension)
+    engine = backend.cache_id if profile == "original" else f"{backend.cache_id}|{profile}"
+    lang = get_language_code(language_obj)
+    key = hashlib.sha256(
+        f"{engine}\0{lang}\0{normalise_tts_text(text)}".encode("utf-8")
+    ).hexdigest()
+    return f"{AUDIO_CACHE_DIR}/{key[:2]}/{key}.{extension}"
+
+
+def get_cached_audio(text, language_obj):
+    """Return the cached audio path for `text` if it was synthesised before, else None."""
+    rel_path = audio_cache_path(text, language_obj)
+    if os.path.isfile(os.path.join(settings.MEDIA_ROOT, rel_path)):
+        return rel_path
+    return None
+
+
+def scan_audio_cache(rel_paths):
+    """
+    Return which of the given cache paths exist, listing every cache
+    directory involved once instead of checking each file.
+    """
+    directories = {}
+    for rel_path in rel_paths:
+        directory, filename = rel_path.rsplit("/", 1)
+        directories.setdefault(directory, set()).add(filename)
+    existing = set()
+    for directory, filenames in directories.items():
+        try:
+            with os.scandir(os.path.join(settings.MEDIA_ROOT, directory)) as entries:
+                existing.update(
+                    f"{directory}/{entry.name}" for entry in entries if entry.name in filenames
+                )
+        except FileNotFoundError:
+            pass
+    return existing
+
+
+def synthesize_into_cache(backend, lang, items):
+    """
+    Synthesise (text, rel_path) items of one language into the cache.
+
+    Audio is written to temporary files first, post-processed if the
+    deployment asks for it (see utils_audio_format) and moved into place, so
+    parallel workers never expose a half-written file under a cache name.
+    """
+    tmp_paths = []
+
+    def make_tmp_path(directory, extension):
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=f".tmp.{extension}")
+        os.close(fd)
+        tmp_paths.append(tmp_path)
+        return tmp_path
+
+    try:
+        tmp_items = []
+        for text, rel_path in items:
+            path = os.path.join(settings.MEDIA_ROOT, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_items.append(
+                (text, make_tmp_path(os.path.dirname(path), backend.extension), path)
+            )
+        backend.synthesize_many([(text, tmp_path) for text, tmp_path, _ in tmp_items], lang)
+        for _, tmp_path, path in tmp_items:
+            if postprocessing_enabled():
+                processed_path = make_tmp_path(
+                    os.path.dirname(path), path.rsplit(".", 1)[-1]
+                )
+                postprocess_audio(tmp_path, processed_path)
+                tmp_path = processed_path
+            os.replace(tmp_path, path)
+    finally:
+        for tmp_path in tmp_paths:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def generate_audio_files(requests, synthesize=True, progress=None):
+    """
+    Batch API: resolve many (text, language_obj, target) requests at once.
+
+    Requests are deduplicated by cache path and looked up with one scan per
+    cache directory. Misses are grouped by language and synthesised in as
+    few backend invocations as the backend allows (one per language for
+    batch-capable engines, one per text otherwise), spread over a thread
+    pool of AUDIO_GENERATION_THREADS. With synthesize=False only cache hits
+    are returned. `progress` is called with the number of finished texts
+    and the total.
+
+    Returns {target: path relative to MEDIA_ROOT}; targets whose audio could
+    not be generated are left out.
+    """
+    backend = get_tts_backend()
+    by_path = {}
+    for text, language_obj, target in requests:
+        rel_path = audio_cache_path(text, language_obj, backend)
+        entry = by_path.setdefault(
+            rel_path, (normalise_tts_text(text), get_language_code(language_obj), [])
+        )
+        entry[2].append(target)
+
+    existing = scan_audio_cache(by_path)
+    missing = {}
+    if synthesize:
+        for rel_path, (text, lang, _) in by_path.items():
+            if rel_path not in existing:
+                missing.setdefault(lang, []).append((text, rel_path))
+
+    total = sum(len(items) for items in missing.values())
+    if progress:
+        progress(0, total)
+    if backend.supports_batch:
+        units = list(missing.items())
+    else:
+        units = [(lang, [item]) for lang, items in missing.items() for item in items]
+
+    done = set(existing)
+    completed = 0
+    with ThreadPoolExecutor(max_workers=settings.AUDIO_GENERATION_THREADS) as executor:
+        futures = {
+            executor.submit(synthesize_into_cache, backend, lang, items): items
+            for lang, items in units
+        }
+        for future in as_completed(futures):
+            items = futures[future]
+            if future.exception() is None:
+                done.update(rel_path for _, rel_path in items)
+            completed += len(items)
+            if progress:
+                progress(completed, total)
+
+    return {
+        target: rel_path
+        for rel_path, (_, _, targets) in by_path.items()
+        if rel_path in done
+        for target in targets
+    }
 
 
-def generate_audio_file(text, language_obj, subdir, filename):
+def generate_audio_file(text, language_obj):
     """
-    Generate an audio file for the given text and language.
+    Return the audio file for the given text and language, synthesising it
+    with the configured backend only on a cache miss.
     - language_obj: a Language model instance (e.g., word.lesson.prompt_language)
     """
-    lang = get_gtts_lang(language_obj)
-    audio_dir = os.path.join(settings.MEDIA_ROOT, subdir)
-    os.makedirs(audio_dir, exist_ok=True)
-    path = os.path.join(audio_dir, filename)
-    if not os.path.exists(path):
-        tts = gTTS(text, lang=lang)
-        tts.save(path)
-    return os.path.join(subdir, filename)  # relative to MEDIA_ROOT
+    backend = get_tts_backend()
+    rel_path = audio_cache_path(text, language_obj, backend)
+    if not os.path.exists(os.path.join(settings.MEDIA_ROOT, rel_path)):
+        synthesize_into_cache(
+            backend,
+            get_language_code(language_obj),
+            [(normalise_tts_text(text), rel_path)],
+        )
+    return rel_path  # relative to MEDIA_ROOT
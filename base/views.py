@@ -1,8 +1,9 @@
 from django.db import transaction
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.views.decorators.http import require_http_methods
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.db.models import Q  # Import Q for complex queries
 from django.db.models import Avg  # Import Avg for aggregation
 from django.db.models.functions import Lower
@@ -21,6 +22,9 @@ from .models import (
     Language,
     UserProfile,
     UserDirectory,
+    AudioJob,
+    release_audio_files,
+    word_hint,
 )
 from .forms import (
     RateLessonForm,
@@ -31,23 +35,67 @@ from .forms import (
     UserDirectoryForm,
     MoveLessonForm,
     MoveDirectoryForm,
+    DeckImportForm,
 )
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from random import shuffle
+import csv
 import json
-from Levenshtein import distance
-import difflib
-from .utils_tts import generate_audio_file
+import sqlite3
+import zipfile
+import zlib
+from .utils_audio_jobs import (
+    enqueue_word_audio,
+    enqueue_lesson_audio,
+    has_pending_audio,
+)
 import os
 from django.views.decorators.http import require_POST
 
 from .utils_practice_session import (
-    PRACTICE_MODES,
-    get_mode_from_str,
-    get_practice_session_keys,
+    get_practice_session,
+    clear_practice_sessions,
+    clear_sessions_covering,
+    flush_sessions_covering,
     initialize_practice_session,
+    get_review_session,
+    get_review_scope,
+    initialize_review_session,
     get_question_and_answer,
+    get_answer_language,
+    get_accepted_answers,
+)
+from .utils_answers import evaluate_answer
+from .utils_deck_import import iter_deck
+from .utils_directory_tree import (
+    DirectoryTreeError,
+    delete_directory_subtree,
+    delete_items,
+    get_directory_tree,
+    get_folder_stats,
+    invalidate_folder_stats,
+    move_directory_contents,
+    move_items,
+)
+from .utils_lesson_archive import iter_directory_archive, restore_directory_archive
+from .utils_lesson_clone import clone_lesson, create_user_words
+from .utils_lesson_export import EXPORT_FORMATS, export_lesson
+from .utils_lesson_import import (
+    LESSON_JSON_REQUIRED,
+    import_words,
+    iter_lesson_json_words,
+    read_lesson_json,
+)
+from .utils_audio_bundle import get_lesson_bundle, iter_file_range, parse_range
+from .utils_practice_engine import forget_card, flush_practice_sessions, scope_queryset
+from .utils_scheduler import (
+    QUALITY_PERFECT,
+    QUALITY_CORRECT,
+    QUALITY_ACCEPTED,
+    QUALITY_WRONG,
+    SM2Scheduler,
+    get_scheduler,
 )
 
 
@@ -74,6 +122,8 @@ def loginPage(request):
 
 @require_POST
 def logoutUser(request):
+    # logout() discards the session, so write back unsaved practice progress first
+    flush_practice_sessions(request.session)
     logout(request)
     messages.info(request, "User was logged out")
     return redirect("home")
@@ -108,42 +158,47 @@ def myLessons(request, directory_id=None):
     user = request.user
 
     # Get or create root directory for the user
-    root_directory = UserDirectory.get_or_create_root_directory(user)
+    tree = get_directory_tree(request)
+    root_directory = tree.root
 
     # Determine current directory
     if directory_id:
-        current_directory = get_object_or_404(UserDirectory, id=directory_id, user=user)
+        current_directory = tree.get(directory_id) or get_object_or_404(
+            UserDirectory, id=directory_id, user=user
+        )
     else:
         current_directory = root_directory
 
     # Get subdirectories in current directory
-    subdirectories = UserDirectory.objects.filter(
-        user=user, parent_directory=current_directory
-    ).order_by(Lower("name"))
-
-    # Get lessons in current directory
-    user_lessons = UserLesson.objects.filter(
-        user=user, directory=current_directory
-    ).select_related(
-        "lesson", "lesson__prompt_language", "lesson__translation_language"
-    ).order_by(Lower("lesson__title"))
+    subdirectories = tree.get_children(current_directory)
 
     # Get lessons without a directory (for migration purposes, put them in root)
-    orphan_lessons = UserLesson.objects.filter(
-        user=user, directory__isnull=True
-    )
-    if orphan_lessons.exists() and current_directory == root_directory:
+    if current_directory.id == root_directory.id:
         # Move orphan lessons to root directory
-        orphan_lessons.update(directory=root_directory)
-        # Refresh the query
-        user_lessons = UserLesson.objects.filter(
-            user=user, directory=current_directory
-        ).select_related(
-            "lesson", "lesson__prompt_language", "lesson__translation_language"
-        ).order_by(Lower("lesson__title"))
+        if UserLesson.objects.filter(user=user, directory__isnull=True).update(
+            directory=root_directory
+        ):
+            invalidate_folder_stats(user.id)
+
+    # Get lessons in current directory
+    user_lessons = list(
+        UserLesson.objects.filter(user=user, directory=current_directory)
+        .select_related(
+            "lesson", "lesson__prompt_language", "lesson__translation_language",
+            "lesson__access_type",
+        )
+        .order_by(Lower("lesson__title"))
+    )
+
+    # Word counts and progress of every item, recursive for folders
+    folder_stats = get_folder_stats(request)
+    for my_lesson in user_lessons:
+        my_lesson.stats = folder_stats["lessons"].get(my_lesson.id)
+    for subdir in subdirectories:
+        subdir.stats = folder_stats["directories"].get(subdir.id)
 
     # Build breadcrumb path
-    breadcrumb_path = current_directory.get_path()
+    breadcrumb_path = tree.get_path(current_directory)
 
     # Store current directory in session for use in other views
     request.session['current_directory_id'] = current_directory.id
@@ -156,6 +211,7 @@ def myLessons(request, directory_id=None):
         "my_lessons": user_lessons,
         "subdirectories": subdirectories,
         "current_directory": current_directory,
+        "current_stats": folder_stats["directories"].get(current_directory.id),
         "breadcrumb_path": breadcrumb_path,
         "root_directory": root_directory,
         "directory_form": directory_form,
@@ -176,16 +232,19 @@ def myLessonDetails(request, my_lesson_id):
     if request.user.id != myLesson.user.id and not request.user.is_superuser:
         return HttpResponse("You are not allowed here!", status=403)
 
+    # Show up-to-date progress while a practice or review session is still running
+    flush_sessions_covering(request, myLesson)
+
     # --- Ensure all words in the lesson have a corresponding UserWord for this UserLesson ---
-    lesson_words = myLesson.lesson.words.all()
-    existing_userword_word_ids = set(
-        UserWord.objects.filter(user_lesson=myLesson).values_list("word_id", flat=True)
-    )
-    missing_words = [w for w in lesson_words if w.id not in existing_userword_word_ids]
-    for word in missing_words:
-        UserWord.objects.create(
-            user_lesson=myLesson, word=word, current_progress=0, notes=""
-        )
+    # (one query finds them, including words a fork shares with its source)
+    missing_word_ids = myLesson.lesson.get_words().exclude(
+        id__in=UserWord.objects.filter(user_lesson=myLesson).values("word_id")
+    ).values_list("id", flat=True)
+    if UserWord.objects.bulk_create([
+        UserWord(user_lesson=myLesson, word_id=word_id, current_progress=0, notes="")
+        for word_id in missing_word_ids
+    ]):
+        invalidate_folder_stats(myLesson.user_id)
     # ----------------------------------------------------------------------
 
     myWords = UserWord.objects.filter(user_lesson=myLesson).order_by(
@@ -243,7 +302,7 @@ def myLessonDetails(request, my_lesson_id):
                 )
 
                 # Check if the word already exists in the lesson
-                if Word.objects.filter(prompt=prompt, lesson=myLesson.lesson).exists():
+                if myLesson.lesson.get_words().filter(prompt=prompt).exists():
                     messages.error(request, "This word already exists in the lesson.")
                     return redirect("my-lesson-details", my_lesson_id=myLesson.id)
 
@@ -262,25 +321,8 @@ def myLessonDetails(request, my_lesson_id):
                 
                 new_word.save()
 
-                # Generate prompt audio
-                if new_word.prompt:
-                    rel_path = generate_audio_file(
-                        new_word.prompt,
-                        myLesson.lesson.prompt_language,
-                        "audio/prompts",
-                        f"word_{new_word.id}_prompt.mp3",
-                    )
-                    new_word.prompt_audio = rel_path
-                # Generate usage audio
-                if new_word.usage:
-                    rel_path = generate_audio_file(
-                        new_word.usage,
-                        myLesson.lesson.prompt_language,
-                        "audio/usages",
-                        f"word_{new_word.id}_usage.mp3",
-                    )
-                    new_word.usage_audio = rel_path
-                new_word.save()
+                # Prompt and usage audio are generated by the audio worker
+                enqueue_word_audio(new_word)
 
                 # Now create the UserWord instance with the new Word
                 UserWord.objects.create(
@@ -289,6 +331,7 @@ def myLessonDetails(request, my_lesson_id):
                     current_progress=0,
                     notes=userWordForm.cleaned_data.get("notes", ""),
                 )
+                invalidate_folder_stats(myLesson.user_id)
 
                 myLesson.lesson.updated = (
                     new_word.updated
@@ -306,12 +349,13 @@ def myLessonDetails(request, my_lesson_id):
                 return redirect("my-lesson-details", my_lesson_id=myLesson.id)
 
     # Get breadcrumb path from lesson's directory
-    current_directory = myLesson.directory
+    tree = get_directory_tree(request)
+    current_directory = tree.get(myLesson.directory_id) or myLesson.directory
     if not current_directory:
-        current_directory = UserDirectory.get_or_create_root_directory(request.user)
+        current_directory = tree.root
         myLesson.directory = current_directory
         myLesson.save()
-    breadcrumb_path = current_directory.get_path()
+    breadcrumb_path = tree.get_path(current_directory)
 
     context = {
         "my_lesson": myLesson,
@@ -372,10 +416,11 @@ def deleteMyLesson(request, my_lesson_id):
             return redirect("my-lessons")
 
     # Get breadcrumb path from lesson's directory
-    current_directory = myLesson.directory
+    tree = get_directory_tree(request)
+    current_directory = tree.get(myLesson.directory_id) or myLesson.directory
     if not current_directory:
-        current_directory = UserDirectory.get_or_create_root_directory(request.user)
-    breadcrumb_path = current_directory.get_path()
+        current_directory = tree.root
+    breadcrumb_path = tree.get_path(current_directory)
 
     context = {
         "my_lesson": myLesson,
@@ -392,7 +437,7 @@ def deleteMyLesson(request, my_lesson_id):
 def myWordDetails(request, my_word_id):
 
     myWord = UserWord.objects.select_related(
-        "user_lesson", "user_lesson__user", "user_lesson__directory", "word"
+        "user_lesson", "user_lesson__user", "user_lesson__directory", "user_lesson__lesson", "word"
     ).filter(id=my_word_id).first()
     if not myWord:
         return HttpResponse("You do not have this word in your lesson.", status=404)
@@ -404,13 +449,17 @@ def myWordDetails(request, my_word_id):
         return HttpResponse("You are not allowed here!", status=403)
 
     # Get breadcrumb path from lesson's directory
-    current_directory = myWord.user_lesson.directory
+    tree = get_directory_tree(request)
+    current_directory = tree.get(myWord.user_lesson.directory_id) or myWord.user_lesson.directory
     if not current_directory:
-        current_directory = UserDirectory.get_or_create_root_directory(request.user)
-    breadcrumb_path = current_directory.get_path()
+        current_directory = tree.root
+    breadcrumb_path = tree.get_path(current_directory)
 
     context = {
         "my_word": myWord,
+        "hint": word_hint(
+            myWord.word.hint, myWord.word.prompt, myWord.user_lesson.lesson.auto_hints
+        ),
         "current_directory": current_directory,
         "breadcrumb_path": breadcrumb_path,
         "breadcrumb_lesson": myWord.user_lesson,
@@ -467,7 +516,7 @@ def lessonDetails(request, lesson_id):
 
     # rated_already = Rating.objects.filter(user=user, lesson=lesson).first()
 
-    words = lesson.words.all().order_by(Lower("prompt"))
+    words = lesson.get_words().order_by(Lower("prompt"))
 
     context = {
         "lesson": lesson,
@@ -532,7 +581,8 @@ def wordDetails(request, lesson_id, prompt):
     )
     if lesson.access_type.name == "private":
         return HttpResponse("This lesson is not public", status=403)
-    word = get_object_or_404(Word, prompt=prompt, lesson=lesson)
+    # Forks show the words they share with their source too
+    word = get_object_or_404(lesson.get_words(), prompt=prompt)
 
     context = {
         "lesson": lesson,
@@ -559,11 +609,7 @@ def importLesson(request, lesson_id):
         allowed_error_margin=user.userprofile.allowed_error_margin,
     )
 
-    words = Word.objects.filter(lesson=lesson)
-    UserWord.objects.bulk_create([
-        UserWord(user_lesson=newLesson, word=word, current_progress=0, notes="")
-        for word in words
-    ])
+    create_user_words(newLesson)
     lesson.changes_log = (
         lesson.changes_log + "\n" if lesson.changes_log else ""
     ) + f"{timezone.now()} Lesson imported by {user.username}"
@@ -576,15 +622,8 @@ def importLesson(request, lesson_id):
 @transaction.atomic  # ensures rollback on failure
 def createLesson(request):
     # Get current directory from session, or use root directory
-    current_directory_id = request.session.get('current_directory_id')
-    if current_directory_id:
-        current_directory = UserDirectory.objects.filter(
-            id=current_directory_id, user=request.user
-        ).first()
-        if not current_directory:
-            current_directory = UserDirectory.get_or_create_root_directory(request.user)
-    else:
-        current_directory = UserDirectory.get_or_create_root_directory(request.user)
+    tree = get_directory_tree(request)
+    current_directory = tree.get(request.session.get('current_directory_id')) or tree.root
 
     if request.method == "POST":
         user_lesson_form = UserLessonForm(request.POST)
@@ -626,7 +665,7 @@ def createLesson(request):
         })
 
     # Build breadcrumb for current directory
-    breadcrumb_path = current_directory.get_path()
+    breadcrumb_path = tree.get_path(current_directory)
 
     context = {
         "lesson_form": user_lesson_form,
@@ -654,7 +693,7 @@ def copyLesson(request, my_lesson_id):
         return HttpResponse("You cannot copy a private lesson.", status=403)
 
     # Get or create root directory for the user
-    root_directory = UserDirectory.get_or_create_root_directory(request.user)
+    root_directory = get_directory_tree(request).root
 
     # Create a new lesson based on the existing one
     lesson = myLesson.lesson
@@ -662,42 +701,21 @@ def copyLesson(request, my_lesson_id):
         lesson.changes_log + "\n" if lesson.changes_log else ""
     ) + f"{timezone.now()} Lesson copied by {request.user.username}"
 
-    new_lesson = Lesson(
-        title=lesson.title,
-        description=lesson.description,
-        prompt_language=lesson.prompt_language,
-        translation_language=lesson.translation_language,
-        author=request.user,
-        access_type=AccessType.objects.get(name="private"),  # Set to private by default
-        original_lesson=lesson,  # Link to the original lesson
+    # Write back progress buffered by a running practice session first: the
+    # copy replaces the user's lesson, so their progress moves to it
+    clear_practice_sessions(request, myLesson.id)
+    new_user_lesson = clone_lesson(
+        lesson,
+        request.user,
+        root_directory,  # Assign to root directory
         changes_log=lesson.changes_log,
+        user_lesson_settings={
+            "target_progress": myLesson.target_progress,
+            "practice_window": myLesson.practice_window,
+            "allowed_error_margin": myLesson.allowed_error_margin,
+        },
+        progress_from=myLesson,
     )
-    new_lesson.save()
-    # Create a UserLesson for the new lesson
-    new_user_lesson = UserLesson.objects.create(
-        user=request.user, 
-        lesson=new_lesson,
-        directory=root_directory  # Assign to root directory
-    )
-
-    # Copy words from the original lesson to the new lesson
-    words = lesson.words.all()
-    for word in words:
-        new_word = Word(
-            lesson=new_lesson,
-            prompt=word.prompt,
-            translation=word.translation,
-            usage=word.usage,
-            hint=word.hint,
-        )
-        new_word.save()
-        # Create a UserWord for the new UserLesson
-        UserWord.objects.create(
-            user_lesson=new_user_lesson,
-            word=new_word,
-            current_progress=0,  # Default progress
-            notes="",  # Default notes
-        )
     # Remove the original lesson from the UserLesson
     myLesson.delete()
 
@@ -722,59 +740,22 @@ def importAndCopyLesson(request, lesson_id):
         return HttpResponse("This lesson is private and cannot be imported.", status=403)
 
     # Get or create root directory for the user
-    root_directory = UserDirectory.get_or_create_root_directory(user)
-
-    # Create a new lesson as a copy
-    new_lesson = Lesson(
-        title=lesson.title,
-        description=lesson.description,
-        prompt_language=lesson.prompt_language,
-        translation_language=lesson.translation_language,
-        author=user,
-        access_type=AccessType.objects.get(name="private"),  # Set to private
-        original_lesson=lesson,  # Link to the original
-        changes_log="",
-    )
-    new_lesson.save()
-
-    # Create UserLesson for the new lesson
-    new_user_lesson = UserLesson.objects.create(
-        user=user, lesson=new_lesson,
-        directory=root_directory,  # Assign to root directory
-        target_progress=user.userprofile.target_progress,
-        practice_window=user.userprofile.practice_window,
-        allowed_error_margin=user.userprofile.allowed_error_margin,
+    root_directory = get_directory_tree(request).root
+
+    # Create a new lesson as a copy, with a UserLesson and UserWords
+    new_user_lesson = clone_lesson(
+        lesson,
+        user,
+        root_directory,  # Assign to root directory
+        user_lesson_settings={
+            "target_progress": user.userprofile.target_progress,
+            "practice_window": user.userprofile.practice_window,
+            "allowed_error_margin": user.userprofile.allowed_error_margin,
+        },
+        # Auto-generate hints for words if preference is enabled
+        auto_generate_hints=user.userprofile.auto_generate_hints,
     )
 
-    # Copy words to the new lesson using bulk operations
-    words = list(lesson.words.all())
-    
-    # Auto-generate hints for words if preference is enabled
-    auto_generate = user.userprofile.auto_generate_hints
-    new_words_data = []
-    for word in words:
-        hint = word.hint
-        if auto_generate and not hint and word.prompt:
-            hint = word.prompt[0].upper()
-        new_words_data.append(Word(
-            lesson=new_lesson,
-            prompt=word.prompt,
-            translation=word.translation,
-            usage=word.usage,
-            hint=hint,
-        ))
-    
-    new_words = Word.objects.bulk_create(new_words_data)
-    UserWord.objects.bulk_create([
-        UserWord(
-            user_lesson=new_user_lesson,
-            word=new_word,
-            current_progress=0,
-            notes="",
-        )
-        for new_word in new_words
-    ])
-
     # Update original lesson's changes_log
     lesson.changes_log = (
         lesson.changes_log + "\n" if lesson.changes_log else ""
@@ -889,10 +870,11 @@ def editLesson(request, my_lesson_id):
             return redirect("my-lesson-details", my_lesson_id=myLesson.id)
 
     # Get breadcrumb path from lesson's directory
-    current_directory = myLesson.directory
+    tree = get_directory_tree(request)
+    current_directory = tree.get(myLesson.directory_id) or myLesson.directory
     if not current_directory:
-        current_directory = UserDirectory.get_or_create_root_directory(request.user)
-    breadcrumb_path = current_directory.get_path()
+        current_directory = tree.root
+    breadcrumb_path = tree.get_path(current_directory)
 
     context = {
         "edit_user_lesson_form": edit_user_lesson_form,
@@ -911,17 +893,28 @@ def resetProgress(request, my_lesson_id):
 
     if request.method == "POST":
         # Reset progress for all UserWords in this UserLesson
-        UserWord.objects.filter(user_lesson=myLesson).update(current_progress=0)
+        # End running sessions first, reviews of the folders above included,
+        # so their buffered progress is not written over the reset
+        clear_sessions_covering(request, myLesson)
+        UserWord.objects.filter(user_lesson=myLesson).update(
+            current_progress=0,
+            due=timezone.now(),
+            ease_factor=2.5,
+            interval=0,
+            repetitions=0,
+        )
+        invalidate_folder_stats(myLesson.user_id)
         messages.success(
             request, "Progress for all words in this lesson has been reset to 0."
         )
         return redirect("my-lesson-details", my_lesson_id=my_lesson_id)
 
     # Get breadcrumb path from lesson's directory
-    current_directory = myLesson.directory
+    tree = get_directory_tree(request)
+    current_directory = tree.get(myLesson.directory_id) or myLesson.directory
     if not current_directory:
-        current_directory = UserDirectory.get_or_create_root_directory(request.user)
-    breadcrumb_path = current_directory.get_path()
+        current_directory = tree.root
+    breadcrumb_path = tree.get_path(current_directory)
 
     context = {
         "my_lesson": myLesson,
@@ -967,7 +960,7 @@ def createWord(request, my_lesson_id):
             notes = create_word_form.cleaned_data["notes"]
 
             # Check if the word already exists in the lesson
-            if Word.objects.filter(prompt=prompt, lesson=myLesson.lesson).exists():
+            if myLesson.lesson.get_words().filter(prompt=prompt).exists():
                 messages.error(request, "This word already exists in the lesson.")
                 return redirect("create-word", my_lesson_id=myLesson.id)
 
@@ -986,25 +979,8 @@ def createWord(request, my_lesson_id):
             
             new_word.save()
 
-            # Generate prompt audio
-            if new_word.prompt:
-                rel_path = generate_audio_file(
-                    new_word.prompt,
-                    myLesson.lesson.prompt_language,
-                    "audio/prompts",
-                    f"word_{new_word.id}_prompt.mp3",
-                )
-                new_word.prompt_audio = rel_path
-            # Generate usage audio
-            if new_word.usage:
-                rel_path = generate_audio_file(
-                    new_word.usage,
-                    myLesson.lesson.prompt_language,
-                    "audio/usages",
-                    f"word_{new_word.id}_usage.mp3",
-                )
-                new_word.usage_audio = rel_path
-            new_word.save()
+            # Prompt and usage audio are generated by the audio worker
+            enqueue_word_audio(new_word)
 
             # Now create the UserWord instance with the new Word
             UserWord.objects.create(
@@ -1013,6 +989,7 @@ def createWord(request, my_lesson_id):
                 current_progress=0,
                 notes=notes,
             )
+            invalidate_folder_stats(myLesson.user_id)
 
             myLesson.lesson.updated = new_word.updated  # Update lesson's updated time
             myLesson.lesson.changes_log = (
@@ -1036,10 +1013,11 @@ def createWord(request, my_lesson_id):
         create_word_form = UserWordForm()
 
     # Get breadcrumb path from lesson's directory
-    current_directory = myLesson.directory
+    tree = get_directory_tree(request)
+    current_directory = tree.get(myLesson.directory_id) or myLesson.directory
     if not current_directory:
-        current_directory = UserDirectory.get_or_create_root_directory(request.user)
-    breadcrumb_path = current_directory.get_path()
+        current_directory = tree.root
+    breadcrumb_path = tree.get_path(current_directory)
 
     context = {
         "create_word_form": create_word_form,
@@ -1083,6 +1061,9 @@ def editWord(request, my_word_id):
             request.POST, instance=myWord, word_instance=myWord.word
         )
         if edit_word_form.is_valid():
+            if myWord.user_lesson.lesson.is_shared_word(myWord.word):
+                # Copy on write: the fork gets its own row, the source stays as it is
+                myWord.word = myWord.user_lesson.lesson.materialise_word(myWord.word)
             old_prompt = myWord.word.prompt
             old_usage = myWord.word.usage
 
@@ -1091,49 +1072,35 @@ def editWord(request, my_word_id):
             myWord.word.translation = edit_word_form.cleaned_data["translation"]
             myWord.word.usage = edit_word_form.cleaned_data["usage"]
             myWord.word.hint = edit_word_form.cleaned_data["hint"]
-            myWord.word.save()
+            changed_audio = []
+            old_audio = []
 
             # Check if prompt changed
             if myWord.word.prompt and myWord.word.prompt != old_prompt:
-                # Remove old prompt audio file if it exists
-                if (
-                    myWord.word.prompt_audio
-                    and myWord.word.prompt_audio.path
-                    and os.path.isfile(myWord.word.prompt_audio.path)
-                ):
-                    print(f"Removing old prompt audio: {myWord.word.prompt_audio.path}")
-                    os.remove(myWord.word.prompt_audio.path)
-                    myWord.word.prompt_audio = None
-                rel_path = generate_audio_file(
-                    myWord.word.prompt,
-                    myWord.word.lesson.prompt_language,
-                    "audio/prompts",
-                    f"word_{myWord.word.id}_prompt.mp3",
-                )
-                myWord.word.prompt_audio = rel_path
+                # Drop the old prompt audio; the file goes once no word uses it
+                old_audio.append(myWord.word.prompt_audio.name)
+                myWord.word.prompt_audio = None
+                myWord.word.prompt_audio_codec = ""
+                myWord.word.prompt_audio_duration = None
+                changed_audio.append("prompt")
 
             # Check if usage changed
             if myWord.word.usage and myWord.word.usage != old_usage:
-                # Remove old usage audio file if it exists
-                if (
-                    myWord.word.usage_audio
-                    and myWord.word.usage_audio.path
-                    and os.path.isfile(myWord.word.usage_audio.path)
-                ):
-                    print(f"Removing old usage audio: {myWord.word.usage_audio.path}")
-                    os.remove(myWord.word.usage_audio.path)
-                    myWord.word.usage_audio = None
-                rel_path = generate_audio_file(
-                    myWord.word.usage,
-                    myWord.word.lesson.prompt_language,
-                    "audio/usages",
-                    f"word_{myWord.word.id}_usage.mp3",
-                )
-                myWord.word.usage_audio = rel_path
+                # Drop the old usage audio; the file goes once no word uses it
+                old_audio.append(myWord.word.usage_audio.name)
+                myWord.word.usage_audio = None
+                myWord.word.usage_audio_codec = ""
+                myWord.word.usage_audio_duration = None
+                changed_audio.append("usage")
 
             myWord.word.save()
+            release_audio_files(old_audio)
+            # New audio is generated by the audio worker
+            enqueue_word_audio(myWord.word, changed_audio)
             myWord.notes = edit_word_form.cleaned_data["notes"]
             myWord.save()
+            # Running practice sessions reload this card on their next round
+            forget_card(request.session, myWord.id)
 
             # Update the lesson's updated time to reflect changes
             myWord.user_lesson.lesson.updated = timezone.now()
@@ -1156,10 +1123,11 @@ def editWord(request, my_word_id):
         edit_word_form = UserWordForm(instance=myWord, word_instance=myWord.word)
 
     # Get breadcrumb path from lesson's directory
-    current_directory = myWord.user_lesson.directory
+    tree = get_directory_tree(request)
+    current_directory = tree.get(myWord.user_lesson.directory_id) or myWord.user_lesson.directory
     if not current_directory:
-        current_directory = UserDirectory.get_or_create_root_directory(request.user)
-    breadcrumb_path = current_directory.get_path()
+        current_directory = tree.root
+    breadcrumb_path = tree.get_path(current_directory)
 
     context = {
         "edit_word_form": edit_word_form,
@@ -1191,6 +1159,8 @@ def updateNotes(request, my_word_id):
         notes = request.POST.get("notes", "")
         myWord.notes = notes
         myWord.save()
+        # Keep a running practice session in sync with the edited notes
+        forget_card(request.session, myWord.id, notes=notes)
 
         return JsonResponse({"success": True, "notes": notes})
 
@@ -1198,6 +1168,32 @@ def updateNotes(request, my_word_id):
         return JsonResponse({"error": str(e)}, status=500)
 
 
+@login_required(login_url="login")
+def wordAudioStatus(request, my_word_id):
+    """Audio URLs of a word, polled by templates while its audio jobs are queued."""
+    myWord = UserWord.objects.select_related(
+        "user_lesson", "word"
+    ).filter(id=my_word_id).first()
+
+    if not myWord:
+        return JsonResponse({"error": "Word not found"}, status=404)
+
+    if request.user.id != myWord.user_lesson.user_id and not request.user.is_superuser:
+        return JsonResponse({"error": "Permission denied"}, status=403)
+
+    word = myWord.word
+    version = int(word.updated.timestamp())
+    return JsonResponse({
+        "pending": has_pending_audio(word),
+        "prompt_audio_url": (
+            f"{word.prompt_audio.url}?v={version}" if word.has_prompt_audio() else ""
+        ),
+        "usage_audio_url": (
+            f"{word.usage_audio.url}?v={version}" if word.has_usage_audio() else ""
+        ),
+    })
+
+
 @login_required(login_url="login")
 @transaction.atomic
 def deleteWord(request, my_word_id):
@@ -1224,9 +1220,23 @@ def deleteWord(request, my_word_id):
         return HttpResponse("You do not have rights to edit this lesson!", status=403)
 
     if request.method == "POST":
+        # Everyone studying the lesson (or a fork sharing the word) loses it
+        affected_user_ids = set(
+            UserLesson.objects.filter(
+                Q(lesson=myLesson.lesson) | Q(lesson__word_source=myWord.word.lesson_id)
+            ).values_list("user_id", flat=True)
+        )
 
-        # Delete word from repository and all related UserWord
-        myWord.word.delete()
+        if myLesson.lesson.is_shared_word(myWord.word):
+            # A fork only stops using a word shared with its source
+            myLesson.lesson.hide_shared_word(myWord.word)
+        else:
+            # Forks sharing the word keep their own copy of it
+            myLesson.lesson.detach_word_from_forks(myWord.word)
+            # Delete word from repository and all related UserWord
+            myWord.word.delete()
+        for user_id in affected_user_ids:
+            invalidate_folder_stats(user_id)
         messages.success(
             request,
             f"Word and all your references were deleted from {myLesson.lesson.title}.",
@@ -1241,10 +1251,11 @@ def deleteWord(request, my_word_id):
         return redirect("my-lesson-details", my_lesson_id=myLesson.id)
 
     # Get breadcrumb path from lesson's directory
-    current_directory = myWord.user_lesson.directory
+    tree = get_directory_tree(request)
+    current_directory = tree.get(myWord.user_lesson.directory_id) or myWord.user_lesson.directory
     if not current_directory:
-        current_directory = UserDirectory.get_or_create_root_directory(request.user)
-    breadcrumb_path = current_directory.get_path()
+        current_directory = tree.root
+    breadcrumb_path = tree.get_path(current_directory)
 
     context = {
         "my_word": myWord,
@@ -1261,174 +1272,197 @@ def deleteWord(request, my_word_id):
 
 @login_required(login_url="login")
 def start_practice(request, user_lesson_id, mode="normal"):
-    user_lesson = get_object_or_404(UserLesson, id=user_lesson_id, user=request.user)
+    user_lesson = get_object_or_404(
+        UserLesson.objects.select_related("lesson", "directory"),
+        id=user_lesson_id,
+        user=request.user,
+    )
 
     # Check if there are any words that still need practice
-    words_to_practice = UserWord.objects.filter(
-        user_lesson=user_lesson, current_progress__lt=user_lesson.target_progress
-    ).exists()
-
-    if not words_to_practice:
-        messages.info(
-            request,
-            "Target progress has been reached for all words! Consider resetting progress or increasing target progress in Edit lesson settings."
-        )
+    scheduler = get_scheduler()
+    if not scheduler.has_candidates(user_lesson.user_words.all()):
+        messages.info(request, scheduler.empty_message)
         return redirect("my-lesson-details", my_lesson_id=user_lesson_id)
 
-    initialize_practice_session(request, user_lesson, mode)
+    initialize_practice_session(request, user_lesson, mode, scheduler=scheduler)
     return redirect("practice", user_lesson_id=user_lesson_id, mode=mode)
 
 
 @login_required(login_url="login")
 def practice(request, user_lesson_id, mode="normal"):
-    window_key, pool_key, answer_key = get_practice_session_keys(user_lesson_id, mode)
-    window = request.session.get(window_key, [])
-    pool = request.session.get(pool_key, [])
+    # The session only ever holds the current user's words, so the cached
+    # cards can be served without re-checking ownership in the database.
+    return practice_question(
+        request,
+        get_practice_session(request, user_lesson_id, mode),
+        mode,
+        practice_url=reverse("practice", kwargs={"user_lesson_id": user_lesson_id, "mode": mode}),
+        feedback_url=reverse("practice-feedback", kwargs={"user_lesson_id": user_lesson_id, "mode": mode}),
+        cancel_url=reverse("cancel-practice", kwargs={"user_lesson_id": user_lesson_id}),
+        done_url=reverse("my-lesson-details", kwargs={"my_lesson_id": user_lesson_id}),
+    )
+
+
+@login_required(login_url="login")
+def practice_feedback(request, user_lesson_id, mode="normal"):
+    return practice_answer_feedback(
+        request,
+        get_practice_session(request, user_lesson_id, mode),
+        mode,
+        practice_url=reverse("practice", kwargs={"user_lesson_id": user_lesson_id, "mode": mode}),
+        cancel_url=reverse("cancel-practice", kwargs={"user_lesson_id": user_lesson_id}),
+    )
+
+
+@login_required(login_url="login")
+def cancel_practice(request, user_lesson_id):
+    # Cancel all possible practice sessions for this lesson (all modes)
+    clear_practice_sessions(request, user_lesson_id)
+    messages.info(request, "Practice session cancelled.")
+    return redirect("my-lesson-details", my_lesson_id=user_lesson_id)
 
-    if not window:
-        # Session complete
-        request.session.pop(window_key, None)
-        request.session.pop(pool_key, None)
-        request.session.pop(answer_key, None)
-        messages.info(request, "Practice session completed!")
-        return redirect("my-lesson-details", my_lesson_id=user_lesson_id)
 
-    user_word = get_object_or_404(
-        UserWord,
-        id=window[0],
-        user_lesson__user=request.user,
-        user_lesson_id=user_lesson_id,
+@login_required(login_url="login")
+def start_review(request, directory_id=None):
+    """Start reviewing the due words of every lesson under a directory."""
+    tree = get_directory_tree(request)
+    if directory_id:
+        directory = tree.get(directory_id) or get_object_or_404(
+            UserDirectory, id=directory_id, user=request.user
+        )
+    else:
+        directory = tree.root
+
+    scope = get_review_scope(directory)
+    if not SM2Scheduler().has_candidates(scope_queryset(scope)):
+        messages.info(request, "No words are due for review in this folder right now!")
+        return redirect("my-lessons-directory", directory_id=directory.id)
+
+    initialize_review_session(
+        request, directory, scope, request.user.userprofile.practice_window
+    )
+    return redirect("review", directory_id=directory.id)
+
+
+@login_required(login_url="login")
+def review(request, directory_id):
+    return practice_question(
+        request,
+        get_review_session(request, directory_id),
+        "review",
+        practice_url=reverse("review", kwargs={"directory_id": directory_id}),
+        feedback_url=reverse("review-feedback", kwargs={"directory_id": directory_id}),
+        cancel_url=reverse("cancel-review", kwargs={"directory_id": directory_id}),
+        done_url=reverse("my-lessons-directory", kwargs={"directory_id": directory_id}),
     )
 
-    question, correct_answer = get_question_and_answer(user_word, mode)
+
+@login_required(login_url="login")
+def review_feedback(request, directory_id):
+    return practice_answer_feedback(
+        request,
+        get_review_session(request, directory_id),
+        "review",
+        practice_url=reverse("review", kwargs={"directory_id": directory_id}),
+        cancel_url=reverse("cancel-review", kwargs={"directory_id": directory_id}),
+    )
+
+
+@login_required(login_url="login")
+def cancel_review(request, directory_id):
+    get_review_session(request, directory_id).clear()
+    messages.info(request, "Review session cancelled.")
+    return redirect("my-lessons-directory", directory_id=directory_id)
+
+
+def practice_question(request, practice_session, mode, practice_url, feedback_url, cancel_url, done_url):
+    """Show the current card of a practice session (GET) or grade an answer (POST)."""
+    card = practice_session.current_card() if practice_session.active else None
+
+    if card is None:
+        # Session complete
+        practice_session.clear()
+        messages.info(request, "Practice session completed!")
+        return redirect(done_url)
+
+    question, correct_answer = get_question_and_answer(card, mode)
 
     if request.method == "POST":
         answer = request.POST.get("answer", "").strip()
-        lev_distance = distance(answer.lower(), correct_answer.lower())
-        correct = lev_distance < user_word.user_lesson.allowed_error_margin + 1
-        diff_html = (
-            highlight_differences(answer, correct_answer) if lev_distance != 0 else ""
+        lev_distance, diff_html = evaluate_answer(
+            answer,
+            correct_answer,
+            get_answer_language(card, mode),
+            accepted_answers=get_accepted_answers(card, mode),
         )
-        request.session[answer_key] = {
-            "user_word_id": user_word.id,
+        correct = lev_distance < card["allowed_error_margin"] + 1
+        practice_session.set_answer({
+            "user_word_id": card["id"],
             "answer": answer,
             "correct": correct,
+            "quality": (
+                QUALITY_PERFECT if lev_distance == 0
+                else QUALITY_CORRECT if correct
+                else QUALITY_WRONG
+            ),
             "correct_answer": correct_answer,
             "diff_html": diff_html,
             "lev_distance": lev_distance,
-        }
-        return redirect("practice-feedback", user_lesson_id=user_lesson_id, mode=mode)
-
-    # Get breadcrumb path from lesson's directory
-    current_directory = user_word.user_lesson.directory
-    if not current_directory:
-        current_directory = UserDirectory.get_or_create_root_directory(request.user)
-    breadcrumb_path = current_directory.get_path()
+        })
+        return redirect(feedback_url)
 
     return render(
         request,
         "base/authenticated/my_lessons/practice/practice.html",
         {
-            "user_word": user_word,
-            "user_lesson": user_word.user_lesson,
-            "user_lesson_id": user_lesson_id,
+            "card": card,
             "question": question,
             "mode": mode,
-            "breadcrumb_path": breadcrumb_path,
-            "breadcrumb_lesson": user_word.user_lesson,
+            "practice_url": practice_url,
+            "cancel_url": cancel_url,
+            "breadcrumb_path": practice_session.breadcrumb,
+            "breadcrumb_lesson": practice_session.breadcrumb_lesson(card),
         },
     )
 
 
-@login_required(login_url="login")
-def practice_feedback(request, user_lesson_id, mode="normal"):
-    window_key, pool_key, answer_key = get_practice_session_keys(user_lesson_id, mode)
-    window = request.session.get(window_key, [])
-    pool = request.session.get(pool_key, [])
-    answer_data = request.session.get(answer_key)
-
-    if not answer_data or not window:
-        return redirect("practice", user_lesson_id=user_lesson_id, mode=mode)
-
-    user_word = get_object_or_404(
-        UserWord,
-        id=answer_data["user_word_id"],
-        user_lesson__user=request.user,
-        user_lesson_id=user_lesson_id,
-    )
+def practice_answer_feedback(request, practice_session, mode, practice_url, cancel_url):
+    """Show the result of the last answer (GET) or apply it and move on (POST)."""
+    answer_data = practice_session.answer
 
-    if request.method == "POST":
-        if answer_data["correct"] or "accept_as_correct" in request.POST:
-            user_word.current_progress += 1
-            user_word.save()
-            window.pop(0)
-            if pool:
-                window.append(pool.pop(0))
-        else:
-            user_word.current_progress = max(0, user_word.current_progress - 1)
-            user_word.save()
-            word_id = window.pop(0)
-            window.append(word_id)
-        request.session[window_key] = window
-        request.session[pool_key] = pool
-        request.session.pop(answer_key, None)
-        return redirect("practice", user_lesson_id=user_lesson_id, mode=mode)
+    if not answer_data or not practice_session.active:
+        return redirect(practice_url)
 
-    # Get breadcrumb path from lesson's directory
-    current_directory = user_word.user_lesson.directory
-    if not current_directory:
-        current_directory = UserDirectory.get_or_create_root_directory(request.user)
-    breadcrumb_path = current_directory.get_path()
+    card = practice_session.current_card()
+    if card is None or card["id"] != answer_data["user_word_id"]:
+        return redirect(practice_url)
+
+    if request.method == "POST":
+        quality = answer_data["quality"]
+        if not answer_data["correct"] and "accept_as_correct" in request.POST:
+            quality = QUALITY_ACCEPTED
+        practice_session.advance(quality)
+        return redirect(practice_url)
 
     # Get the original question for display
-    question, _ = get_question_and_answer(user_word, mode)
+    question, _ = get_question_and_answer(card, mode)
 
     context = {
-        "user_word": user_word,
-        "user_lesson": user_word.user_lesson,
-        "user_lesson_id": user_lesson_id,
+        "card": card,
         "question": question,
         "answer": answer_data["answer"],
         "correct": answer_data["correct"],
         "diff_html": answer_data.get("diff_html", ""),
         "lev_distance": answer_data.get("lev_distance", ""),
         "mode": mode,
-        "breadcrumb_path": breadcrumb_path,
-        "breadcrumb_lesson": user_word.user_lesson,
+        "practice_url": practice_url,
+        "cancel_url": cancel_url,
+        "breadcrumb_path": practice_session.breadcrumb,
+        "breadcrumb_lesson": practice_session.breadcrumb_lesson(card),
     }
     return render(request, "base/authenticated/my_lessons/practice/practice_feedback.html", context)
 
 
-@login_required(login_url="login")
-def cancel_practice(request, user_lesson_id):
-    # Cancel all possible practice sessions for this lesson (all modes)
-    for mode in PRACTICE_MODES:
-        window_key, pool_key, answer_key = get_practice_session_keys(
-            user_lesson_id, mode
-        )
-        request.session.pop(window_key, None)
-        request.session.pop(pool_key, None)
-        request.session.pop(answer_key, None)
-    messages.info(request, "Practice session cancelled.")
-    return redirect("my-lesson-details", my_lesson_id=user_lesson_id)
-
-
-def highlight_differences(user_answer, correct_answer):
-    """
-    Returns HTML with mismatches highlighted.
-    """
-    from django.utils.html import escape
-    matcher = difflib.SequenceMatcher(None, user_answer, correct_answer)
-    result = []
-    for opcode, a0, a1, b0, b1 in matcher.get_opcodes():
-        if opcode == "equal":
-            result.append(escape(correct_answer[b0:b1]))
-        else:
-            # Highlight mismatched parts from the correct answer (escape to prevent XSS)
-            result.append(f'<span class="diff">{escape(correct_answer[b0:b1])}</span>')
-    return "".join(result)
-
-
 # ------------Import Lesson from JSON------------#
 
 
@@ -1441,20 +1475,20 @@ def import_lesson_json(request):
             messages.error(request, "No file uploaded.")
             return redirect("import-lesson-json")
 
-        # Security: Only allow .json files and limit size (e.g., 1MB)
-        if not file.name.endswith(".json") or file.size > 1024 * 1024:
+        # Security: Only allow .json files and limit size
+        if not file.name.endswith(".json") or file.size > settings.LESSON_IMPORT_MAX_SIZE:
             messages.error(request, "Invalid file type or file too large.")
             return redirect("import-lesson-json")
 
+        # First pass: lesson fields only; the words are streamed below
         try:
-            data = json.load(file)
+            data = read_lesson_json(file)
         except Exception as e:
             messages.error(request, f"Invalid JSON: {e}")
             return redirect("import-lesson-json")
 
         # Validate required fields
-        required_fields = ["title", "prompt_language", "translation_language", "words"]
-        if not all(field in data for field in required_fields):
+        if not all(field in data for field in LESSON_JSON_REQUIRED):
             messages.error(request, "Missing required fields in JSON.")
             return redirect("import-lesson-json")
 
@@ -1462,60 +1496,47 @@ def import_lesson_json(request):
         user_profile = UserProfile.objects.get_or_create(user=request.user)[0]
         auto_generate = user_profile.auto_generate_hints
 
-        # Get or create languages
-        prompt_lang, _ = Language.objects.get_or_create(name=data["prompt_language"])
-        translation_lang, _ = Language.objects.get_or_create(
-            name=data["translation_language"]
-        )
-
-        # AccessType: Only use existing, fallback to 'private'
-        access_type_name = data.get("access_type", "private")
         try:
-            access_type = AccessType.objects.get(name=access_type_name)
-        except AccessType.DoesNotExist:
-            access_type = AccessType.objects.get(name="private")
-
-        # Create the lesson
-        lesson = Lesson.objects.create(
-            title=data["title"],
-            description=data.get("description", ""),
-            prompt_language=prompt_lang,
-            translation_language=translation_lang,
-            author=request.user,
-            access_type=access_type,
-        )
+            with transaction.atomic():
+                # Get or create languages
+                prompt_lang, _ = Language.objects.get_or_create(name=data["prompt_language"])
+                translation_lang, _ = Language.objects.get_or_create(
+                    name=data["translation_language"]
+                )
 
-        # Create words
-        for word in data.get("words", []):
-            # Validate word fields
-            if not all(k in word for k in ("prompt", "translation")):
-                continue  # skip incomplete word entries
-            hint_value = word.get("hint", "")
-            if not hint_value and auto_generate and word["prompt"]:
-                hint_value = word["prompt"][0].upper()
-            Word.objects.create(
-                lesson=lesson,
-                prompt=word["prompt"],
-                translation=word["translation"],
-                usage=word.get("usage", ""),
-                hint=hint_value,
-            )
+                # AccessType: Only use existing, fallback to 'private'
+                access_type_name = data.get("access_type", "private")
+                try:
+                    access_type = AccessType.objects.get(name=access_type_name)
+                except AccessType.DoesNotExist:
+                    access_type = AccessType.objects.get(name="private")
+
+                # Create the lesson
+                lesson = Lesson.objects.create(
+                    title=data["title"],
+                    description=data.get("description", ""),
+                    prompt_language=prompt_lang,
+                    translation_language=translation_lang,
+                    author=request.user,
+                    access_type=access_type,
+                )
 
-        # Get or create root directory for the user
-        root_directory = UserDirectory.get_or_create_root_directory(request.user)
+                # Get or create root directory for the user
+                root_directory = get_directory_tree(request).root
 
-        # Create UserLesson for the importing user
-        user_lesson = UserLesson.objects.create(
-            user=request.user, 
-            lesson=lesson,
-            directory=root_directory  # Assign to root directory
-        )
+                # Create UserLesson for the importing user
+                user_lesson = UserLesson.objects.create(
+                    user=request.user,
+                    lesson=lesson,
+                    directory=root_directory  # Assign to root directory
+                )
 
-        # Create UserWord for each word
-        for word in lesson.words.all():
-            UserWord.objects.create(
-                user_lesson=user_lesson, word=word, current_progress=0, notes=""
-            )
+                # Second pass: words and their UserWords, in bulk batches
+                file.seek(0)
+                import_words(user_lesson, iter_lesson_json_words(file), auto_generate)
+        except ValueError as e:
+            messages.error(request, f"Invalid JSON: {e}")
+            return redirect("import-lesson-json")
 
         lesson.changes_log = (
             ((lesson.changes_log + "\n") if lesson.changes_log else "")
@@ -1527,8 +1548,8 @@ def import_lesson_json(request):
         return redirect("my-lesson-details", my_lesson_id=user_lesson.id)
 
     # Get breadcrumb path for root directory
-    root_directory = UserDirectory.get_or_create_root_directory(request.user)
-    breadcrumb_path = root_directory.get_path()
+    tree = get_directory_tree(request)
+    breadcrumb_path = tree.get_path(tree.root)
 
     context = {
         "breadcrumb_path": breadcrumb_path,
@@ -1536,6 +1557,60 @@ def import_lesson_json(request):
     
     return render(request, "base/authenticated/my_lessons/lesson_utils/import_lesson_json.html", context)
 
+@login_required(login_url="login")
+def import_deck(request):
+    """Import an Anki .apkg or CSV/TSV deck as a new lesson in the current folder."""
+    tree = get_directory_tree(request)
+    current_directory = tree.get(request.session.get('current_directory_id')) or tree.root
+
+    if request.method == "POST":
+        form = DeckImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            deck_file = form.cleaned_data["deck_file"]
+            title = form.cleaned_data["title"] or os.path.splitext(deck_file.name)[0]
+            # Audio copied out of the deck, released again if the import fails
+            created_files = []
+            try:
+                with transaction.atomic():
+                    lesson = Lesson.objects.create(
+                        title=title,
+                        prompt_language=form.cleaned_data["prompt_language"],
+                        translation_language=form.cleaned_data["translation_language"],
+                        access_type=form.cleaned_data["access_type"],
+                        author=request.user,
+                        changes_log=(
+                            f"{timezone.now()} Lesson imported by {request.user.username} "
+                            f"from deck '{deck_file.name}'"
+                        ),
+                    )
+                    user_lesson = UserLesson.objects.create(
+                        user=request.user, lesson=lesson, directory=current_directory
+                    )
+                    imported = import_words(
+                        user_lesson,
+                        iter_deck(deck_file, deck_file.name, created_files),
+                        with_audio=True,
+                    )
+            except (sqlite3.Error, UnicodeDecodeError, csv.Error, ValueError) as e:
+                release_audio_files(created_files)
+                messages.error(request, f"Could not import the deck: {e}")
+                return redirect("import-deck")
+            except Exception:
+                release_audio_files(created_files)
+                raise
+
+            messages.success(request, f"Imported {imported} words from the deck.")
+            return redirect("my-lesson-details", my_lesson_id=user_lesson.id)
+    else:
+        form = DeckImportForm()
+
+    context = {
+        "form": form,
+        "breadcrumb_path": tree.get_path(current_directory),
+    }
+    return render(request, "base/authenticated/my_lessons/lesson_utils/import_deck.html", context)
+
+
 @login_required(login_url="login")
 def export_lesson_json(request, lesson_id):
     lesson = get_object_or_404(
@@ -1547,43 +1622,87 @@ def export_lesson_json(request, lesson_id):
     if request.user != lesson.author and not request.user.is_superuser:
         return HttpResponse("You are not allowed to export this lesson.", status=403)
 
-    words = Word.objects.filter(lesson=lesson)
-    data = {
-        "title": lesson.title,
-        "description": lesson.description,
-        "prompt_language": lesson.prompt_language.name,
-        "translation_language": lesson.translation_language.name,
-        "access_type": lesson.access_type.name,
-        "words": [
-            {
-                "prompt": w.prompt,
-                "translation": w.translation,
-                "usage": w.usage,
-                "hint": w.hint,
-            }
-            for w in words
-        ],
-    }
+    export_format = request.GET.get("format", "json")
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponse("Unknown export format.", status=400)
+
+    content_type, extension, chunks = export_lesson(lesson, export_format)
+    filename = f"{lesson.title.replace(' ', '_')}.{extension}"
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
 
-    json_str = json.dumps(data, ensure_ascii=False, indent=2)
-    filename = f"{lesson.title.replace(' ', '_')}.json"
-    response = HttpResponse(json_str, content_type="application/json")
+@login_required(login_url="login")
+def export_directory_archive(request, directory_id):
+    """Download a folder with its subfolders and lessons (words and audio) as one zip archive."""
+    directory = get_object_or_404(UserDirectory, id=directory_id, user=request.user)
+    response = StreamingHttpResponse(
+        iter_directory_archive(directory), content_type="application/zip"
+    )
+    filename = f"{directory.name.replace(' ', '_')}.zip"
     response["Content-Disposition"] = f'attachment; filename="{filename}"'
     return response
 
 
+@login_required(login_url="login")
+def import_directory_archive(request, directory_id):
+    """Restore a zip archive made by export_directory_archive into a folder."""
+    directory = get_object_or_404(UserDirectory, id=directory_id, user=request.user)
+
+    if request.method == "POST":
+        file = request.FILES.get("archive_file")
+        if not file:
+            messages.error(request, "No file uploaded.")
+            return redirect("import-directory-archive", directory_id=directory.id)
+
+        if not file.name.endswith(".zip") or file.size > settings.LESSON_ARCHIVE_MAX_SIZE:
+            messages.error(request, "Invalid file type or file too large.")
+            return redirect("import-directory-archive", directory_id=directory.id)
+
+        # Audio copied out of the archive, released again if the restore fails
+        created_files = []
+        try:
+            with transaction.atomic():
+                restored = restore_directory_archive(file, directory, created_files)
+        except (
+            KeyError, TypeError, ValueError, EOFError, zlib.error,
+            zipfile.BadZipFile, zipfile.LargeZipFile,
+        ) as e:
+            release_audio_files(created_files)
+            messages.error(request, f"Could not restore the archive: {e}")
+            return redirect("import-directory-archive", directory_id=directory.id)
+        except Exception:
+            release_audio_files(created_files)
+            raise
+
+        messages.success(request, f"Restored {restored} lesson(s) from the archive.")
+        return redirect("my-lessons-directory", directory_id=directory.id)
+
+    context = {
+        "directory": directory,
+        "breadcrumb_path": get_directory_tree(request).get_path(directory),
+    }
+    return render(request, "base/authenticated/my_lessons/fs_utils/import_archive.html", context)
+
+
 @login_required(login_url="login")
 def generate_lesson_audio_start(request, my_lesson_id):
     myLesson = get_object_or_404(UserLesson, id=my_lesson_id, user=request.user)
     
     # Get breadcrumb path from lesson's directory
-    current_directory = myLesson.directory
+    tree = get_directory_tree(request)
+    current_directory = tree.get(myLesson.directory_id) or myLesson.directory
     if not current_directory:
-        current_directory = UserDirectory.get_or_create_root_directory(request.user)
-    breadcrumb_path = current_directory.get_path()
+        current_directory = tree.root
+    breadcrumb_path = tree.get_path(current_directory)
+
+    # Set after the job was queued; the page then polls its progress
+    job_id = request.GET.get("job")
 
     context = {
         "my_lesson": myLesson,
+        "job_id": job_id if job_id and job_id.isdigit() else None,
         "breadcrumb_path": breadcrumb_path,
         "breadcrumb_lesson": myLesson,
     }
@@ -1595,44 +1714,8 @@ def generate_lesson_audio_start(request, my_lesson_id):
 @require_POST
 def generate_lesson_audio(request, my_lesson_id):
     myLesson = get_object_or_404(UserLesson, id=my_lesson_id, user=request.user)
-    words = myLesson.lesson.words.all()
-
-    for word in words:
-        # --- PROMPT AUDIO ---
-        if word.prompt:
-            if (
-                word.prompt_audio
-                and word.prompt_audio.path
-                and os.path.isfile(word.prompt_audio.path)
-            ):
-                os.remove(word.prompt_audio.path)
-                word.prompt_audio = None
-            rel_path = generate_audio_file(
-                word.prompt,
-                word.lesson.prompt_language,
-                "audio/prompts",
-                f"word_{word.id}_prompt.mp3",
-            )
-            word.prompt_audio = rel_path
-
-        # --- USAGE AUDIO ---
-        if word.usage:
-            if (
-                word.usage_audio
-                and word.usage_audio.path
-                and os.path.isfile(word.usage_audio.path)
-            ):
-                os.remove(word.usage_audio.path)
-                word.usage_audio = None
-            rel_path = generate_audio_file(
-                word.usage,
-                word.lesson.prompt_language,
-                "audio/usages",
-                f"word_{word.id}_usage.mp3",
-            )
-            word.usage_audio = rel_path
-
-        word.save()
+    # Audio is generated in parallel by the audio worker, see utils_audio_jobs
+    job = enqueue_lesson_audio(myLesson.lesson)
 
     myLesson.lesson.updated = timezone.now()
     myLesson.lesson.changes_log = (
@@ -1640,8 +1723,97 @@ def generate_lesson_audio(request, my_lesson_id):
         + f"{timezone.now()} Audio files generated for lesson by {request.user.username}"
     )
     myLesson.lesson.save()
-    messages.success(request, "Audio files generated successfully!")
-    return redirect("my-lesson-details", my_lesson_id=myLesson.id)
+    return redirect(
+        reverse("generate-lesson-audio-start", kwargs={"my_lesson_id": myLesson.id})
+        + f"?job={job.id}"
+    )
+
+
+@login_required(login_url="login")
+def generate_lesson_audio_progress(request, my_lesson_id, job_id):
+    myLesson = get_object_or_404(UserLesson, id=my_lesson_id, user=request.user)
+    job = AudioJob.objects.filter(
+        id=job_id, lesson_id=myLesson.lesson_id
+    ).values("status", "total", "completed", "error").first()
+
+    if not job:
+        return JsonResponse({"error": "Job not found"}, status=404)
+
+    finished = job["status"] in (AudioJob.STATUS_DONE, AudioJob.STATUS_FAILED)
+    if finished:
+        # Shown on the lesson page the poller redirects to
+        if job["error"]:
+            messages.error(request, job["error"])
+        else:
+            messages.success(request, "Audio files generated successfully!")
+    return JsonResponse({
+        "status": job["status"],
+        "total": job["total"],
+        "completed": job["completed"],
+        "finished": finished,
+        "redirect_url": reverse("my-lesson-details", kwargs={"my_lesson_id": myLesson.id}),
+    })
+
+
+@login_required(login_url="login")
+def lesson_audio_bundle_index(request, my_lesson_id):
+    """
+    Offsets of every word's audio in the lesson's packed audio bundle, so a
+    client can prefetch the whole lesson in one request and slice it.
+    """
+    myLesson = get_object_or_404(
+        UserLesson.objects.select_related("lesson"), id=my_lesson_id, user=request.user
+    )
+    bundle = get_lesson_bundle(myLesson.lesson)
+    bundle_url = reverse("lesson-audio-bundle", kwargs={"my_lesson_id": myLesson.id})
+    return JsonResponse({
+        "hash": bundle["hash"],
+        "size": bundle["size"],
+        "url": f"{bundle_url}?v={bundle['hash']}",
+        "words": bundle["words"],
+    })
+
+
+@login_required(login_url="login")
+def lesson_audio_bundle(request, my_lesson_id):
+    """
+    Serve the lesson's packed audio bundle, whole or as a single byte range.
+    The ETag is the bundle's content hash.
+    """
+    myLesson = get_object_or_404(
+        UserLesson.objects.select_related("lesson"), id=my_lesson_id, user=request.user
+    )
+    bundle = get_lesson_bundle(myLesson.lesson)
+    etag = f'"{bundle["hash"]}"'
+    if request.headers.get("If-None-Match") == etag:
+        response = HttpResponse(status=304)
+        response["ETag"] = etag
+        return response
+
+    path = os.path.join(settings.MEDIA_ROOT, bundle["file"])
+    size = bundle["size"]
+    byte_range = None
+    # A range only applies to the version the client already has
+    if request.headers.get("If-Range", etag) == etag:
+        byte_range = parse_range(request.headers.get("Range"), size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    response = StreamingHttpResponse(
+        iter_file_range(path, start, end - start + 1),
+        status=206 if byte_range else 200,
+        content_type="application/octet-stream",
+    )
+    if byte_range:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Content-Length"] = max(0, end - start + 1)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
 
 
 # ---------------Profile Views---------------#
@@ -1753,7 +1925,7 @@ def createDirectory(request, directory_id):
         form = UserDirectoryForm(user=request.user, parent_directory=parent_directory)
     
     # Build breadcrumb for parent directory
-    breadcrumb_path = parent_directory.get_path()
+    breadcrumb_path = get_directory_tree(request).get_path(parent_directory)
     
     context = {
         "form": form,
@@ -1794,7 +1966,7 @@ def renameDirectory(request, directory_id):
         form = UserDirectoryForm(instance=directory, user=request.user, parent_directory=directory.parent_directory)
     
     # Build breadcrumb path
-    breadcrumb_path = directory.parent_directory.get_path()
+    breadcrumb_path = get_directory_tree(request).get_path(directory.parent_directory)
     
     context = {
         "form": form,
@@ -1831,7 +2003,7 @@ def moveDirectory(request, directory_id):
         form = MoveDirectoryForm(user=request.user, current_directory=directory)
     
     # Build breadcrumb path
-    breadcrumb_path = directory.parent_directory.get_path()
+    breadcrumb_path = get_directory_tree(request).get_path(directory.parent_directory)
     
     context = {
         "form": form,
@@ -1852,34 +2024,25 @@ def deleteDirectory(request, directory_id):
     
     parent_id = directory.parent_directory.id if directory.parent_directory else None
     
-    # Count contents for warning
-    subdirectory_count = directory.subdirectories.count()
-    lesson_count = directory.lessons.count()
+    # Count contents for warning (everything that "delete all" removes)
+    subdirectory_count = directory.get_descendants(include_self=False).count()
+    lesson_count = directory.get_subtree_lessons().count()
     
     if request.method == "POST":
         action = request.POST.get("action", "cancel")
         
         if action == "delete_all":
-            # Delete directory and all contents (cascade will handle it)
+            # Delete directory and all contents, subtree-wide in batches
             directory_name = directory.name
-            directory.delete()
+            with transaction.atomic():
+                delete_directory_subtree(directory)
             messages.success(request, f"Folder '{directory_name}' and all its contents deleted successfully!")
         elif action == "move_contents":
             # Move all contents to parent directory, then delete the empty directory
-            parent = directory.parent_directory
-            
-            # Move subdirectories
-            for subdir in directory.subdirectories.all():
-                subdir.parent_directory = parent
-                subdir.save()
-            
-            # Move lessons
-            for lesson in directory.lessons.all():
-                lesson.directory = parent
-                lesson.save()
-            
             directory_name = directory.name
-            directory.delete()
+            with transaction.atomic():
+                move_directory_contents(directory)
+                directory.delete()
             messages.success(request, f"Contents moved and folder '{directory_name}' deleted successfully!")
         else:
             # Cancel
@@ -1890,7 +2053,7 @@ def deleteDirectory(request, directory_id):
         return redirect("my-lessons")
     
     # Build breadcrumb path
-    breadcrumb_path = directory.parent_directory.get_path()
+    breadcrumb_path = get_directory_tree(request).get_path(directory.parent_directory)
     
     context = {
         "directory": directory,
@@ -1907,7 +2070,7 @@ def moveLesson(request, my_lesson_id):
     """Move a lesson to a different directory."""
     user_lesson = get_object_or_404(UserLesson, id=my_lesson_id, user=request.user)
     
-    current_directory_id = user_lesson.directory.id if user_lesson.directory else None
+    current_directory_id = user_lesson.directory_id
     
     if request.method == "POST":
         form = MoveLessonForm(request.POST, user=request.user)
@@ -1923,13 +2086,15 @@ def moveLesson(request, my_lesson_id):
                 return redirect("my-lessons-directory", directory_id=new_directory.id)
     else:
         form = MoveLessonForm(user=request.user)
-        if user_lesson.directory:
-            form.fields["directory"].initial = user_lesson.directory
+        if user_lesson.directory_id:
+            form.fields["directory"].initial = user_lesson.directory_id
     
     cancel_url = request.GET.get('next') or (reverse('my-lessons-directory', kwargs={'directory_id': current_directory_id}) if current_directory_id else reverse('my-lessons'))
     
     # Build breadcrumb path
-    breadcrumb_path = user_lesson.directory.get_path() if user_lesson.directory else []
+    tree = get_directory_tree(request)
+    current_directory = tree.get(user_lesson.directory_id)
+    breadcrumb_path = tree.get_path(current_directory) if current_directory else []
 
     context = {
         "form": form,
@@ -1941,6 +2106,47 @@ def moveLesson(request, my_lesson_id):
     return render(request, "base/authenticated/my_lessons/fs_utils/move_lesson.html", context)
 
 
+@login_required(login_url="login")
+@require_POST
+def batch_items(request):
+    """
+    Move or delete many lessons and folders of the file browser at once.
+
+    Takes a JSON body {"action": "move" | "delete", "lessons": [UserLesson
+    ids], "directories": [folder ids], "target_directory_id": id (move
+    only)}; everything is checked before anything changes, and applied in
+    one transaction.
+    """
+    try:
+        data = json.loads(request.body)
+        action = data.get("action")
+        lesson_ids = [int(i) for i in data.get("lessons", [])]
+        directory_ids = [int(i) for i in data.get("directories", [])]
+        target_directory_id = int(data["target_directory_id"]) if action == "move" else None
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return JsonResponse({"error": "Invalid request."}, status=400)
+
+    try:
+        with transaction.atomic():
+            if action == "move":
+                target = UserDirectory.objects.filter(
+                    id=target_directory_id, user=request.user
+                ).first()
+                if not target:
+                    return JsonResponse({"error": "Target folder not found."}, status=404)
+                lessons, directories = move_items(
+                    request.user, lesson_ids, directory_ids, target
+                )
+            elif action == "delete":
+                lessons, directories = delete_items(request.user, lesson_ids, directory_ids)
+            else:
+                return JsonResponse({"error": "Invalid action."}, status=400)
+    except DirectoryTreeError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse({"success": True, "lessons": lessons, "directories": directories})
+
+
 @login_required(login_url="login")
 @require_POST
 def dragDropMove(request):
@@ -1985,15 +2191,7 @@ def dragDropMove(request):
             messages.info(request, "Cannot move folder into itself.")
         else:
             # Check for circular reference (target is a descendant of source)
-            def is_descendant(potential_ancestor, potential_descendant):
-                current = potential_descendant
-                while current is not None:
-                    if current.id == potential_ancestor.id:
-                        return True
-                    current = current.parent_directory
-                return False
-            
-            if is_descendant(directory, target_directory):
+            if directory.is_ancestor_of(target_directory):
                 messages.error(request, "Cannot move a folder into one of its subfolders.")
             elif directory.parent_directory and directory.parent_directory.id == target_directory_id:
                 messages.info(request, "Folder is already in this location.")
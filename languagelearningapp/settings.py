@@ -11,7 +11,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -155,3 +156,81 @@ SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 
 # Optional: Reset session timer on every request (default is True)
 SESSION_SAVE_EVERY_REQUEST = True
+
+# Cache used for users' directory trees (see base/utils_directory_tree.py).
+# The default is per process: with several worker processes, set a shared
+# backend (e.g. django.core.cache.backends.redis.RedisCache) so they all see
+# each other's invalidations.
+CACHES = {
+    "default": {
+        "BACKEND": config("CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": config("CACHE_LOCATION", default=""),
+    }
+}
+# Worker processes the server runs (read by gunicorn as well); a per-process
+# cache would let them serve each other's stale trees
+WEB_CONCURRENCY = config("WEB_CONCURRENCY", default=1, cast=int)
+if WEB_CONCURRENCY > 1 and CACHES["default"]["BACKEND"].endswith(".LocMemCache"):
+    raise ImproperlyConfigured(
+        "WEB_CONCURRENCY > 1 needs a shared CACHE_BACKEND (e.g. "
+        "django.core.cache.backends.redis.RedisCache); LocMemCache is per process."
+    )
+DIRECTORY_TREE_CACHE_TIMEOUT = config("DIRECTORY_TREE_CACHE_TIMEOUT", default=24 * 60 * 60, cast=int)
+
+# Practice sessions buffer progress in the session and write it back with one
+# bulk_update after this many answers (and whenever a session ends)
+PRACTICE_FLUSH_EVERY = config("PRACTICE_FLUSH_EVERY", default=10, cast=int)
+
+# Practice scheduler: "sm2" (spaced repetition) or "shuffle" (original window/pool)
+PRACTICE_SCHEDULER = config("PRACTICE_SCHEDULER", default="sm2")
+
+# Steps applied to both the typed and the correct answer before they are
+# compared (see base/utils_answers.py); drop e.g. strip_accents to make
+# missing diacritics count as mistakes
+ANSWER_NORMALISATION = config(
+    "ANSWER_NORMALISATION",
+    default="nfkc,casefold,strip_accents,strip_punctuation,strip_articles,collapse_whitespace",
+    cast=Csv(),
+)
+
+# Word audio is generated by a background worker (python manage.py
+# run_audio_worker). Set AUDIO_JOBS_EAGER to run jobs right after the
+# request's transaction commits instead, e.g. when no worker is running.
+AUDIO_JOBS_EAGER = config("AUDIO_JOBS_EAGER", default=False, cast=bool)
+AUDIO_JOB_MAX_ATTEMPTS = config("AUDIO_JOB_MAX_ATTEMPTS", default=3, cast=int)
+AUDIO_WORKER_POLL_INTERVAL = config("AUDIO_WORKER_POLL_INTERVAL", default=2, cast=float)
+# Threads used to synthesise the audio of a whole lesson in parallel
+AUDIO_GENERATION_THREADS = config("AUDIO_GENERATION_THREADS", default=4, cast=int)
+
+# Text-to-speech backend: "gtts" (online), "espeak" (offline, runs
+# TTS_ESPEAK_COMMAND) or "stub" (silent files, for tests and benchmarks)
+TTS_BACKEND = config("TTS_BACKEND", default="gtts")
+TTS_ESPEAK_COMMAND = config("TTS_ESPEAK_COMMAND", default="espeak-ng")
+TTS_ESPEAK_VOICE_VARIANT = config("TTS_ESPEAK_VOICE_VARIANT", default="")
+TTS_TIMEOUT = config("TTS_TIMEOUT", default=30, cast=int)
+# Used for languages without a code
+TTS_DEFAULT_LANGUAGE = config("TTS_DEFAULT_LANGUAGE", default="en")
+# Piper (TTS_BACKEND="piper"): executable and one voice model per language,
+# e.g. "en=/voices/en_US-lessac-medium.onnx,pl=/voices/pl_PL-gosia-medium.onnx"
+TTS_PIPER_COMMAND = config("TTS_PIPER_COMMAND", default="piper")
+TTS_PIPER_MODELS = config("TTS_PIPER_MODELS", default="", cast=Csv())
+
+# Audio post-processing with ffmpeg (AUDIO_FFMPEG_COMMAND). AUDIO_FORMAT
+# "opus" re-encodes clips to mono Ogg/Opus at AUDIO_BITRATE, "mp3" to mono
+# MP3; "original" keeps the TTS output. AUDIO_TRIM_SILENCE cuts leading and
+# trailing silence. Existing files are converted with
+# python manage.py convert_audio. Note: older Safari versions cannot play Opus.
+AUDIO_FORMAT = config("AUDIO_FORMAT", default="original")
+AUDIO_BITRATE = config("AUDIO_BITRATE", default="24k")
+AUDIO_TRIM_SILENCE = config("AUDIO_TRIM_SILENCE", default=False, cast=bool)
+AUDIO_FFMPEG_COMMAND = config("AUDIO_FFMPEG_COMMAND", default="ffmpeg")
+# Reads the duration of formats without a header reader (e.g. MP3) when
+# convert_audio runs; without it their duration stays unknown
+AUDIO_FFPROBE_COMMAND = config("AUDIO_FFPROBE_COMMAND", default="ffprobe")
+
+# Lesson import: largest accepted upload, and words inserted per bulk_create
+# batch (memory use is bounded by one batch whatever the file size)
+LESSON_IMPORT_MAX_SIZE = config("LESSON_IMPORT_MAX_SIZE", default=50 * 1024 * 1024, cast=int)
+LESSON_IMPORT_BATCH_SIZE = config("LESSON_IMPORT_BATCH_SIZE", default=1000, cast=int)
+# Largest accepted folder archive (zip with audio) on restore
+LESSON_ARCHIVE_MAX_SIZE = config("LESSON_ARCHIVE_MAX_SIZE", default=500 * 1024 * 1024, cast=int)